@@ -0,0 +1,134 @@
+"""
+工具结果渲染的token对比基准
+
+用贴近真实集群的Pod和事件数据，对比 json.dumps(indent=2)、紧凑JSON
+与 render_compact 的估算token数。
+
+用法:
+    python benchmarks/bench_render.py [--pods 200] [--events 300]
+
+需先 pip install -e . 或在仓库根目录设置 PYTHONPATH=. 运行。
+"""
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from k8s_diagnosis_agent.llm.tokens import estimate_tokens
+from k8s_diagnosis_agent.tools.render import render_compact
+
+
+DEPLOYMENTS = [
+    ("web-frontend", "registry.example.com/shop/web-frontend:v2.14.3"),
+    ("checkout-api", "registry.example.com/shop/checkout-api:v1.9.0"),
+    ("payment-worker", "registry.example.com/shop/payment-worker:v1.9.0"),
+    ("inventory-svc", "registry.example.com/shop/inventory-svc:v3.2.1"),
+    ("redis-cache", "docker.io/library/redis:7.2.4-alpine"),
+]
+NODES = [f"ip-10-0-{i}-{10 + i}.ec2.internal" for i in range(6)]
+SIDECAR = "docker.io/envoyproxy/envoy:v1.29.1"
+
+
+def make_pods(count: int, rng: random.Random):
+    """生成Pod列表，字段结构与 KubernetesPodInfoTool 一致"""
+    now = datetime(2024, 5, 1, 12, 0, 0)
+    pods = []
+    for i in range(count):
+        app, image = DEPLOYMENTS[i % len(DEPLOYMENTS)]
+        suffix = "".join(rng.choice("bcdfghjklmnpqrstvwxz2456789") for _ in range(5))
+        phase = rng.choices(["Running", "Pending", "Failed"], weights=[92, 5, 3])[0]
+        ready = "True" if phase == "Running" and rng.random() > 0.05 else "False"
+        pods.append({
+            "name": f"{app}-7d9f8b6c4-{suffix}",
+            "namespace": "shop",
+            "labels": {"app": app, "pod-template-hash": "7d9f8b6c4", "team": "commerce"},
+            "annotations": {},
+            "node_name": rng.choice(NODES) if phase != "Pending" else None,
+            "phase": phase,
+            "conditions": {
+                "Initialized": {"status": "True", "reason": None, "message": None},
+                "Ready": {
+                    "status": ready,
+                    "reason": None if ready == "True" else "ContainersNotReady",
+                    "message": None if ready == "True" else f"containers with unready status: [{app}]",
+                },
+                "PodScheduled": {"status": "True" if phase != "Pending" else "False", "reason": None, "message": None},
+            },
+            "containers": [
+                {
+                    "name": app,
+                    "image": image,
+                    "resources": {
+                        "requests": {"cpu": "250m", "memory": "256Mi"},
+                        "limits": {"cpu": "1", "memory": "512Mi"},
+                    },
+                    "ports": [{"containerPort": 8080, "protocol": "TCP"}],
+                },
+                {
+                    "name": "envoy",
+                    "image": SIDECAR,
+                    "resources": {"requests": {"cpu": "50m", "memory": "64Mi"}, "limits": {}},
+                    "ports": [],
+                },
+            ],
+            "restart_policy": "Always",
+            "creation_timestamp": (now - timedelta(minutes=rng.randint(5, 50000))).isoformat(),
+        })
+    return {"pods": pods}
+
+
+def make_events(count: int, rng: random.Random):
+    """生成事件列表，字段结构与 KubernetesEventsTool 一致"""
+    now = datetime(2024, 5, 1, 12, 0, 0)
+    templates = [
+        ("Normal", "Scheduled", "Successfully assigned shop/{pod} to {node}"),
+        ("Normal", "Pulled", "Container image \"{image}\" already present on machine"),
+        ("Normal", "Created", "Created container {app}"),
+        ("Normal", "Started", "Started container {app}"),
+        ("Warning", "BackOff", "Back-off restarting failed container {app} in pod {pod}"),
+        ("Warning", "Unhealthy", "Readiness probe failed: HTTP probe failed with statuscode: 503"),
+        ("Warning", "FailedScheduling", "0/6 nodes are available: 6 Insufficient memory."),
+    ]
+    events = []
+    for i in range(count):
+        app, image = DEPLOYMENTS[i % len(DEPLOYMENTS)]
+        pod = f"{app}-7d9f8b6c4-{i % 40:05d}"
+        event_type, reason, message = templates[rng.randrange(len(templates))]
+        last = now - timedelta(seconds=rng.randint(0, 3600))
+        events.append({
+            "name": f"{pod}.17c9{i:012x}",
+            "namespace": "shop",
+            "type": event_type,
+            "reason": reason,
+            "message": message.format(pod=pod, node=rng.choice(NODES), image=image, app=app),
+            "count": rng.randint(1, 40) if event_type == "Warning" else 1,
+            "first_timestamp": (last - timedelta(minutes=rng.randint(0, 120))).isoformat(),
+            "last_timestamp": last.isoformat(),
+            "involved_object": {"kind": "Pod", "name": pod, "namespace": "shop"},
+        })
+    return {"events": events}
+
+
+def report(name: str, data):
+    """打印三种序列化方式的估算token数"""
+    pretty = estimate_tokens(json.dumps(data, ensure_ascii=False, indent=2))
+    compact = estimate_tokens(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    rendered = estimate_tokens(render_compact(data))
+    print(f"{name:<8} {pretty:>10} {compact:>10} {rendered:>10} {1 - rendered / pretty:>9.1%} {1 - rendered / compact:>9.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具结果渲染token对比")
+    parser.add_argument("--pods", type=int, default=200)
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'payload':<8} {'indent=2':>10} {'compact':>10} {'table':>10} {'vs indent':>9} {'vs compact':>9}")
+    report("pods", make_pods(args.pods, rng))
+    report("events", make_events(args.events, rng))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+大响应序列化与压缩基准
+
+构造包含完整Pod列表的工具响应，对比默认路径（ToolResponse模型校验 + jsonable_encoder
++ 标准库json）与直接用orjson序列化的耗时，以及原始、gzip、zstd压缩后的传输字节数。
+
+用法:
+    python benchmarks/bench_responses.py [--pods 2000] [--repeat 20]
+
+需先 pip install -e .[speed] 或在仓库根目录设置 PYTHONPATH=. 运行。
+"""
+import gzip
+import json
+import time
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+
+from k8s_diagnosis_agent.web.models import ToolResponse
+from k8s_diagnosis_agent.web.responses import dumps, ORJSON_AVAILABLE, ZSTD_AVAILABLE
+
+
+def make_pod(i: int) -> dict:
+    return {
+        "name": f"web-{i:05d}",
+        "namespace": f"team-{i % 20}",
+        "labels": {"app": "web", "pod-template-hash": f"{i * 7919 % 100000:05d}", "tier": "frontend"},
+        "annotations": {"kubectl.kubernetes.io/restartedAt": "2024-01-01T00:00:00Z"},
+        "node_name": f"node-{i % 50}",
+        "phase": "Running" if i % 17 else "Pending",
+        "pod_ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+        "conditions": {
+            "Ready": {"status": "True" if i % 17 else "False", "reason": None, "message": None},
+            "PodScheduled": {"status": "True", "reason": None, "message": None},
+        },
+        "containers": [
+            {"name": "app", "image": "registry.example.com/web:1.25.3", "ready": bool(i % 17), "restart_count": i % 5},
+            {"name": "sidecar", "image": "registry.example.com/proxy:2.1.0", "ready": True, "restart_count": 0},
+        ],
+    }
+
+
+def timed(func, repeat: int) -> float:
+    """返回单次调用的平均耗时（毫秒）"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大响应序列化与压缩基准")
+    parser.add_argument("--pods", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = {
+        "tool_name": "k8s_pod_info",
+        "success": True,
+        "result": {"status": "success", "data": {"pods": [make_pod(i) for i in range(args.pods)]}, "message": "成功"},
+        "message": "成功",
+    }
+
+    def default_path() -> bytes:
+        model = ToolResponse(**payload)
+        return json.dumps(
+            jsonable_encoder(model), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+    def fast_path() -> bytes:
+        return dumps(payload)
+
+    body = fast_path()
+    print(f"{args.pods} 个Pod，orjson: {'是' if ORJSON_AVAILABLE else '否'}，zstd: {'是' if ZSTD_AVAILABLE else '否'}")
+    print(f"{'序列化':<28}{'ms/次':>10}{'字节':>12}")
+    print(f"{'模型校验+jsonable_encoder+json':<28}{timed(default_path, args.repeat):>10.2f}{len(default_path()):>12}")
+    print(f"{'直接序列化':<28}{timed(fast_path, args.repeat):>10.2f}{len(body):>12}")
+
+    print(f"{'压缩':<28}{'ms/次':>10}{'字节':>12}")
+    print(f"{'无':<28}{0:>10.2f}{len(body):>12}")
+    for level in (1, 6):
+        compressed = gzip.compress(body, compresslevel=level)
+        elapsed = timed(lambda: gzip.compress(body, compresslevel=level), args.repeat)
+        print(f"{f'gzip level {level}':<28}{elapsed:>10.2f}{len(compressed):>12}")
+    if ZSTD_AVAILABLE:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3)
+        elapsed = timed(lambda: compressor.compress(body), args.repeat)
+        print(f"{'zstd level 3':<28}{elapsed:>10.2f}{len(compressor.compress(body)):>12}")
+
+
+if __name__ == "__main__":
+    main()
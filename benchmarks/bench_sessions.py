@@ -0,0 +1,70 @@
+"""
+会话持久化写入吞吐基准
+
+模拟大量会话并发追加消息，对比SQLite后端逐条写入（write-through）
+与缓冲批量刷写（write-behind）的追加吞吐和请求路径上的追加延迟。
+
+用法:
+    python benchmarks/bench_sessions.py [--sessions 200] [--messages 50]
+
+需先 pip install -e . 或在仓库根目录设置 PYTHONPATH=. 运行。
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+from k8s_diagnosis_agent.config import Config
+from k8s_diagnosis_agent.core.session import SessionManager
+from k8s_diagnosis_agent.core.session_store import SQLiteSessionBackend
+from k8s_diagnosis_agent.llm.base import Message
+
+
+async def run(write_behind: bool, sessions: int, messages: int, directory: str):
+    """并发追加消息，返回(吞吐, p50延迟ms, p99延迟ms)"""
+    config = Config()
+    config.session_max_count = 0
+    config.session_max_bytes = 0
+    path = os.path.join(directory, f"sessions-{'behind' if write_behind else 'through'}.db")
+    manager = SessionManager(config, SQLiteSessionBackend(path, write_behind=write_behind))
+    manager.start()
+    latencies = []
+
+    async def converse(session_id: str):
+        session = manager.get_session(session_id)
+        for i in range(messages):
+            role = "user" if i % 2 == 0 else "assistant"
+            started = time.perf_counter()
+            session.add_message(Message(role=role, content=f"第{i}轮: Pod web-{i} 处于CrashLoopBackOff，" * 4))
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    session_ids = [manager.create_session() for _ in range(sessions)]
+    started = time.perf_counter()
+    await asyncio.gather(*(converse(session_id) for session_id in session_ids))
+    await manager.stop()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = sessions * messages
+    return total / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话持久化写入吞吐基准")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.sessions} 个会话，每个 {args.messages} 条消息")
+        print(f"{'模式':<16}{'追加/秒':>12}{'p50(ms)':>12}{'p99(ms)':>12}")
+        for write_behind in (False, True):
+            throughput, p50, p99 = asyncio.run(run(write_behind, args.sessions, args.messages, directory))
+            name = "write-behind" if write_behind else "write-through"
+            print(f"{name:<16}{throughput:>12.0f}{p50:>12.3f}{p99:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,17 @@ K8s诊断Agent
 一个强大的Kubernetes集群故障诊断AI Agent
 """
 
-from .core.agent import Agent
 from .config import Config
 
 __version__ = "0.1.0"
 __author__ = "k8s-diagnosis-agent"
 
-__all__ = ["Agent", "Config"] 
\ No newline at end of file
+__all__ = ["Agent", "Config"]
+
+
+def __getattr__(name):
+    # Agent依赖LLM、工具等较重的模块，首次访问时才导入
+    if name == "Agent":
+        from .core.agent import Agent
+        return Agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
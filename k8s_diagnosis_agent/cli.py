@@ -7,8 +7,6 @@ import sys
 from typing import Optional
 
 from .config import config
-from .core import Agent
-from .web.app import app
 
 
 async def interactive_chat():
@@ -17,6 +15,10 @@ async def interactive_chat():
     print("输入 'quit' 或 'exit' 退出，输入 'help' 查看帮助")
     print("-" * 50)
     
+    # Agent和Web应用只在对应模式下导入，--help、--version不必加载LLM和工具模块
+    from .core.agent import Agent
+    from .metrics import render_metrics
+    
     agent = Agent(config)
     session_id = None
     
@@ -32,6 +34,10 @@ async def interactive_chat():
                 print_help()
                 continue
             
+            if user_input.lower() == 'metrics':
+                print(render_metrics().decode("utf-8"))
+                continue
+            
             if not user_input:
                 continue
             
@@ -65,6 +71,7 @@ def print_help():
 
 可用命令：
 - help: 显示此帮助信息
+- metrics: 输出本次运行的Prometheus指标（工具、LLM、API调用耗时等）
 - quit/exit/q: 退出程序
 
 示例问题：
@@ -80,6 +87,7 @@ def print_help():
 def run_web_server():
     """运行Web服务器"""
     import uvicorn
+    from .web.app import app
     
     print(f"🚀 启动Web服务器...")
     print(f"📍 地址: http://{config.web.host}:{config.web.port}")
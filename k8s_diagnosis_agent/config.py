@@ -27,10 +27,104 @@ class LLMConfig(BaseSettings):
     # 默认使用的模型
     default_model: str = Field(default="gpt-4", env="DEFAULT_MODEL")
     
+    # 分场景模型路由: 调用场景 -> "provider" 或 "provider:model"
+    # 场景: plan, review, summary, final_answer, memory_summary；未配置的场景使用默认模型
+    routes: Dict[str, str] = Field(default_factory=dict, env="LLM_ROUTES")
+    
     # 模型参数
     temperature: float = Field(default=0.7, env="LLM_TEMPERATURE")
     max_tokens: int = Field(default=4096, env="LLM_MAX_TOKENS")
     timeout: int = Field(default=60, env="LLM_TIMEOUT")
+    
+    # 原生函数调用：规划阶段使用模型的tool_calls循环代替文本JSON规划
+    native_tool_calling: bool = Field(default=True, env="LLM_NATIVE_TOOL_CALLING")
+    max_tool_rounds: int = Field(default=5, env="LLM_MAX_TOOL_ROUNDS")
+    # 每次调用只发送与问题最相关的前k个工具schema，0表示发送全部
+    tool_top_k: int = Field(default=6, env="LLM_TOOL_TOP_K")
+    
+    # 工具结果进入提示词前的归约token预算，可按工具名覆盖，如 {"k8s_logs": 4000}
+    tool_result_token_budget: int = Field(default=2000, env="LLM_TOOL_RESULT_TOKEN_BUDGET")
+    tool_result_token_budgets: Dict[str, int] = Field(default_factory=dict, env="LLM_TOOL_RESULT_TOKEN_BUDGETS")
+    
+    # 按模型名前缀覆盖上下文窗口大小，如 {"gpt-4o-mini": 128000}
+    context_windows: Dict[str, int] = Field(default_factory=dict, env="LLM_CONTEXT_WINDOWS")
+    
+    # 响应缓存配置（仅对低温度的确定性调用生效）
+    response_cache_enabled: bool = Field(default=False, env="LLM_RESPONSE_CACHE_ENABLED")
+    response_cache_path: str = Field(default=".cache/llm_responses.sqlite3", env="LLM_RESPONSE_CACHE_PATH")
+    response_cache_max_bytes: int = Field(default=64 * 1024 * 1024, env="LLM_RESPONSE_CACHE_MAX_BYTES")  # 64MB
+    response_cache_max_temperature: float = Field(default=0.3, env="LLM_RESPONSE_CACHE_MAX_TEMPERATURE")
+    
+    # 对冲请求与故障转移：按顺序列出备用提供者（"provider" 或 "provider:model"），为空则不启用
+    hedge_providers: List[str] = Field(default_factory=list, env="LLM_HEDGE_PROVIDERS")
+    hedge_delay: float = Field(default=2.0, env="LLM_HEDGE_DELAY")  # 延迟样本不足时的对冲延迟（秒）
+    hedge_percentile: float = Field(default=0.95, env="LLM_HEDGE_PERCENTILE")
+    hedge_max_delay: float = Field(default=10.0, env="LLM_HEDGE_MAX_DELAY")
+    hedge_failure_threshold: int = Field(default=3, env="LLM_HEDGE_FAILURE_THRESHOLD")
+    hedge_cooldown: float = Field(default=30.0, env="LLM_HEDGE_COOLDOWN")
+    
+    # 并发与速率治理（按提供者限制RPM/TPM/最大并发，会话间加权公平排队），限额为0表示不限制
+    governor_enabled: bool = Field(default=False, env="LLM_GOVERNOR_ENABLED")
+    governor_rpm: int = Field(default=0, env="LLM_GOVERNOR_RPM")
+    governor_tpm: int = Field(default=0, env="LLM_GOVERNOR_TPM")
+    governor_max_in_flight: int = Field(default=8, env="LLM_GOVERNOR_MAX_IN_FLIGHT")
+    # 按提供者覆盖限额，如 {"openai": {"rpm": 500, "tpm": 90000, "max_in_flight": 16}}
+    governor_limits: Dict[str, Dict[str, int]] = Field(default_factory=dict, env="LLM_GOVERNOR_LIMITS")
+    
+    def get_default_provider_name(self) -> str:
+        """根据默认模型推断提供者名称"""
+        default_model = self.default_model.lower()
+        if default_model.startswith("gpt") or default_model.startswith("openai"):
+            return "openai"
+        elif default_model.startswith("claude"):
+            return "claude"
+        elif default_model.startswith("deepseek"):
+            return "deepseek"
+        raise ValueError(f"不支持的默认模型: {self.default_model}")
+    
+    def get_provider_config(self, provider_name: str, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        构建指定提供者的配置字典
+        
+        Args:
+            provider_name: 提供者名称（openai/gpt、claude/anthropic、deepseek）
+            model: 覆盖默认模型名称
+            
+        Returns:
+            可直接传给LLMFactory的配置字典
+        """
+        provider_name = provider_name.lower()
+        if provider_name in ["openai", "gpt"]:
+            api_key, base_url, default = self.openai_api_key, self.openai_base_url, self.openai_model
+        elif provider_name in ["claude", "anthropic"]:
+            api_key, base_url, default = self.claude_api_key, self.claude_base_url, self.claude_model
+        elif provider_name == "deepseek":
+            api_key, base_url, default = self.deepseek_api_key, self.deepseek_base_url, self.deepseek_model
+        else:
+            raise ValueError(f"不支持的LLM提供者: {provider_name}")
+        
+        provider_config: Dict[str, Any] = {
+            "api_key": api_key,
+            "model": model or default,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "timeout": self.timeout,
+            "response_cache_enabled": self.response_cache_enabled,
+            "response_cache_path": self.response_cache_path,
+            "response_cache_max_bytes": self.response_cache_max_bytes,
+            "response_cache_max_temperature": self.response_cache_max_temperature,
+            "governor_enabled": self.governor_enabled,
+        }
+        if self.governor_enabled:
+            canonical_name = {"gpt": "openai", "anthropic": "claude"}.get(provider_name, provider_name)
+            limits = self.governor_limits.get(canonical_name, {})
+            provider_config["governor_rpm"] = limits.get("rpm", self.governor_rpm)
+            provider_config["governor_tpm"] = limits.get("tpm", self.governor_tpm)
+            provider_config["governor_max_in_flight"] = limits.get("max_in_flight", self.governor_max_in_flight)
+        # 未配置base_url时交给提供者使用其默认地址
+        if base_url:
+            provider_config["base_url"] = base_url
+        return provider_config
 
 
 class KubernetesConfig(BaseSettings):
@@ -74,6 +168,24 @@ class WebConfig(BaseSettings):
     secret_key: str = Field(default="your-secret-key-here", env="SECRET_KEY")
     cors_origins: List[str] = Field(default=["*"], env="CORS_ORIGINS")
     
+    # 流式响应无事件时的心跳间隔（秒）
+    sse_heartbeat_interval: float = Field(default=15.0, env="WEB_SSE_HEARTBEAT_INTERVAL")
+    # WebSocket多路复用：每个流的初始发送额度和单个连接的最大流数
+    ws_initial_credits: int = Field(default=16, env="WEB_WS_INITIAL_CREDITS")
+    ws_max_streams: int = Field(default=8, env="WEB_WS_MAX_STREAMS")
+    # 准入控制：chat和工具接口同时处理的请求数与等待队列长度，超出时返回503
+    chat_max_concurrency: int = Field(default=8, env="WEB_CHAT_MAX_CONCURRENCY")
+    chat_max_queue: int = Field(default=16, env="WEB_CHAT_MAX_QUEUE")
+    tool_max_concurrency: int = Field(default=16, env="WEB_TOOL_MAX_CONCURRENCY")
+    tool_max_queue: int = Field(default=32, env="WEB_TOOL_MAX_QUEUE")
+    admission_queue_timeout: float = Field(default=10.0, env="WEB_ADMISSION_QUEUE_TIMEOUT")
+    admission_retry_after: int = Field(default=5, env="WEB_ADMISSION_RETRY_AFTER")
+    
+    # 响应体不小于该字节数时按 Accept-Encoding 压缩（zstd或gzip），0表示关闭
+    compression_min_size: int = Field(default=1024, env="WEB_COMPRESSION_MIN_SIZE")
+    # 热点接口直接序列化结果返回，不再按响应模型重新校验
+    skip_response_validation: bool = Field(default=True, env="WEB_SKIP_RESPONSE_VALIDATION")
+    
     # 文件上传配置
     max_file_size: int = Field(default=10 * 1024 * 1024, env="MAX_FILE_SIZE")  # 10MB
     upload_path: str = Field(default="uploads", env="UPLOAD_PATH")
@@ -118,6 +230,45 @@ class Config(BaseSettings):
     # 会话配置
     session_timeout: int = Field(default=3600, env="SESSION_TIMEOUT")  # 1小时
     max_conversation_length: int = Field(default=50, env="MAX_CONVERSATION_LENGTH")
+    # 会话容量上限（0表示不限制），超出时淘汰最久未访问的会话；后台按间隔（秒）清理过期会话
+    session_max_count: int = Field(default=1000, env="SESSION_MAX_COUNT")
+    session_max_bytes: int = Field(default=256 * 1024 * 1024, env="SESSION_MAX_BYTES")
+    session_cleanup_interval: int = Field(default=60, env="SESSION_CLEANUP_INTERVAL")
+    # 会话持久化后端：memory（仅内存）、sqlite（单副本）或 redis（多副本共享）；
+    # 写操作缓冲后按间隔（秒）或批量大小刷写
+    session_backend: str = Field(default="memory", env="SESSION_BACKEND")
+    session_sqlite_path: str = Field(default="data/sessions.db", env="SESSION_SQLITE_PATH")
+    session_redis_url: str = Field(default="redis://localhost:6379/0", env="SESSION_REDIS_URL")
+    session_redis_prefix: str = Field(default="k8s-diagnosis-agent:", env="SESSION_REDIS_PREFIX")
+    session_flush_interval: float = Field(default=1.0, env="SESSION_FLUSH_INTERVAL")
+    session_flush_batch_size: int = Field(default=500, env="SESSION_FLUSH_BATCH_SIZE")
+    # 共享后端下缓存的会话与后端核对消息数的最小间隔（秒），0表示每次访问都核对
+    session_revalidate_interval: float = Field(default=1.0, env="SESSION_REVALIDATE_INTERVAL")
+    
+    # 滚动摘要：消息估算token数超过阈值（0表示关闭）后，后台把较早的消息并入摘要，保留最近几条
+    summary_token_threshold: int = Field(default=6000, env="SUMMARY_TOKEN_THRESHOLD")
+    summary_keep_messages: int = Field(default=6, env="SUMMARY_KEEP_MESSAGES")
+    summary_max_tokens: int = Field(default=800, env="SUMMARY_MAX_TOKENS")
+    
+    # 会话证据缓存：工具结果在新鲜期内被后续轮次复用，可按工具名覆盖新鲜期（秒）
+    evidence_default_ttl: int = Field(default=60, env="EVIDENCE_DEFAULT_TTL")
+    evidence_ttls: Dict[str, int] = Field(default_factory=dict, env="EVIDENCE_TTLS")
+    evidence_max_entries: int = Field(default=100, env="EVIDENCE_MAX_ENTRIES")
+    # 再次调用同一工具时只向模型发送相对上次结果的增量
+    delta_results: bool = Field(default=True, env="DELTA_RESULTS")
+    
+    # 链路追踪：启用后span以OTLP JSON格式逐行写入文件
+    tracing_enabled: bool = Field(default=False, env="TRACING_ENABLED")
+    tracing_file: str = Field(default="logs/traces.jsonl", env="TRACING_FILE")
+    
+    # 批量工具调用：单次请求的最大调用数和默认并发数
+    tool_batch_max_size: int = Field(default=50, env="TOOL_BATCH_MAX_SIZE")
+    tool_batch_concurrency: int = Field(default=8, env="TOOL_BATCH_CONCURRENCY")
+    
+    # 异步诊断任务：worker数、排队上限（超出时拒绝提交）和保留的已结束任务数
+    job_workers: int = Field(default=4, env="JOB_WORKERS")
+    job_queue_size: int = Field(default=100, env="JOB_QUEUE_SIZE")
+    job_retention: int = Field(default=500, env="JOB_RETENTION")
     
     class Config:
         env_file = ".env"
@@ -2,11 +2,16 @@
 核心模块
 """
 
-from .agent import Agent
-from .planner import Planner
-from .executor import Executor
-from .conversation import ConversationManager
-from .session import SessionManager
+import importlib
+
+# 导出名到子模块的映射，首次访问时才导入对应子模块
+_EXPORTS = {
+    "Agent": ".agent",
+    "Planner": ".planner",
+    "Executor": ".executor",
+    "ConversationManager": ".conversation",
+    "SessionManager": ".session",
+}
 
 __all__ = [
     "Agent",
@@ -14,4 +19,10 @@ __all__ = [
     "Executor",
     "ConversationManager",
     "SessionManager"
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -9,13 +9,18 @@ from loguru import logger
 
 from ..config import Config
 from ..llm.base import Message, LLMResponse, BaseLLMProvider
-from ..llm.factory import LLMFactory
+from ..llm.router import LLMRouter
+from ..llm.governor import set_llm_session
+from ..tracing import configure_tracing, start_span
 from ..tools.registry import tool_registry
+from ..tools.retriever import ToolRetriever
 from ..tools.base import ToolResult
 from .planner import Planner
 from .executor import Executor
 from .conversation import ConversationManager
 from .session import SessionManager
+from .context_packer import ContextPacker
+from .summarizer import SessionSummarizer
 
 
 class Agent:
@@ -30,10 +35,15 @@ class Agent:
         """
         self.config = config
         self.llm_provider: Optional[BaseLLMProvider] = None
-        self.planner = Planner(config)
+        self.llm_router = LLMRouter(config.llm)
+        self.planner = Planner(config, self.llm_router, tool_registry)
         self.executor = Executor(config)
         self.conversation_manager = ConversationManager(config)
         self.session_manager = SessionManager(config)
+        self.context_packer = ContextPacker(config)
+        self.summarizer = SessionSummarizer(config, self.llm_router)
+        self.tool_retriever = ToolRetriever(tool_registry, config.llm.tool_top_k)
+        configure_tracing(config.tracing_enabled, config.tracing_file, config.app_name)
         
         # 系统提示词
         self.system_prompt = self._create_system_prompt()
@@ -44,46 +54,8 @@ class Agent:
     def _init_llm_provider(self):
         """初始化LLM提供者"""
         try:
-            # 获取默认模型配置
-            default_model = self.config.llm.default_model
-            
-            if default_model.startswith("gpt") or default_model.startswith("openai"):
-                provider_config = {
-                    "api_key": self.config.llm.openai_api_key,
-                    "base_url": self.config.llm.openai_base_url,
-                    "model": self.config.llm.openai_model,
-                    "temperature": self.config.llm.temperature,
-                    "max_tokens": self.config.llm.max_tokens,
-                    "timeout": self.config.llm.timeout
-                }
-                self.llm_provider = LLMFactory.create_provider("openai", provider_config)
-                
-            elif default_model.startswith("claude"):
-                provider_config = {
-                    "api_key": self.config.llm.claude_api_key,
-                    "base_url": self.config.llm.claude_base_url,
-                    "model": self.config.llm.claude_model,
-                    "temperature": self.config.llm.temperature,
-                    "max_tokens": self.config.llm.max_tokens,
-                    "timeout": self.config.llm.timeout
-                }
-                self.llm_provider = LLMFactory.create_provider("claude", provider_config)
-                
-            elif default_model.startswith("deepseek"):
-                provider_config = {
-                    "api_key": self.config.llm.deepseek_api_key,
-                    "base_url": self.config.llm.deepseek_base_url,
-                    "model": self.config.llm.deepseek_model,
-                    "temperature": self.config.llm.temperature,
-                    "max_tokens": self.config.llm.max_tokens,
-                    "timeout": self.config.llm.timeout
-                }
-                self.llm_provider = LLMFactory.create_provider("deepseek", provider_config)
-                
-            else:
-                raise ValueError(f"不支持的默认模型: {default_model}")
-                
-            logger.info(f"已初始化LLM提供者: {default_model}")
+            self.llm_provider = self.llm_router.get_provider("final_answer")
+            logger.info(f"已初始化LLM提供者: {self.llm_router.resolve('final_answer')}")
             
         except Exception as e:
             logger.error(f"初始化LLM提供者失败: {e}")
@@ -138,26 +110,45 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
             stream: 是否流式返回
             
         Yields:
-            处理结果
+            处理结果，均带有本轮的 trace_id
         """
+        # 获取或创建会话
+        if not session_id:
+            session_id = self.session_manager.create_session()
+        
+        with start_span("agent.process_message", session_id=session_id, stream=stream) as span:
+            # 同一会话的轮次按到达顺序串行处理，不同会话并行
+            async with self.session_manager.turn(session_id):
+                async for result in self._process_turn(message, session_id, stream):
+                    result["trace_id"] = span.trace_id
+                    yield result
+    
+    async def _process_turn(
+        self,
+        message: str,
+        session_id: str,
+        stream: bool
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """处理会话中的一轮对话，调用方需持有会话轮次锁"""
         try:
-            # 获取或创建会话
-            if not session_id:
-                session_id = self.session_manager.create_session()
-            session = self.session_manager.get_session(session_id)
+            session = await self.session_manager.get_session_async(session_id)
             if session is None:
                 raise RuntimeError("无法获取会话，请检查session_id")
             
+            # 后续LLM请求按会话公平排队
+            set_llm_session(session_id)
+            session.evidence.begin_turn()
+            
             # 添加用户消息到会话
             user_message = Message(role="user", content=message)
             session.add_message(user_message)
             
             # 制定计划
-            plan = await self.planner.create_plan(message, session.get_messages())
+            plan = await self.planner.create_plan(message, session.get_context_messages(), session.evidence)
             
             # 执行计划
             execution_results = []
-            async for result in self.executor.execute_plan(plan):
+            async for result in self.executor.execute_plan(plan, session.evidence):
                 execution_results.append(result)
                 yield {
                     "type": "execution_step",
@@ -166,11 +157,11 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
                 }
             
             # 生成最终回复
-            context = self._build_context(session.get_messages(), execution_results)
-            
             if self.llm_provider is None:
                 raise RuntimeError("LLM提供者未初始化")
             
+            context = self._build_context(session.get_context_messages(), execution_results)
+            
             if stream:
                 # 流式回复
                 response_content = ""
@@ -189,13 +180,17 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
                 # 添加助手回复到会话
                 assistant_message = Message(role="assistant", content=response_content)
                 session.add_message(assistant_message)
+                await self.session_manager.flush()
+                # 较早的消息在后台并入滚动摘要
+                self.summarizer.maybe_schedule(session)
                 
                 yield {
                     "type": "response_complete",
                     "data": {
                         "content": response_content,
                         "plan": plan,
-                        "execution_results": execution_results
+                        "execution_results": execution_results,
+                        "context": context["packing"]
                     },
                     "session_id": session_id
                 }
@@ -210,6 +205,9 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
                 # 添加助手回复到会话
                 assistant_message = Message(role="assistant", content=response.content)
                 session.add_message(assistant_message)
+                await self.session_manager.flush()
+                # 较早的消息在后台并入滚动摘要
+                self.summarizer.maybe_schedule(session)
                 
                 yield {
                     "type": "response_complete",
@@ -217,7 +215,8 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
                         "content": response.content,
                         "plan": plan,
                         "execution_results": execution_results,
-                        "usage": getattr(response, "usage", None)
+                        "usage": getattr(response, "usage", None),
+                        "context": context["packing"]
                     },
                     "session_id": session_id
                 }
@@ -234,35 +233,40 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
             }
     
     def _build_context(self, messages: List[Message], execution_results: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """构建上下文"""
-        context_messages = []
-        
-        # 添加历史消息
-        for msg in messages[-10:]:  # 只保留最近10条消息
-            context_messages.append(msg)
-        
-        # 添加执行结果
-        if execution_results:
-            execution_summary = "工具执行结果：\n"
-            for result in execution_results:
-                execution_summary += f"- {result.get('tool_name', 'Unknown')}: {result.get('result', {}).get('message', '')}\n"
-            
-            context_messages.append(Message(role="system", content=execution_summary))
+        """构建上下文：按最终回复模型的token预算打包，只附带与问题相关的工具"""
+        question = next((msg.content for msg in reversed(messages) if msg.role == "user"), "")
+        tools = tool_registry.get_tool_schemas(self.tool_retriever.retrieve(question))
+        model_name = self.llm_provider.model_name if self.llm_provider else self.config.llm.default_model
+        context = self.context_packer.pack(
+            self.system_prompt,
+            messages,
+            execution_results,
+            model_name,
+            tools=tools
+        )
         
-        # 添加工具schema
-        tools = tool_registry.get_tool_schemas()
-        
-        return {
-            "messages": context_messages,
-            "tools": tools
-        }
+        packing = context["packing"]
+        logger.debug(
+            f"上下文打包: {packing['total_tokens']}/{packing['budget']} tokens, "
+            f"决策: {packing['decisions']}"
+        )
+        return context
     
     async def get_session_history(self, session_id: str) -> List[Dict[str, Any]]:
         """获取会话历史"""
-        session = self.session_manager.get_session(session_id)
+        session = await self.session_manager.get_session_async(session_id)
         if session is None:
             return []
-        return [msg.dict() for msg in session.get_messages()]
+        # 本进程归档的原始消息在前，未折叠的消息在后
+        return [msg.dict() for msg in session.get_archived_messages() + session.get_messages()]
+    
+    async def get_evidence(self, session_id: str, ref: str) -> Optional[Dict[str, Any]]:
+        """根据 full_result_ref 获取会话证据中的完整结果，不存在或已淘汰时返回None"""
+        session = await self.session_manager.get_session_async(session_id, touch=False)
+        entry = session.evidence.resolve_ref(ref) if session is not None else None
+        if entry is None:
+            return None
+        return {"ref": ref, **entry.to_dict(), "result": entry.result.to_dict()}
     
     async def clear_session(self, session_id: str):
         """清除会话"""
@@ -278,53 +282,54 @@ Kubernetes工具: {', '.join(tools_info['kubernetes'])}
     async def execute_tool(self, tool_name: str, **kwargs) -> ToolResult:
         """直接执行工具"""
         tool = tool_registry.get_tool(tool_name, self.config.kubernetes.dict())
-        return await tool.execute(**kwargs)
+        return await tool.run(**kwargs)
+    
+    async def execute_tool_batch(
+        self,
+        invocations: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        并发执行一批工具调用，按请求顺序产生结果
+        
+        Args:
+            invocations: 工具调用列表，每项包含 tool_name 和 params
+            max_concurrency: 同时执行的调用数，默认使用配置
+            session_id: 指定时复用并更新该会话的证据缓存
+        """
+        session = await self.session_manager.get_session_async(session_id) if session_id else None
+        async for item in self.executor.execute_batch(
+            invocations,
+            max_concurrency or self.config.tool_batch_concurrency,
+            session.evidence if session else None
+        ):
+            yield item
     
     def get_llm_info(self) -> Dict[str, Any]:
         """获取当前LLM信息"""
         if self.llm_provider:
-            return self.llm_provider.get_model_info()
+            return {
+                **self.llm_provider.get_model_info(),
+                "routes": self.llm_router.get_routes()
+            }
         return {}
     
     async def switch_llm_provider(self, provider_name: str) -> bool:
         """切换LLM提供者"""
         try:
-            # 根据提供者名称创建新的提供者实例
+            # 根据提供者名称切换默认路由，单独配置了路由的场景不受影响
             if provider_name.lower() in ["openai", "gpt"]:
-                provider_config = {
-                    "api_key": self.config.llm.openai_api_key,
-                    "base_url": self.config.llm.openai_base_url,
-                    "model": self.config.llm.openai_model,
-                    "temperature": self.config.llm.temperature,
-                    "max_tokens": self.config.llm.max_tokens,
-                    "timeout": self.config.llm.timeout
-                }
-                self.llm_provider = LLMFactory.create_provider("openai", provider_config)
-                
+                name = "openai"
             elif provider_name.lower() in ["claude", "anthropic"]:
-                provider_config = {
-                    "api_key": self.config.llm.claude_api_key,
-                    "base_url": self.config.llm.claude_base_url,
-                    "model": self.config.llm.claude_model,
-                    "temperature": self.config.llm.temperature,
-                    "max_tokens": self.config.llm.max_tokens,
-                    "timeout": self.config.llm.timeout
-                }
-                self.llm_provider = LLMFactory.create_provider("claude", provider_config)
-                
+                name = "claude"
             elif provider_name.lower() == "deepseek":
-                provider_config = {
-                    "api_key": self.config.llm.deepseek_api_key,
-                    "base_url": self.config.llm.deepseek_base_url,
-                    "model": self.config.llm.deepseek_model,
-                    "temperature": self.config.llm.temperature,
-                    "max_tokens": self.config.llm.max_tokens,
-                    "timeout": self.config.llm.timeout
-                }
-                self.llm_provider = LLMFactory.create_provider("deepseek", provider_config)
-                
+                name = "deepseek"
             else:
                 return False
+            
+            self.llm_router.set_default_provider(name)
+            self.llm_provider = self.llm_router.get_provider("final_answer")
                 
             logger.info(f"已切换到LLM提供者: {provider_name}")
             return True
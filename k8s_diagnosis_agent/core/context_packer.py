@@ -0,0 +1,208 @@
+"""
+上下文打包模块
+
+按模型的上下文窗口计算token预算，依次放入系统提示、当前问题、本轮证据和历史消息，
+放不下的证据降级为一行摘要，放不下的历史合并为历史摘要，并记录每一步的打包决策。
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from ..config import Config
+from ..llm.base import Message
+from ..llm.tokens import estimate_tokens, estimate_json_tokens, estimate_messages_tokens
+from ..tools.reducers import ResultReducerRegistry
+from ..tools.render import render_compact
+from .conversation import ConversationManager
+
+
+# 常见模型的上下文窗口（按最长的模型名前缀匹配）
+DEFAULT_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "claude": 200000,
+    "deepseek": 64000,
+}
+
+# 未知模型的保守默认窗口
+FALLBACK_CONTEXT_WINDOW = 8192
+
+# 每条消息的角色与格式开销
+MESSAGE_OVERHEAD = 4
+
+
+class ContextPacker:
+    """按token预算打包最终回复的上下文"""
+
+    def __init__(self, config: Config, result_reducers: Optional[ResultReducerRegistry] = None):
+        self.config = config
+        self.conversation_manager = ConversationManager(config)
+        self.result_reducers = result_reducers or ResultReducerRegistry(
+            config.llm.tool_result_token_budget,
+            config.llm.tool_result_token_budgets
+        )
+        self.context_windows = {**DEFAULT_CONTEXT_WINDOWS, **(config.llm.context_windows or {})}
+
+    def get_context_window(self, model_name: str) -> int:
+        """获取模型的上下文窗口大小"""
+        model_name = (model_name or "").lower()
+        for prefix in sorted(self.context_windows, key=len, reverse=True):
+            if model_name.startswith(prefix.lower()):
+                return self.context_windows[prefix]
+        return FALLBACK_CONTEXT_WINDOW
+
+    def get_budget(self, model_name: str) -> int:
+        """获取输入token预算：上下文窗口减去为回复预留的token数"""
+        return max(self.get_context_window(model_name) - self.config.llm.max_tokens, 0)
+
+    def pack(
+        self,
+        system_prompt: str,
+        messages: List[Message],
+        execution_results: List[Dict[str, Any]],
+        model_name: str,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        打包上下文
+
+        Args:
+            system_prompt: 系统提示词
+            messages: 会话消息，最后一条用户消息视为当前问题
+            execution_results: 本轮工具执行结果
+            model_name: 目标模型名称
+            tools: 随请求发送的工具schema
+
+        Returns:
+            包含 messages、tools 和 packing（打包决策与token统计）的字典
+        """
+        budget = self.get_budget(model_name)
+        decisions: List[Dict[str, Any]] = []
+        counts = {"system_prompt": 0, "question": 0, "evidence": 0, "history": 0, "tools": 0}
+
+        # 1. 系统提示与工具schema必须发送
+        counts["system_prompt"] = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD
+        counts["tools"] = estimate_json_tokens(tools) if tools else 0
+        remaining = budget - counts["system_prompt"] - counts["tools"]
+
+        # 2. 当前问题
+        history = self.conversation_manager.format_conversation(messages)
+        question: Optional[Message] = None
+        if history and history[-1].role == "user":
+            question = history[-1]
+            history = history[:-1]
+        if question is not None:
+            counts["question"] = estimate_messages_tokens([question])
+            remaining -= counts["question"]
+
+        # 3. 本轮证据：优先放入归约后的数据，放不下时降级为一行摘要
+        evidence_lines = []
+        for result in execution_results:
+            full_line, summary_line = self._format_evidence(result)
+            item = f"evidence:{result.get('tool_name', 'unknown')}"
+            full_tokens = estimate_tokens(full_line) + 1
+            summary_tokens = estimate_tokens(summary_line) + 1
+            if full_tokens <= remaining:
+                evidence_lines.append(full_line)
+                remaining -= full_tokens
+                counts["evidence"] += full_tokens
+                decisions.append({"item": item, "action": "included", "tokens": full_tokens})
+            elif summary_tokens <= remaining:
+                evidence_lines.append(summary_line)
+                remaining -= summary_tokens
+                counts["evidence"] += summary_tokens
+                decisions.append({"item": item, "action": "summarized", "tokens": summary_tokens})
+            else:
+                decisions.append({"item": item, "action": "dropped", "tokens": full_tokens})
+
+        evidence_message = None
+        if evidence_lines:
+            evidence_message = Message(role="system", content="工具执行结果：\n" + "\n".join(evidence_lines))
+            counts["evidence"] += MESSAGE_OVERHEAD
+            remaining -= MESSAGE_OVERHEAD
+
+        # 4. 历史消息：从新到旧原样放入，放不下的更早消息合并为历史摘要
+        kept_history: List[Message] = []
+        for index in range(len(history) - 1, -1, -1):
+            tokens = estimate_messages_tokens([history[index]])
+            if tokens > remaining:
+                break
+            kept_history.insert(0, history[index])
+            remaining -= tokens
+            counts["history"] += tokens
+        if kept_history:
+            decisions.append({"item": "history", "action": "included", "messages": len(kept_history), "tokens": counts["history"]})
+
+        dropped_history = history[:len(history) - len(kept_history)]
+        if dropped_history:
+            summary_message = self._summarize_history(dropped_history, remaining)
+            if summary_message is not None:
+                tokens = estimate_messages_tokens([summary_message])
+                kept_history.insert(0, summary_message)
+                remaining -= tokens
+                counts["history"] += tokens
+                decisions.append({"item": "history", "action": "summarized", "messages": len(dropped_history), "tokens": tokens})
+            else:
+                decisions.append({"item": "history", "action": "dropped", "messages": len(dropped_history)})
+
+        context_messages = list(kept_history)
+        if question is not None:
+            context_messages.append(question)
+        if evidence_message is not None:
+            context_messages.append(evidence_message)
+
+        total = sum(counts.values())
+        return {
+            "messages": context_messages,
+            "tools": tools,
+            "packing": {
+                "model": model_name,
+                "budget": budget,
+                "total_tokens": total,
+                "remaining_tokens": budget - total,
+                "token_counts": counts,
+                "decisions": decisions,
+            }
+        }
+
+    def _format_evidence(self, result: Dict[str, Any]) -> Tuple[str, str]:
+        """格式化单个工具结果，返回(含数据的完整行, 一行摘要)"""
+        tool_name = result.get("tool_name", "Unknown")
+        tool_result = result.get("result", {}) or {}
+        summary_line = f"- {tool_name}: {tool_result.get('message') or tool_result.get('error') or ''}"
+
+        data = tool_result.get("data")
+        delta = (tool_result.get("metadata") or {}).get("delta")
+        if delta is not None:
+            summary_line += f"（相对{tool_result['metadata'].get('delta_since_seconds')}秒前结果的增量）"
+            data = delta
+        if data is None:
+            return summary_line, summary_line
+        data, _, reduced = self.result_reducers.reduce_data(tool_name, data)
+        rendered = render_compact(data).replace("\n", "\n  ")
+        # 完整结果保存在会话证据中时附带引用，可通过 GET /session/{id}/evidence/{ref} 取回；
+        # 只在数据被精简或省略时给出
+        ref = result.get("full_result_ref")
+        ref_note = f"（完整结果 full_result_ref={ref}）" if ref else ""
+        full_line = f"{summary_line}{ref_note if reduced else ''}\n  {rendered}"
+        return full_line, summary_line + ref_note
+
+    def _summarize_history(self, messages: List[Message], budget: int) -> Optional[Message]:
+        """把放不下的历史消息合并为一条摘要，按从新到旧保留每条消息的开头"""
+        header = f"更早的对话摘要（{self.conversation_manager.get_conversation_summary(messages)}）："
+        budget -= MESSAGE_OVERHEAD + estimate_tokens(header)
+        if budget <= 0:
+            return None
+
+        lines: List[str] = []
+        for msg in reversed(messages):
+            if msg.role not in ("user", "assistant"):
+                continue
+            line = f"- {msg.role}: {msg.content[:100].replace(chr(10), ' ')}"
+            tokens = estimate_tokens(line) + 1
+            if tokens > budget:
+                break
+            lines.insert(0, line)
+            budget -= tokens
+
+        return Message(role="system", content="\n".join([header] + lines))
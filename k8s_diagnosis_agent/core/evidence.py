@@ -0,0 +1,346 @@
+"""
+会话证据存储
+
+保存会话内已采集的工具结果及采集时间，按工具配置的新鲜度判断能否复用。
+后续轮次中相同参数的工具调用直接复用仍新鲜的结果；查询单个对象时，
+若同一范围的列表结果仍新鲜，则从列表中筛出目标对象（收窄），不再访问集群。
+重新执行得到的增量随证据保存，同一轮次内复用时（如规划器执行后执行器再次调用）仍附带增量。
+每条证据有一个由证据键生成的短引用，归约结果中的 full_result_ref 使用该引用，
+轮次结束后仍可通过 resolve_ref 取回完整结果。
+"""
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from ..tools.base import BaseTool, ToolResult, ToolStatus
+from ..metrics import CACHE_LOOKUPS
+
+
+# 各工具结果的默认新鲜期（秒），变化越快的数据新鲜期越短
+DEFAULT_EVIDENCE_TTLS: Dict[str, int] = {
+    "k8s_cluster_info": 600,
+    "k8s_node_info": 300,
+    "k8s_pod_info": 120,
+    "k8s_service_info": 300,
+    "k8s_events": 60,
+    "k8s_logs": 30,
+    "k8s_resource_usage": 60,
+    "k8s_network": 300,
+    "k8s_storage": 300,
+    "k8s_security": 600,
+    "system_info": 120,
+    "network_diagnostic": 60,
+    "filesystem": 60,
+    "process": 30,
+}
+
+# 工具参数的默认值，规范化后 {} 与 {"namespace": "default"} 视为同一次调用
+DEFAULT_TOOL_PARAMS: Dict[str, Dict[str, Any]] = {
+    "k8s_pod_info": {"namespace": "default"},
+    "k8s_events": {"namespace": "default"},
+    "k8s_logs": {"namespace": "default", "tail_lines": 100},
+    "k8s_service_info": {"namespace": "default"},
+}
+
+# 增量相关的结果元数据，只在采集证据的轮次内随复用结果返回
+DELTA_METADATA_KEYS = ("delta", "delta_since_seconds")
+
+# 可收窄的工具：(单对象参数名, 结果列表字段, 对象名字段)
+NARROWABLE_TOOLS: Dict[str, Tuple[str, str, str]] = {
+    "k8s_pod_info": ("pod_name", "pods", "name"),
+    "k8s_node_info": ("node_name", "nodes", "name"),
+    "k8s_service_info": ("service_name", "services", "name"),
+}
+
+
+class EvidenceEntry:
+    """一条证据"""
+
+    def __init__(
+        self,
+        tool_name: str,
+        params: Dict[str, Any],
+        result: ToolResult,
+        ttl: float,
+        collected_at: Optional[float] = None,
+        turn: int = -1
+    ):
+        self.tool_name = tool_name
+        self.params = params
+        self.result = result
+        self.ttl = ttl
+        self.collected_at = collected_at or time.time()
+        # 采集证据的轮次，从后端恢复的证据为-1
+        self.turn = turn
+        self.size_bytes = len(json.dumps(result.data, ensure_ascii=False, default=str).encode("utf-8"))
+
+    def age(self) -> float:
+        """证据年龄（秒）"""
+        return time.time() - self.collected_at
+
+    def is_fresh(self) -> bool:
+        """是否仍在新鲜期内"""
+        return self.age() <= self.ttl
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（不含结果数据）"""
+        return {
+            "tool_name": self.tool_name,
+            "params": self.params,
+            "age_seconds": round(self.age(), 1),
+            "ttl": self.ttl,
+            "fresh": self.is_fresh(),
+            "message": self.result.message,
+        }
+
+    def serialize(self) -> Dict[str, Any]:
+        """序列化为可持久化的字典（含结果数据）"""
+        return {
+            "tool_name": self.tool_name,
+            "params": self.params,
+            "result": self.result.to_dict(),
+            "ttl": self.ttl,
+            "collected_at": self.collected_at,
+        }
+
+    @classmethod
+    def deserialize(cls, data: Dict[str, Any]) -> "EvidenceEntry":
+        """从 serialize 的结果恢复"""
+        return cls(
+            data["tool_name"], data["params"], ToolResult.from_dict(data["result"]),
+            data["ttl"], data["collected_at"]
+        )
+
+
+class EvidenceStore:
+    """会话级证据存储"""
+
+    def __init__(
+        self,
+        default_ttl: float = 60,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = 100
+    ):
+        """
+        初始化证据存储
+
+        Args:
+            default_ttl: 未单独配置的工具的新鲜期（秒）
+            ttls: 按工具名覆盖的新鲜期
+            max_entries: 最多保留的证据条数，超出时淘汰最久未使用的
+        """
+        self.default_ttl = default_ttl
+        self.ttls = {**DEFAULT_EVIDENCE_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, EvidenceEntry]" = OrderedDict()
+        # 引用 -> 证据键
+        self._refs: Dict[str, str] = {}
+        self.size_bytes = 0
+        # 保存证据后的回调（键, 证据），用于写入共享后端
+        self.on_put: Optional[Callable[[str, EvidenceEntry], None]] = None
+        self.hits = 0
+        self.narrowed = 0
+        self.misses = 0
+        # 当前轮次，由 begin_turn 递增
+        self.turn = 0
+
+    @staticmethod
+    def normalize_params(tool_name: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """补全默认参数并去掉空值"""
+        merged = {**DEFAULT_TOOL_PARAMS.get(tool_name, {}), **(params or {})}
+        return {key: value for key, value in merged.items() if value is not None and value != ""}
+
+    def _key(self, tool_name: str, params: Dict[str, Any]) -> str:
+        return f"{tool_name}:{json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    @staticmethod
+    def _ref(key: str) -> str:
+        # 由证据键生成，各副本从共享后端恢复的证据引用相同
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def ref_for(self, tool_name: str, params: Optional[Dict[str, Any]]) -> Optional[str]:
+        """已保存的相同调用的证据引用，没有时返回None"""
+        key = self._key(tool_name, self.normalize_params(tool_name, params))
+        return self._ref(key) if key in self._entries else None
+
+    def resolve_ref(self, ref: str) -> Optional[EvidenceEntry]:
+        """根据引用获取证据（不论是否新鲜），已淘汰时返回None"""
+        key = self._refs.get(ref)
+        return self._entries.get(key) if key is not None else None
+
+    def get_ttl(self, tool_name: str) -> float:
+        """获取工具结果的新鲜期"""
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def begin_turn(self):
+        """开始新的对话轮次，之前轮次保存的增量不再随复用结果返回"""
+        self.turn += 1
+    
+    def put(self, tool_name: str, params: Optional[Dict[str, Any]], result: ToolResult):
+        """保存工具结果，只保存成功的结果；结果的增量元数据一并保存"""
+        if result.status != ToolStatus.SUCCESS:
+            return
+        params = self.normalize_params(tool_name, params)
+        key = self._key(tool_name, params)
+        entry = EvidenceEntry(tool_name, params, result, self.get_ttl(tool_name), turn=self.turn)
+        self.restore(key, entry)
+        if self.on_put is not None:
+            self.on_put(key, entry)
+
+    def restore(self, key: str, entry: EvidenceEntry):
+        """放入一条证据（从后端加载时使用原采集时间）"""
+        self._discard(key)
+        self._entries[key] = entry
+        self._refs[self._ref(key)] = key
+        self.size_bytes += entry.size_bytes
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: str):
+        """删除一条证据并更新占用字节数"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._refs.pop(self._ref(key), None)
+            self.size_bytes -= entry.size_bytes
+
+    def get(self, tool_name: str, params: Optional[Dict[str, Any]]) -> Optional[Tuple[ToolResult, str]]:
+        """
+        查找仍新鲜的证据
+
+        Returns:
+            (工具结果, "reused" 或 "narrowed")，没有可用证据时返回None
+        """
+        params = self.normalize_params(tool_name, params)
+        key = self._key(tool_name, params)
+        entry = self._entries.get(key)
+        if entry is not None and entry.is_fresh():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_LOOKUPS.labels("evidence", "hit").inc()
+            result = entry.result
+            if entry.turn != self.turn:
+                # 增量只对采集它的轮次有意义，之后的轮次复用完整结果
+                result = ToolResult(
+                    status=result.status, data=result.data, message=result.message, error=result.error,
+                    metadata={k: v for k, v in result.metadata.items() if k not in DELTA_METADATA_KEYS}
+                )
+            return self._annotate(result, entry, "reused"), "reused"
+
+        narrowed = self._narrow(tool_name, params)
+        if narrowed is not None:
+            self.narrowed += 1
+            CACHE_LOOKUPS.labels("evidence", "narrowed").inc()
+            return narrowed, "narrowed"
+
+        self.misses += 1
+        CACHE_LOOKUPS.labels("evidence", "miss").inc()
+        return None
+
+    def get_previous(self, tool_name: str, params: Optional[Dict[str, Any]]) -> Optional[EvidenceEntry]:
+        """获取相同参数的上次证据（不论是否新鲜），用于增量对比"""
+        params = self.normalize_params(tool_name, params)
+        return self._entries.get(self._key(tool_name, params))
+
+    def _narrow(self, tool_name: str, params: Dict[str, Any]) -> Optional[ToolResult]:
+        """从同一范围的新鲜列表结果中筛出单个对象"""
+        rule = NARROWABLE_TOOLS.get(tool_name)
+        if rule is None:
+            return None
+        param_name, list_field, name_field = rule
+        target = params.get(param_name)
+        if target is None:
+            return None
+
+        scope = {key: value for key, value in params.items() if key != param_name}
+        entry = self._entries.get(self._key(tool_name, scope))
+        if entry is None or not entry.is_fresh() or not isinstance(entry.result.data, dict):
+            return None
+
+        matches = [item for item in entry.result.data.get(list_field) or [] if item.get(name_field) == target]
+        if not matches:
+            # 列表中不存在该对象，仍交给工具查询以获得准确的错误信息
+            return None
+        result = ToolResult(
+            status=ToolStatus.SUCCESS,
+            data={list_field: matches},
+            message=entry.result.message
+        )
+        return self._annotate(result, entry, "narrowed")
+
+    @staticmethod
+    def _annotate(result: ToolResult, entry: EvidenceEntry, mode: str) -> ToolResult:
+        """返回带证据来源信息的结果副本"""
+        return ToolResult(
+            status=result.status,
+            data=result.data,
+            message=result.message,
+            error=result.error,
+            metadata={
+                **result.metadata,
+                "evidence": mode,
+                "evidence_age_seconds": round(entry.age(), 1),
+            }
+        )
+
+    def fresh_entries(self) -> List[EvidenceEntry]:
+        """获取所有仍新鲜的证据"""
+        return [entry for entry in self._entries.values() if entry.is_fresh()]
+
+    def invalidate(self, tool_name: Optional[str] = None):
+        """使证据失效，不指定工具时清空全部"""
+        if tool_name is None:
+            self._entries.clear()
+            self._refs.clear()
+            self.size_bytes = 0
+            return
+        for key in [key for key, entry in self._entries.items() if entry.tool_name == tool_name]:
+            self._discard(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "entries": len(self._entries),
+            "fresh_entries": len(self.fresh_entries()),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "narrowed": self.narrowed,
+            "misses": self.misses,
+        }
+
+
+async def execute_with_evidence(
+    tool_name: str,
+    params: Dict[str, Any],
+    tool_factory: Callable[[], BaseTool],
+    evidence_store: Optional[EvidenceStore] = None,
+    delta_results: bool = True
+) -> ToolResult:
+    """
+    执行工具并维护会话证据
+
+    新鲜证据直接复用或收窄；否则执行工具并保存完整结果，若存在相同参数的
+    上次结果，则在返回结果的 metadata["delta"] 中附带增量。增量随证据保存，
+    同一轮次内再次复用时仍附带增量。
+
+    Args:
+        tool_name: 工具注册名
+        params: 工具参数
+        tool_factory: 创建工具实例的函数
+        evidence_store: 会话证据存储
+        delta_results: 是否计算增量结果
+    """
+    previous = None
+    if evidence_store is not None:
+        cached = evidence_store.get(tool_name, params)
+        if cached is not None:
+            return cached[0]
+        previous = evidence_store.get_previous(tool_name, params)
+
+    tool = tool_factory()
+    result = await tool.run(**params)
+    if evidence_store is not None:
+        if previous is not None and delta_results:
+            result = tool.diff_result(previous.result, result, previous.age())
+        evidence_store.put(tool_name, params, result)
+    return result
@@ -1,11 +1,14 @@
 """
 执行器模块
 """
+import json
 import asyncio
 from typing import Dict, Any, List, Optional, AsyncIterator
 from ..config import Config
+from ..tools.base import ToolResult
 from ..tools.registry import tool_registry
 from .planner import DiagnosisPlan
+from .evidence import EvidenceStore, execute_with_evidence
 
 
 class Executor:
@@ -14,26 +17,44 @@ class Executor:
     def __init__(self, config: Config):
         self.config = config
     
-    async def execute_plan(self, plan: DiagnosisPlan) -> AsyncIterator[Dict[str, Any]]:
-        """执行诊断计划"""
+    async def execute_plan(
+        self,
+        plan: DiagnosisPlan,
+        evidence_store: Optional[EvidenceStore] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        执行诊断计划
+        
+        Args:
+            plan: 诊断计划
+            evidence_store: 会话证据存储，新鲜的结果直接复用
+        """
         for step in plan.steps:
             try:
                 # 获取工具
-                tool_name = step["tool"]
+                tool_name = tool_registry.resolve_tool_name(step["tool"])
                 tool_params = step.get("params", {})
                 
-                # 创建工具实例
-                tool = tool_registry.get_tool(tool_name, self.config.kubernetes.__dict__)
+                # 复用新鲜证据，或创建工具实例执行并附带相对上次结果的增量
+                result = await execute_with_evidence(
+                    tool_name,
+                    tool_params,
+                    lambda: tool_registry.get_tool(tool_name, self.config.kubernetes.__dict__),
+                    evidence_store,
+                    self.config.delta_results
+                )
                 
-                # 执行工具
-                result = await tool.execute(**tool_params)
-                
-                yield {
+                item = {
                     "tool_name": tool_name,
                     "description": step.get("description", ""),
                     "result": result.to_dict(),
                     "success": result.is_success()
                 }
+                # 结果保存在会话证据中时附带引用，精简后的结果可据此取回完整数据
+                ref = evidence_store.ref_for(tool_name, tool_params) if evidence_store is not None else None
+                if ref is not None:
+                    item["full_result_ref"] = ref
+                yield item
                 
             except Exception as e:
                 yield {
@@ -51,7 +72,7 @@ class Executor:
         """执行单个工具"""
         try:
             tool = tool_registry.get_tool(tool_name, self.config.kubernetes.__dict__)
-            result = await tool.execute(**kwargs)
+            result = await tool.run(**kwargs)
             
             return {
                 "tool_name": tool_name,
@@ -68,4 +89,83 @@ class Executor:
                     "message": f"执行工具失败: {str(e)}"
                 },
                 "success": False
-            } 
\ No newline at end of file
+            }
+    
+    async def execute_batch(
+        self,
+        invocations: List[Dict[str, Any]],
+        max_concurrency: int = 8,
+        evidence_store: Optional[EvidenceStore] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        并发执行一批工具调用，按请求顺序逐个产生结果
+        
+        工具实例（及其API客户端）由注册表按配置共享，工具名和参数相同的调用只执行一次。
+        
+        Args:
+            invocations: 工具调用列表，每项包含 tool_name 和 params
+            max_concurrency: 同时执行的调用数
+            evidence_store: 证据存储，新鲜的结果直接复用，执行结果写回
+        """
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        shared: Dict[str, asyncio.Task] = {}
+        
+        async def run(tool_name: str, params: Dict[str, Any]) -> ToolResult:
+            async with semaphore:
+                return await execute_with_evidence(
+                    tool_name,
+                    params,
+                    lambda: tool_registry.get_tool(tool_name, self.config.kubernetes.__dict__),
+                    evidence_store,
+                    self.config.delta_results
+                )
+        
+        async def execute(index: int, invocation: Dict[str, Any], task: Optional[asyncio.Task],
+                          error: Optional[str]) -> Dict[str, Any]:
+            tool_name = invocation.get("tool_name", "unknown")
+            try:
+                if task is None:
+                    raise ValueError(error)
+                result = await task
+                return {
+                    "index": index,
+                    "tool_name": tool_name,
+                    "result": result.to_dict(),
+                    "success": result.is_success(),
+                    "message": result.message
+                }
+            except Exception as e:
+                return {
+                    "index": index,
+                    "tool_name": tool_name,
+                    "result": {
+                        "status": "error",
+                        "error": str(e),
+                        "message": f"执行工具失败: {str(e)}"
+                    },
+                    "success": False,
+                    "message": f"执行工具失败: {str(e)}"
+                }
+        
+        pending = []
+        for index, invocation in enumerate(invocations):
+            task, error = None, None
+            try:
+                tool_name = tool_registry.resolve_tool_name(invocation.get("tool_name", ""))
+                params = invocation.get("params") or {}
+                key = f"{tool_name}:{json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)}"
+                if key not in shared:
+                    shared[key] = asyncio.create_task(run(tool_name, params))
+                task = shared[key]
+            except ValueError as e:
+                error = str(e)
+            pending.append(asyncio.create_task(execute(index, invocation, task, error)))
+        
+        try:
+            # 按请求顺序产生，前面的调用完成后后面已完成的结果立即跟上
+            for item in pending:
+                yield await item
+        finally:
+            for task in [*pending, *shared.values()]:
+                task.cancel()
+            await asyncio.gather(*pending, *shared.values(), return_exceptions=True)
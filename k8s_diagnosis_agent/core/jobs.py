@@ -0,0 +1,309 @@
+"""
+异步诊断任务
+
+诊断请求放入有界的优先级队列，由固定数量的后台worker执行，HTTP请求只负责
+提交和查询，不再在整个规划、执行、总结过程中占用连接。任务的进度事件保存在任务中，
+可以随时查询或订阅；流式回复片段只推送给在线订阅者，不逐条保存，中途订阅时合并为一个
+事件回放，完整回复保存在 response_complete 事件中。完成的任务保留最近若干个供获取结果。
+"""
+import time
+import uuid
+import asyncio
+from enum import Enum
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, AsyncIterator, Callable, Set
+from loguru import logger
+
+from ..metrics import QUEUE_DEPTH, register_collect_hook
+
+
+class JobStatus(Enum):
+    """任务状态"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """任务队列已满"""
+    pass
+
+
+class Job:
+    """诊断任务"""
+
+    def __init__(self, message: str, session_id: Optional[str] = None, priority: int = 0, sequence: int = 0):
+        self.job_id = str(uuid.uuid4())
+        self.message = message
+        self.session_id = session_id
+        self.priority = priority
+        # 提交序号，同优先级的任务按序号出队
+        self.sequence = sequence
+        self.status = JobStatus.QUEUED
+        self.events: List[Dict[str, Any]] = []
+        # 正在生成的回复片段，收到 response_complete 后清空
+        self._chunks: List[str] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.trace_id: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def publish(self, event: Dict[str, Any]):
+        """记录进度事件并通知订阅者，回复片段只暂存到回复完成"""
+        if event.get("type") == "response_chunk":
+            self._chunks.append(event.get("data") or "")
+        else:
+            self._chunks = []
+            self.events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def finish(self, status: JobStatus, error: Optional[str] = None):
+        """结束任务并通知订阅者"""
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        """依次产生已有事件和后续事件，任务结束后以状态事件收尾"""
+        # 快照和登记之间没有await，之后的事件只会进入队列，不会重复
+        queue: asyncio.Queue = asyncio.Queue()
+        history = list(self.events)
+        if self._chunks:
+            history.append({"type": "response_chunk", "data": "".join(self._chunks), "session_id": self.session_id})
+        finished = self.finished
+        self._subscribers.add(queue)
+        try:
+            for event in history:
+                yield event
+            while not finished:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {"type": "job_status", "data": self.to_dict(), "session_id": self.session_id}
+        finally:
+            self._subscribers.discard(queue)
+
+    def to_dict(self, include_events: bool = False) -> Dict[str, Any]:
+        """转换为字典"""
+        data = {
+            "job_id": self.job_id,
+            "status": self.status.value,
+            "priority": self.priority,
+            "session_id": self.session_id,
+            "message": self.message,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "event_count": len(self.events),
+            "result": self.result,
+            "error": self.error,
+            "trace_id": self.trace_id,
+        }
+        if include_events:
+            data["events"] = self.events
+        return data
+
+
+class JobManager:
+    """诊断任务管理器：有界优先级队列加固定数量的worker"""
+
+    def __init__(
+        self,
+        runner: Callable[[Job], AsyncIterator[Dict[str, Any]]],
+        max_workers: int = 4,
+        max_queue: int = 100,
+        retention: int = 500
+    ):
+        """
+        Args:
+            runner: 执行任务的函数，返回Agent事件流
+            max_workers: 同时执行的任务数
+            max_queue: 排队任务数上限，超出时拒绝提交
+            retention: 保留的已结束任务数
+        """
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._started = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        register_collect_hook("jobs", self._update_metrics)
+
+    def _update_metrics(self):
+        QUEUE_DEPTH.labels("jobs").set(len([job for job in self.jobs.values() if job.status == JobStatus.QUEUED]))
+
+    def start(self):
+        """启动worker，需在事件循环中调用"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def stop(self):
+        """停止worker，正在执行的任务被取消"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, message: str, session_id: Optional[str] = None, priority: int = 0) -> Job:
+        """
+        提交任务
+
+        Args:
+            priority: 优先级，数值越大越先执行，同优先级按提交顺序
+
+        Raises:
+            JobQueueFullError: 排队任务数已达上限
+        """
+        self.start()
+        self._sequence += 1
+        job = Job(message, session_id, priority, self._sequence)
+        try:
+            self._queue.put_nowait((-priority, job.sequence, job))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise JobQueueFullError(f"任务队列已满（{self.max_queue}）")
+        self.jobs[job.job_id] = job
+        self._evict()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """获取任务"""
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队或执行中的任务"""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # 排队中的任务从队列中移除，释放排队名额
+            self._discard_queued(job)
+            job.finish(JobStatus.CANCELLED)
+            self.cancelled += 1
+        return True
+
+    def _discard_queued(self, job: Job):
+        """从优先级队列中移除排队任务"""
+        entries = []
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            self._queue.task_done()
+            if entry[2] is not job:
+                entries.append(entry)
+        for entry in entries:
+            self._queue.put_nowait(entry)
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        """排队任务的位置（从1开始），与队列的出队顺序一致"""
+        if job.status != JobStatus.QUEUED:
+            return None
+        ahead = [
+            other for other in self.jobs.values()
+            if other.status == JobStatus.QUEUED and (-other.priority, other.sequence) < (-job.priority, job.sequence)
+        ]
+        return len(ahead) + 1
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.status != JobStatus.QUEUED:
+                    continue
+                job.status = JobStatus.RUNNING
+                job.started_at = time.time()
+                self._started += 1
+                self._wait_seconds += job.started_at - job.created_at
+                # 任务在单独的Task中执行，取消任务不会影响worker
+                job.task = asyncio.create_task(self._run(job))
+                try:
+                    await asyncio.wait([job.task])
+                except asyncio.CancelledError:
+                    job.task.cancel()
+                    await asyncio.gather(job.task, return_exceptions=True)
+                    raise
+                finally:
+                    # 在开始执行前就被取消的任务
+                    if not job.finished:
+                        job.finish(JobStatus.CANCELLED)
+                        self.cancelled += 1
+            finally:
+                job.task = None
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        try:
+            async for event in self.runner(job):
+                job.publish(event)
+                job.trace_id = event.get("trace_id", job.trace_id)
+                if event.get("type") == "response_complete":
+                    job.result = event.get("data")
+                elif event.get("type") == "error":
+                    job.error = (event.get("data") or {}).get("error")
+            if job.error:
+                job.finish(JobStatus.FAILED, job.error)
+                self.failed += 1
+            else:
+                job.finish(JobStatus.COMPLETED)
+                self.completed += 1
+        except asyncio.CancelledError:
+            job.finish(JobStatus.CANCELLED)
+            self.cancelled += 1
+            raise
+        except Exception as e:
+            logger.error(f"诊断任务 {job.job_id} 失败: {e}")
+            job.finish(JobStatus.FAILED, str(e))
+            self.failed += 1
+        finally:
+            self._run_seconds += time.time() - job.started_at
+
+    def _evict(self):
+        """只保留最近的已结束任务"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.retention, 0)]:
+            del self.jobs[job_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计"""
+        running = len([job for job in self.jobs.values() if job.status == JobStatus.RUNNING])
+        return {
+            "workers": self.max_workers,
+            "queued": len([job for job in self.jobs.values() if job.status == JobStatus.QUEUED]),
+            "running": running,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self._wait_seconds / self._started, 3) if self._started else 0.0,
+            "avg_run_seconds": round(self._run_seconds / max(self._started - running, 1), 3),
+        }
@@ -7,18 +7,25 @@ AI Agent 智能计划器模块
 - 任务执行后的效果评估和review
 - 自动总结生成
 """
+import copy
 import json
 import uuid
 import asyncio
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 from enum import Enum
 from dataclasses import dataclass, asdict
 from ..config import Config
-from ..llm.base import Message, BaseLLMProvider
-from ..llm.factory import LLMFactory
+from ..llm.base import Message, BaseLLMProvider, ToolCall
+from ..llm.router import LLMRouter
 from ..tools.registry import ToolRegistry
+from ..tools.retriever import ToolRetriever
 from ..tools.base import ToolResult, ToolStatus
+from ..tools.reducers import ResultReducerRegistry
+from ..tools.render import render_compact
+from ..metrics import PLAN_PHASE_SECONDS
+from ..tracing import start_span
+from .evidence import EvidenceStore, execute_with_evidence
 
 
 class TaskStatus(Enum):
@@ -177,43 +184,89 @@ class TodoManager:
 class AIPlanner:
     """AI智能规划器 - 基于ReAct模式"""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, llm_router: Optional[LLMRouter] = None,
+                 tool_registry: Optional[ToolRegistry] = None):
         self.config = config
         self.llm_provider: Optional[BaseLLMProvider] = None
-        self.tool_registry = ToolRegistry()
+        self.llm_router = llm_router
+        # 未指定时使用独立的注册表，Agent传入全局注册表避免重复创建工具实例
+        self.tool_registry = tool_registry if tool_registry is not None else ToolRegistry()
+        self.tool_retriever = ToolRetriever(self.tool_registry, config.llm.tool_top_k)
+        self.result_reducers = ResultReducerRegistry(
+            config.llm.tool_result_token_budget,
+            config.llm.tool_result_token_budgets
+        )
         self.todo_manager = TodoManager()
         self.conversation_history: List[Message] = []
+        self.evidence_store: Optional[EvidenceStore] = None
         self._init_llm()
     
+    def fork(self) -> "AIPlanner":
+        """
+        创建单轮使用的规划器副本
+        
+        共享LLM路由、工具注册表、检索器和结果精简器，任务列表、会话历史和证据存储
+        各自独立，不同会话的轮次可以并行执行而互不干扰。
+        """
+        planner = copy.copy(self)
+        planner.todo_manager = TodoManager()
+        planner.conversation_history = []
+        planner.evidence_store = None
+        return planner
+    
     def _init_llm(self):
         """初始化LLM提供者"""
         try:
-            llm_config = {
-                "api_key": self.config.llm.openai_api_key,
-                "base_url": self.config.llm.openai_base_url,
-                "model": self.config.llm.openai_model,
-                "temperature": self.config.llm.temperature,
-                "max_tokens": self.config.llm.max_tokens,
-                "timeout": self.config.llm.timeout
-            }
-            provider_name = "openai"  # 默认使用OpenAI
-            self.llm_provider = LLMFactory.create_provider(provider_name, llm_config)
+            if self.llm_router is None:
+                self.llm_router = LLMRouter(self.config.llm)
+            self.llm_provider = self.llm_router.get_provider("plan")
         except Exception as e:
             print(f"警告：无法初始化LLM提供者: {e}")
     
+    def _get_llm(self, call_site: str) -> Optional[BaseLLMProvider]:
+        """获取调用场景对应的LLM提供者，路由失败时退回规划使用的提供者"""
+        if self.llm_router is None:
+            return self.llm_provider
+        try:
+            return self.llm_router.get_provider(call_site)
+        except Exception as e:
+            print(f"警告：无法获取 {call_site} 场景的LLM提供者: {e}")
+            return self.llm_provider
+    
     async def create_diagnosis_plan(self, user_message: str, 
-                                  conversation_history: List[Message]) -> Dict[str, Any]:
-        """创建诊断计划 - 主入口方法"""
-        self.conversation_history = conversation_history.copy()
-        
-        # Phase 1: Reasoning - 理解用户意图并制定计划
-        plan_result = await self._reasoning_phase(user_message)
+                                  conversation_history: List[Message],
+                                  evidence_store: Optional[EvidenceStore] = None) -> Dict[str, Any]:
+        """
+        创建诊断计划 - 主入口方法
         
-        # Phase 2: Acting - 执行任务
-        execution_result = await self._acting_phase()
+        Args:
+            user_message: 用户消息
+            conversation_history: 会话历史
+            evidence_store: 会话证据存储，新鲜的结果直接复用而不重复执行工具
+        """
+        self.conversation_history = conversation_history.copy()
+        self.evidence_store = evidence_store
+        
+        # 优先使用原生函数调用循环，模型不支持或调用失败时退回文本JSON规划
+        function_calling_result = None
+        if self.config.llm.native_tool_calling:
+            with PLAN_PHASE_SECONDS.labels("function_calling").time(), start_span("planner.function_calling"):
+                function_calling_result = await self._function_calling_phase(user_message)
+        
+        if function_calling_result is not None:
+            plan_result, execution_result = function_calling_result
+        else:
+            # Phase 1: Reasoning - 理解用户意图并制定计划
+            with PLAN_PHASE_SECONDS.labels("reasoning").time(), start_span("planner.reasoning"):
+                plan_result = await self._reasoning_phase(user_message)
+            
+            # Phase 2: Acting - 执行任务
+            with PLAN_PHASE_SECONDS.labels("acting").time(), start_span("planner.acting"):
+                execution_result = await self._acting_phase()
         
         # Phase 3: Observing - 观察结果并生成总结
-        final_result = await self._observing_phase()
+        with PLAN_PHASE_SECONDS.labels("observing").time(), start_span("planner.observing"):
+            final_result = await self._observing_phase()
         
         return {
             "plan": plan_result,
@@ -224,19 +277,20 @@ class AIPlanner:
     
     async def _reasoning_phase(self, user_message: str) -> Dict[str, Any]:
         """推理阶段：理解用户意图并拆分任务"""
-        if not self.llm_provider:
+        llm_provider = self._get_llm("plan")
+        if not llm_provider:
             # 降级到简单的关键词匹配
             return await self._fallback_planning(user_message)
         
         # 构建任务拆分提示
-        system_prompt = self._get_planning_system_prompt()
+        system_prompt = self._get_planning_system_prompt(user_message) + self._get_evidence_prompt()
         
         # 添加用户消息到历史
         self.conversation_history.append(Message(role="user", content=user_message))
         
         try:
             # 调用LLM进行任务拆分
-            response = await self.llm_provider.generate(
+            response = await llm_provider.generate(
                 messages=self.conversation_history,
                 system_prompt=system_prompt,
                 temperature=0.3
@@ -275,6 +329,152 @@ class AIPlanner:
             print(f"LLM规划失败，使用降级方案: {e}")
             return await self._fallback_planning(user_message)
     
+    async def _function_calling_phase(self, user_message: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        原生函数调用循环：推理与执行合并
+        
+        每一轮由模型发起（可并行的）工具调用，并行执行后把结果回填给模型，
+        直到模型不再调用工具或达到最大轮数。
+        
+        Returns:
+            (规划结果, 执行结果)，无法使用函数调用时返回None
+        """
+        llm_provider = self._get_llm("plan")
+        if not llm_provider or not llm_provider.supports_function_calling():
+            return None
+        
+        tools = self.tool_registry.get_function_schemas(self.tool_retriever.retrieve(user_message))
+        messages = self.conversation_history + [Message(role="user", content=user_message)]
+        system_prompt = self._get_function_calling_system_prompt() + self._get_evidence_prompt()
+        
+        task_ids: List[str] = []
+        execution_log = []
+        completed_tasks = 0
+        failed_tasks = 0
+        reasoning = ""
+        rounds = 0
+        
+        for rounds in range(1, self.config.llm.max_tool_rounds + 1):
+            try:
+                response = await llm_provider.generate(
+                    messages=messages,
+                    system_prompt=system_prompt,
+                    tools=tools,
+                    temperature=0.3
+                )
+            except Exception as e:
+                if rounds == 1:
+                    print(f"函数调用规划失败，使用文本规划: {e}")
+                    return None
+                reasoning = f"第{rounds}轮函数调用失败，已停止: {e}"
+                break
+            
+            reasoning = response.content
+            if not response.tool_calls:
+                break
+            
+            messages.append(Message(role="assistant", content=response.content, tool_calls=response.tool_calls))
+            
+            # 同一轮的工具调用并行执行
+            round_tasks = [self._create_task_from_tool_call(call) for call in response.tool_calls]
+            for task in round_tasks:
+                self.todo_manager.update_task_status(task.id, TaskStatus.IN_PROGRESS)
+            results = await asyncio.gather(*(self._execute_task(task) for task in round_tasks))
+            
+            for call, task, result in zip(response.tool_calls, round_tasks, results):
+                task_ids.append(task.id)
+                if result.status == ToolStatus.SUCCESS:
+                    self.todo_manager.update_task_status(task.id, TaskStatus.COMPLETED, result)
+                    completed_tasks += 1
+                else:
+                    self.todo_manager.update_task_status(task.id, TaskStatus.FAILED, result)
+                    failed_tasks += 1
+                task.review_notes = result.message
+                
+                execution_log.append({
+                    "task_id": task.id,
+                    "task_title": task.title,
+                    "status": task.status.value,
+                    "execution_time": datetime.now().isoformat(),
+                    "result_summary": result.message,
+                    "evidence": result.metadata.get("evidence")
+                })
+                messages.append(Message(
+                    role="tool",
+                    tool_call_id=call.id,
+                    content=self._format_tool_message(task, result)
+                ))
+        
+        plan_result = {
+            "reasoning": reasoning,
+            "tasks_created": len(task_ids),
+            "task_ids": task_ids,
+            "method": "function_calling",
+            "rounds": rounds
+        }
+        execution_result = {
+            "completed_tasks": completed_tasks,
+            "failed_tasks": failed_tasks,
+            "execution_log": execution_log
+        }
+        return plan_result, execution_result
+    
+    def _create_task_from_tool_call(self, call: ToolCall) -> DiagnosisTask:
+        """根据模型的工具调用创建诊断任务"""
+        try:
+            tool_name = self.tool_registry.resolve_tool_name(call.name)
+        except ValueError:
+            tool_name = call.name
+        
+        task = DiagnosisTask(
+            id=str(uuid.uuid4()),
+            title=f"调用工具 {tool_name}",
+            description=json.dumps(call.arguments, ensure_ascii=False),
+            tool_name=tool_name,
+            tool_params=call.arguments,
+            status=TaskStatus.PENDING,
+            priority=TaskPriority.MEDIUM,
+            dependencies=[],
+            reasoning="由模型通过函数调用发起",
+            created_at=datetime.now()
+        )
+        self.todo_manager.add_task(task)
+        return task
+    
+    def _format_tool_message(self, task: DiagnosisTask, result: ToolResult) -> str:
+        """把工具结果归约后格式化为回填给模型的tool消息"""
+        return render_compact(self._reduce_result(task, result))
+    
+    def _reduce_result(self, task: DiagnosisTask, result: ToolResult) -> Dict[str, Any]:
+        """
+        按工具归约结果
+        
+        有会话证据存储时以证据引用作为 full_result_ref，轮次结束后仍可从会话证据中取回；
+        否则以任务ID作为引用，只在本规划器的生命周期内有效。
+        """
+        ref = task.id
+        if self.evidence_store is not None:
+            try:
+                tool_name = self.tool_registry.resolve_tool_name(task.tool_name)
+            except ValueError:
+                tool_name = task.tool_name
+            ref = self.evidence_store.ref_for(tool_name, task.tool_params)
+        return self.result_reducers.reduce(task.tool_name, result, ref=ref)
+    
+    def get_task_result(self, ref: str) -> Optional[ToolResult]:
+        """
+        根据引用获取完整结果
+        
+        Args:
+            ref: 归约结果中的 full_result_ref（证据引用或任务ID）
+        """
+        if self.evidence_store is not None:
+            entry = self.evidence_store.resolve_ref(ref)
+            if entry is not None:
+                return entry.result
+        task = self.todo_manager.get_task(ref)
+        return task.result if task else None
+    
     async def _acting_phase(self) -> Dict[str, Any]:
         """执行阶段：按顺序执行任务"""
         execution_log = []
@@ -298,9 +498,11 @@ class AIPlanner:
                 self.todo_manager.update_task_status(next_task.id, TaskStatus.COMPLETED, result)
                 completed_tasks += 1
                 
-                # 执行后评估（ReAct的Observing部分）
-                review_result = await self._review_task_result(next_task, result)
-                next_task.review_notes = review_result
+                # 执行后评估（ReAct的Observing部分），复用的证据此前已评估过
+                if result.metadata.get("evidence"):
+                    next_task.review_notes = self._describe_evidence(result)
+                else:
+                    next_task.review_notes = await self._review_task_result(next_task, result)
                 
             else:
                 self.todo_manager.update_task_status(next_task.id, TaskStatus.FAILED, result)
@@ -311,7 +513,8 @@ class AIPlanner:
                 "task_title": next_task.title,
                 "status": next_task.status.value,
                 "execution_time": datetime.now().isoformat(),
-                "result_summary": result.message
+                "result_summary": result.message,
+                "evidence": result.metadata.get("evidence")
             })
         
         return {
@@ -322,7 +525,8 @@ class AIPlanner:
     
     async def _observing_phase(self) -> Dict[str, Any]:
         """观察阶段：生成总结和最终报告"""
-        if not self.llm_provider:
+        llm_provider = self._get_llm("summary")
+        if not llm_provider:
             return self._generate_simple_summary()
         
         # 收集所有任务结果
@@ -331,16 +535,16 @@ class AIPlanner:
             task_results.append({
                 "title": task.title,
                 "status": task.status.value,
-                "result": task.result.data if task.result else None,
+                "result": self._reduce_result(task, task.result)["data"] if task.result else None,
                 "review": task.review_notes
             })
         
         # 使用LLM生成总结
         summary_prompt = self._get_summary_system_prompt()
-        summary_input = json.dumps(task_results, ensure_ascii=False, indent=2)
+        summary_input = render_compact(task_results)
         
         try:
-            response = await self.llm_provider.generate(
+            response = await llm_provider.generate(
                 messages=[Message(role="user", content=f"请为以下诊断结果生成总结:\n{summary_input}")],
                 system_prompt=summary_prompt,
                 temperature=0.1
@@ -358,11 +562,16 @@ class AIPlanner:
             return self._generate_simple_summary()
     
     async def _execute_task(self, task: DiagnosisTask) -> ToolResult:
-        """执行单个任务"""
+        """执行单个任务，证据存储中有新鲜结果时直接复用或收窄，否则附带相对上次结果的增量"""
         try:
-            tool = self.tool_registry.get_tool(task.tool_name)
-            result = await tool.execute(**task.tool_params)
-            return result
+            tool_name = self.tool_registry.resolve_tool_name(task.tool_name)
+            return await execute_with_evidence(
+                tool_name,
+                task.tool_params,
+                lambda: self.tool_registry.get_tool(tool_name),
+                self.evidence_store,
+                self.config.delta_results
+            )
         except Exception as e:
             return ToolResult(
                 status=ToolStatus.ERROR,
@@ -372,7 +581,8 @@ class AIPlanner:
     
     async def _review_task_result(self, task: DiagnosisTask, result: ToolResult) -> str:
         """评估任务执行结果"""
-        if not self.llm_provider:
+        llm_provider = self._get_llm("review")
+        if not llm_provider:
             return f"任务完成，状态: {result.status.value}"
         
         try:
@@ -380,12 +590,13 @@ class AIPlanner:
             任务: {task.title}
             期望结果: {task.expected_outcome}
             实际结果: {result.message}
-            数据: {json.dumps(result.data, ensure_ascii=False) if result.data else "无"}
+            数据:
+{render_compact(self._reduce_result(task, result)["data"]) if result.data else "无"}
             
             请评估这个任务是否达到了预期效果，并提供简短的评价。
             """
             
-            response = await self.llm_provider.generate(
+            response = await llm_provider.generate(
                 messages=[Message(role="user", content=review_prompt)],
                 system_prompt="你是一个Kubernetes诊断专家，请简短评估任务完成情况。",
                 temperature=0.1
@@ -537,10 +748,9 @@ class AIPlanner:
             "method": "simple_summary"
         }
     
-    def _get_planning_system_prompt(self) -> str:
-        """获取任务规划的系统提示"""
-        available_tools = self.tool_registry.get_tool_schemas()
-        tools_info = json.dumps(available_tools, ensure_ascii=False, indent=2)
+    def _get_planning_system_prompt(self, user_message: str) -> str:
+        """获取任务规划的系统提示，只列出与问题相关的工具"""
+        tools_info = self.tool_registry.get_function_schemas_json(self.tool_retriever.retrieve(user_message))
         
         return f"""你是一个专业的Kubernetes诊断专家。根据用户的问题，你需要将其拆分为一系列具体的诊断任务。
 
@@ -571,6 +781,37 @@ class AIPlanner:
 3. 考虑任务之间的依赖关系
 4. 每个任务都要有明确的目标和期望结果"""
     
+    def _get_evidence_prompt(self) -> str:
+        """列出会话中仍新鲜的证据，引导模型不再重复采集"""
+        if self.evidence_store is None:
+            return ""
+        entries = self.evidence_store.fresh_entries()
+        if not entries:
+            return ""
+        
+        lines = [
+            f"- {entry.tool_name} {json.dumps(entry.params, ensure_ascii=False)}: "
+            f"{entry.result.message}（{int(entry.age())}秒前采集）"
+            for entry in entries
+        ]
+        return "\n\n本会话已采集且仍新鲜的证据（再次调用会直接复用缓存结果，只在需要更具体的信息时调用）:\n" + "\n".join(lines)
+    
+    @staticmethod
+    def _describe_evidence(result: ToolResult) -> str:
+        """描述复用的证据"""
+        mode = "复用" if result.metadata.get("evidence") == "reused" else "从已有列表中筛选"
+        return f"{mode}{result.metadata.get('evidence_age_seconds', 0)}秒前采集的证据: {result.message}"
+    
+    def _get_function_calling_system_prompt(self) -> str:
+        """获取函数调用循环的系统提示"""
+        return """你是一个专业的Kubernetes诊断专家。请通过调用提供的工具收集诊断所需的信息。
+
+原则:
+1. 优先获取基础信息（集群、节点状态）
+2. 相互独立的工具调用请在同一轮中并行发起
+3. 根据上一轮的工具结果决定是否需要进一步调用
+4. 信息足够时停止调用工具，并简要说明诊断思路和发现"""
+    
     def _get_summary_system_prompt(self) -> str:
         """获取总结生成的系统提示"""
         return """你是一个Kubernetes诊断专家。请基于诊断任务的执行结果，生成一份专业的诊断总结报告。
@@ -605,17 +846,20 @@ class DiagnosisPlan:
 class Planner:
     """计划器 - 兼容性包装器"""
     
-    def __init__(self, config: Config):
-        self.ai_planner = AIPlanner(config)
+    def __init__(self, config: Config, llm_router: Optional[LLMRouter] = None,
+                 tool_registry: Optional[ToolRegistry] = None):
+        self.ai_planner = AIPlanner(config, llm_router, tool_registry)
     
-    async def create_plan(self, user_message: str, conversation_history: List[Message]) -> DiagnosisPlan:
-        """创建诊断计划 - 兼容接口"""
-        result = await self.ai_planner.create_diagnosis_plan(user_message, conversation_history)
+    async def create_plan(self, user_message: str, conversation_history: List[Message],
+                          evidence_store: Optional[EvidenceStore] = None) -> DiagnosisPlan:
+        """创建诊断计划 - 兼容接口，每轮使用独立的规划器状态"""
+        planner = self.ai_planner.fork()
+        result = await planner.create_diagnosis_plan(user_message, conversation_history, evidence_store)
         
         # 转换为原有格式
         steps = []
         for task_id in result["plan"]["task_ids"]:
-            task = self.ai_planner.todo_manager.get_task(task_id)
+            task = planner.todo_manager.get_task(task_id)
             if task:
                 steps.append({
                     "tool": task.tool_name,
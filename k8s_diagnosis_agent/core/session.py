@@ -1,36 +1,126 @@
 """
 会话管理模块
+
+会话按最近访问顺序保存（LRU），过期时间放在最小堆中由后台任务定期清理；
+每个会话统计消息和证据占用的字节数，超出会话数或总字节数上限时淘汰最久未访问的会话。
+同一会话的轮次通过会话锁按到达顺序串行处理，不同会话的轮次并行执行。
+配置了持久化后端时，内存只作为活跃会话的缓存：淘汰只释放内存，会话在下次访问时从后端加载。
+异步代码应使用 get_session_async 等异步方法，后端的读取和清理在线程中执行，不阻塞事件循环。
+多副本共享的后端（Redis）下，缓存的会话按 session_revalidate_interval 的间隔在访问时
+与后端核对消息数，落后时重新加载。
 """
+import json
 import uuid
-from typing import Dict, List, Optional
+import zlib
+import time
+import heapq
+import asyncio
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
+from loguru import logger
 from ..config import Config
 from ..llm.base import Message
+from ..metrics import ACTIVE_SESSIONS, QUEUE_DEPTH, register_collect_hook
+from .evidence import EvidenceStore, EvidenceEntry
+from .session_store import SessionBackend, create_session_backend
 
 
 class Session:
     """会话类"""
     
-    def __init__(self, session_id: str):
+    def __init__(
+        self,
+        session_id: str,
+        evidence: Optional[EvidenceStore] = None,
+        store: Optional[SessionBackend] = None
+    ):
         self.session_id = session_id
         self.messages: List[Message] = []
+        self.evidence = evidence or EvidenceStore()
         self.created_at = datetime.now()
         self.last_activity = datetime.now()
         self.metadata: Dict[str, str] = {}
+        self.message_bytes = 0
+        self.store = store
+        # 滚动摘要：较早的消息折叠进摘要，原始消息压缩归档
+        self.summary = ""
+        self.archive: List[bytes] = []
+        self.archived_count = 0
+        self.archive_bytes = 0
+        # 清空消息时递增，用于丢弃清空前启动的摘要结果
+        self.generation = 0
+        # 上次与共享后端核对的时间（time.monotonic）
+        self.validated_at = time.monotonic()
     
     def add_message(self, message: Message):
         """添加消息"""
         self.messages.append(message)
+        self.message_bytes += len(message.json().encode("utf-8"))
         self.last_activity = datetime.now()
+        if self.store is not None:
+            self.store.append_message(
+                self.session_id, self.archived_count + len(self.messages) - 1, message, self.last_activity.timestamp()
+            )
     
     def get_messages(self) -> List[Message]:
-        """获取消息列表"""
+        """获取消息列表（未折叠的消息）"""
         return self.messages
     
+    def get_context_messages(self) -> List[Message]:
+        """获取用于提示词的消息：滚动摘要加未折叠的消息"""
+        if not self.summary:
+            return self.messages
+        return [Message(role="system", content=f"此前对话的摘要：\n{self.summary}")] + self.messages
+    
+    def fold_messages(self, count: int, summary: str):
+        """
+        把最早的count条消息折叠进摘要
+        
+        消息列表整体替换而不是原地删除，正在进行的轮次持有的列表引用不受影响。
+        """
+        folded, self.messages = self.messages[:count], self.messages[count:]
+        data = zlib.compress(json.dumps([msg.dict() for msg in folded], ensure_ascii=False).encode("utf-8"))
+        self.archive.append(data)
+        self.archive_bytes += len(data)
+        self.archived_count += len(folded)
+        self.message_bytes -= sum(len(msg.json().encode("utf-8")) for msg in folded)
+        self.summary = summary
+        if self.store is not None:
+            self.store.save_summary(self.session_id, summary, self.archived_count)
+    
+    def get_archived_messages(self) -> List[Message]:
+        """解压本进程中归档的原始消息"""
+        messages: List[Message] = []
+        for data in self.archive:
+            messages.extend(Message(**item) for item in json.loads(zlib.decompress(data)))
+        return messages
+    
     def clear_messages(self):
         """清空消息"""
-        self.messages.clear()
+        self.messages = []
+        self.message_bytes = 0
+        self.summary = ""
+        self.archive = []
+        self.archive_bytes = 0
+        self.archived_count = 0
+        self.generation += 1
         self.last_activity = datetime.now()
+        if self.store is not None:
+            self.store.clear_messages(self.session_id)
+    
+    @property
+    def size_bytes(self) -> int:
+        """会话占用的字节数（消息、摘要、归档和证据）"""
+        return (
+            self.message_bytes + len(self.summary.encode("utf-8")) + self.archive_bytes
+            + self.evidence.size_bytes
+        )
+    
+    def expires_at(self, timeout_seconds: int) -> float:
+        """过期时间戳"""
+        return self.last_activity.timestamp() + timeout_seconds
     
     def is_expired(self, timeout_seconds: int) -> bool:
         """检查会话是否过期"""
@@ -40,41 +130,322 @@ class Session:
 class SessionManager:
     """会话管理器"""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, backend: Optional[SessionBackend] = None):
+        """
+        Args:
+            config: 配置
+            backend: 持久化后端，默认按 SESSION_BACKEND 配置创建
+        """
         self.config = config
-        self.sessions: Dict[str, Session] = {}
+        self.backend = backend if backend is not None else create_session_backend(config)
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # (过期时间, 会话ID)，会话活动后不更新堆，弹出时再按实际过期时间重新入堆
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._cleanup_task: Optional[asyncio.Task] = None
+        # 会话锁和进行中（执行或排队）的轮次数，轮次全部结束后删除
+        self._turn_locks: Dict[str, asyncio.Lock] = {}
+        self._turn_counts: Dict[str, int] = {}
+        self.expired_count = 0
+        self.evicted_count = 0
+        self.loaded_count = 0
+        register_collect_hook("sessions", self._update_metrics)
+    
+    def _update_metrics(self):
+        ACTIVE_SESSIONS.set(len(self.sessions))
+        QUEUE_DEPTH.labels("session_turns").set(sum(count - 1 for count in self._turn_counts.values()))
+    
+    def _new_session(self, session_id: str) -> Session:
+        evidence = EvidenceStore(
+            default_ttl=self.config.evidence_default_ttl,
+            ttls=self.config.evidence_ttls,
+            max_entries=self.config.evidence_max_entries
+        )
+        if self.backend is not None and self.backend.persist_evidence:
+            backend = self.backend
+            evidence.on_put = lambda key, entry: backend.save_evidence(session_id, key, entry.serialize())
+        return Session(session_id, evidence, self.backend)
+    
+    def _cache_session(self, session: Session):
+        """把会话放入内存缓存并登记过期时间"""
+        self.sessions[session.session_id] = session
+        heapq.heappush(self._expiry_heap, (session.expires_at(self.config.session_timeout), session.session_id))
+        self.enforce_limits()
     
     def create_session(self) -> str:
         """创建新会话"""
         session_id = str(uuid.uuid4())
-        session = Session(session_id)
-        self.sessions[session_id] = session
+        session = self._new_session(session_id)
+        if self.backend is not None:
+            self.backend.save_session(
+                session_id, session.created_at.timestamp(), session.last_activity.timestamp(), session.metadata
+            )
+        self._cache_session(session)
         return session_id
     
-    def get_session(self, session_id: str) -> Optional[Session]:
-        """获取会话"""
-        return self.sessions.get(session_id)
+    def _read_backend(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """从后端读取会话数据和证据，可在线程中执行"""
+        data = self.backend.load_session(session_id)
+        if data is None or not self.backend.persist_evidence:
+            return data, {}
+        return data, self.backend.load_evidence(session_id)
+    
+    def _load_session(self, session_id: str) -> Optional[Session]:
+        """从后端加载会话，后端不保存证据时证据为空"""
+        return self._build_session(session_id, *self._read_backend(session_id))
+    
+    def _build_session(
+        self,
+        session_id: str,
+        data: Optional[Dict[str, Any]],
+        evidence: Dict[str, Dict[str, Any]]
+    ) -> Optional[Session]:
+        """用后端读取的数据构建会话"""
+        if data is None:
+            return None
+        session = self._new_session(session_id)
+        session.created_at = datetime.fromtimestamp(data["created_at"])
+        session.metadata = data["metadata"]
+        session.messages = data["messages"]
+        session.summary = data.get("summary", "")
+        session.archived_count = data.get("archived_count", 0)
+        session.message_bytes = sum(len(message.json().encode("utf-8")) for message in session.messages)
+        session.last_activity = datetime.fromtimestamp(data["last_activity"])
+        for key, item in evidence.items():
+            entry = EvidenceEntry.deserialize(item)
+            if entry.is_fresh():
+                session.evidence.restore(key, entry)
+        self.loaded_count += 1
+        return session
+    
+    def _needs_revalidation(self, session: Session) -> bool:
+        """共享后端下距上次核对超过间隔的缓存会话需要核对"""
+        return (
+            self.backend is not None and self.backend.shared
+            and time.monotonic() - session.validated_at >= self.config.session_revalidate_interval
+        )
+    
+    def _is_stale(self, session: Session, count: Optional[int]) -> bool:
+        """共享后端中的消息数多于缓存，或会话已被删除时，缓存已落后"""
+        session.validated_at = time.monotonic()
+        return count is None or count > session.archived_count + len(session.messages)
+    
+    def get_session(self, session_id: str, touch: bool = True) -> Optional[Session]:
+        """
+        获取会话，已过期的会话视为不存在；不在内存中时从后端加载
+        
+        后端读取在当前线程中执行，异步代码使用 get_session_async。
+        
+        Args:
+            session_id: 会话ID
+            touch: 是否更新LRU顺序；为False时从后端加载的会话不放入内存
+        """
+        session = self.sessions.get(session_id)
+        if session is not None and touch and self._needs_revalidation(session):
+            # 其他副本可能已追加消息或删除会话
+            if self._is_stale(session, self.backend.message_count(session_id)):
+                self.sessions.pop(session_id, None)
+                session = None
+        if session is None and self.backend is not None:
+            session = self._load_session(session_id)
+            if session is not None and not session.is_expired(self.config.session_timeout) and touch:
+                self._cache_session(session)
+        return self._check_session(session_id, session, touch)
+    
+    async def get_session_async(self, session_id: str, touch: bool = True) -> Optional[Session]:
+        """与 get_session 相同，后端的读取在线程中执行"""
+        session = self.sessions.get(session_id)
+        if session is not None and touch and self._needs_revalidation(session):
+            count = await asyncio.to_thread(self.backend.message_count, session_id)
+            if self._is_stale(session, count) and self.sessions.get(session_id) is session:
+                self.sessions.pop(session_id, None)
+                session = None
+        if session is None and self.backend is not None:
+            data, evidence = await asyncio.to_thread(self._read_backend, session_id)
+            # 读取期间其他协程可能已加载同一会话，以内存中的为准
+            session = self.sessions.get(session_id) or self._build_session(session_id, data, evidence)
+            if (
+                session is not None and touch and session_id not in self.sessions
+                and not session.is_expired(self.config.session_timeout)
+            ):
+                self._cache_session(session)
+        return self._check_session(session_id, session, touch)
+    
+    def _check_session(self, session_id: str, session: Optional[Session], touch: bool) -> Optional[Session]:
+        """删除已过期的会话，更新LRU顺序"""
+        if session is None:
+            return None
+        if session.is_expired(self.config.session_timeout):
+            self.remove_session(session_id)
+            self.expired_count += 1
+            return None
+        if touch:
+            self.sessions.move_to_end(session_id)
+        return session
     
     def remove_session(self, session_id: str):
-        """删除会话"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        """删除会话，过期堆中的条目在弹出时跳过"""
+        self.sessions.pop(session_id, None)
+        if self.backend is not None:
+            self.backend.delete_session(session_id)
+    
+    def cleanup_expired_sessions(self) -> int:
+        """清理过期会话，返回清理数量；后端清理在当前线程中执行"""
+        now = time.time()
+        removed = self._cleanup_cached_sessions(now)
+        if self.backend is not None:
+            # 后端中未加载到内存的会话按最后活动时间清理
+            removed += self.backend.delete_expired(now - self.config.session_timeout)
+        self.expired_count += removed
+        return removed
     
-    def cleanup_expired_sessions(self):
-        """清理过期会话"""
+    async def cleanup_expired_sessions_async(self) -> int:
+        """与 cleanup_expired_sessions 相同，后端清理在线程中执行"""
+        now = time.time()
+        removed = self._cleanup_cached_sessions(now)
+        if self.backend is not None:
+            removed += await asyncio.to_thread(self.backend.delete_expired, now - self.config.session_timeout)
+        self.expired_count += removed
+        return removed
+    
+    def _cleanup_cached_sessions(self, now: float) -> int:
+        """清理内存中的过期会话，返回清理数量"""
         timeout = self.config.session_timeout
-        expired_sessions = [
-            session_id for session_id, session in self.sessions.items()
-            if session.is_expired(timeout)
-        ]
-        
-        for session_id in expired_sessions:
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, session_id = heapq.heappop(self._expiry_heap)
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            expires_at = session.expires_at(timeout)
+            if expires_at > now:
+                heapq.heappush(self._expiry_heap, (expires_at, session_id))
+                continue
             self.remove_session(session_id)
+            removed += 1
+        
+        # 已删除会话留下的堆条目过多时重建堆
+        if len(self._expiry_heap) > 2 * len(self.sessions) + 64:
+            self._expiry_heap = [
+                (session.expires_at(timeout), session_id)
+                for session_id, session in self.sessions.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+        return removed
+    
+    @asynccontextmanager
+    async def turn(self, session_id: str):
+        """
+        会话轮次锁，同一会话的轮次按到达顺序串行执行
+        
+        用法:
+            async with session_manager.turn(session_id):
+                ...
+        """
+        lock = self._turn_locks.get(session_id)
+        if lock is None:
+            lock = self._turn_locks[session_id] = asyncio.Lock()
+        self._turn_counts[session_id] = self._turn_counts.get(session_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._turn_counts[session_id] -= 1
+            if self._turn_counts[session_id] == 0:
+                del self._turn_counts[session_id]
+                del self._turn_locks[session_id]
+    
+    def get_queued_turns(self, session_id: str) -> int:
+        """会话中等待执行的轮次数（不含正在执行的轮次）"""
+        count = self._turn_counts.get(session_id, 0)
+        return max(count - 1, 0)
+    
+    async def flush(self):
+        """共享后端在每轮对话结束时刷写，使其他副本能读到本轮消息"""
+        if self.backend is not None and self.backend.shared:
+            await asyncio.to_thread(self.backend.flush)
+    
+    def get_total_bytes(self) -> int:
+        """所有会话占用的字节数"""
+        return sum(session.size_bytes for session in self.sessions.values())
+    
+    def enforce_limits(self) -> int:
+        """超出会话数或字节数上限时按LRU淘汰会话，至少保留最近访问的一个，返回淘汰数量"""
+        max_sessions = self.config.session_max_count
+        max_bytes = self.config.session_max_bytes
+        evicted = 0
+        total_bytes = self.get_total_bytes() if max_bytes > 0 else 0
+        while len(self.sessions) > 1 and (
+            (max_sessions > 0 and len(self.sessions) > max_sessions)
+            or (max_bytes > 0 and total_bytes > max_bytes)
+        ):
+            _, session = self.sessions.popitem(last=False)
+            total_bytes -= session.size_bytes
+            evicted += 1
+        self.evicted_count += evicted
+        return evicted
+    
+    async def _cleanup_loop(self):
+        """后台定期清理过期会话并执行容量上限"""
+        while True:
+            await asyncio.sleep(self.config.session_cleanup_interval)
+            try:
+                await self.cleanup_expired_sessions_async()
+                self.enforce_limits()
+            except Exception as e:
+                logger.warning(f"会话清理失败: {e}")
+    
+    def start(self):
+        """启动后台清理任务和后端刷写任务，需在事件循环中调用"""
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+        if self.backend is not None:
+            self.backend.start()
+    
+    async def stop(self):
+        """停止后台清理任务，并刷写后端缓冲的数据"""
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+        if self.backend is not None:
+            await self.backend.stop()
     
     def get_all_sessions(self) -> List[str]:
-        """获取所有会话ID"""
-        return list(self.sessions.keys())
+        """获取所有会话ID（包括后端中未加载的会话）"""
+        stored = self.backend.list_sessions() if self.backend is not None else []
+        return self._merge_session_ids(stored)
+    
+    async def get_all_sessions_async(self) -> List[str]:
+        """与 get_all_sessions 相同，后端的读取在线程中执行"""
+        stored = await asyncio.to_thread(self.backend.list_sessions) if self.backend is not None else []
+        return self._merge_session_ids(stored)
+    
+    def _merge_session_ids(self, stored: List[str]) -> List[str]:
+        session_ids = list(self.sessions.keys())
+        cached = set(session_ids)
+        session_ids.extend(session_id for session_id in stored if session_id not in cached)
+        return session_ids
     
     def get_session_count(self) -> int:
         """获取会话数量"""
-        return len(self.sessions) 
\ No newline at end of file
+        return len(self.sessions)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "session_count": len(self.sessions),
+            "total_bytes": self.get_total_bytes(),
+            "max_sessions": self.config.session_max_count,
+            "max_bytes": self.config.session_max_bytes,
+            "expired": self.expired_count,
+            "evicted": self.evicted_count,
+            "loaded": self.loaded_count,
+            "active_turns": len(self._turn_counts),
+            "queued_turns": sum(count - 1 for count in self._turn_counts.values()),
+            "expiry_heap_size": len(self._expiry_heap),
+            "cleanup_running": self._cleanup_task is not None and not self._cleanup_task.done(),
+            "backend": self.backend.get_stats() if self.backend is not None else {"backend": "memory"},
+        }
@@ -0,0 +1,697 @@
+"""
+会话持久化后端
+
+SessionManager 在内存中缓存活跃会话，后端负责持久化，使进程重启或重新部署后
+会话仍可继续。写操作先进入缓冲区，由后台任务批量刷写，不阻塞请求；
+会话在首次访问时才从后端加载。后端方法都是同步的，SessionManager 在异步代码中
+通过 asyncio.to_thread 调用读取和清理方法，刷写也在后台任务的线程中进行。
+
+- sqlite: 单副本持久化，WAL模式
+- redis: 多副本共享会话和证据，任一副本都可处理任一轮对话
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple
+from loguru import logger
+from ..config import Config
+from ..llm.base import Message
+
+
+class SessionBackend(ABC):
+    """会话持久化后端基类"""
+
+    # 是否被多个副本共享：共享时缓存的会话在访问时需要校验，每轮结束时刷写
+    shared = False
+    # 是否持久化会话证据
+    persist_evidence = False
+
+    @abstractmethod
+    def save_session(self, session_id: str, created_at: float, last_activity: float, metadata: Dict[str, Any]):
+        """保存会话元数据"""
+        pass
+
+    @abstractmethod
+    def append_message(self, session_id: str, seq: int, message: Message, last_activity: float):
+        """追加一条消息"""
+        pass
+
+    @abstractmethod
+    def clear_messages(self, session_id: str):
+        """清空会话消息"""
+        pass
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        """删除会话"""
+        pass
+
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: str, archived_count: int):
+        """保存滚动摘要，前 archived_count 条消息已折叠进摘要，加载时跳过"""
+        pass
+
+    @abstractmethod
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        加载会话
+
+        Returns:
+            {"session_id", "created_at", "last_activity", "metadata", "summary", "archived_count",
+             "messages"（未折叠的消息）}，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def list_sessions(self) -> List[str]:
+        """列出所有会话ID"""
+        pass
+
+    @abstractmethod
+    def delete_expired(self, before: float) -> int:
+        """删除最后活动早于指定时间戳的会话，返回删除数量"""
+        pass
+
+    def message_count(self, session_id: str) -> Optional[int]:
+        """后端中的消息数，会话不存在时返回None；共享后端用于校验本地缓存"""
+        return None
+
+    def save_evidence(self, session_id: str, key: str, entry: Dict[str, Any]):
+        """保存一条证据"""
+        pass
+
+    def load_evidence(self, session_id: str) -> Dict[str, Dict[str, Any]]:
+        """加载会话证据：证据键 -> 序列化的证据"""
+        return {}
+
+    def flush(self):
+        """把缓冲的写操作写入后端"""
+        pass
+
+    def start(self):
+        """启动后台刷写任务，需在事件循环中调用"""
+        pass
+
+    async def stop(self):
+        """停止后台任务并刷写剩余数据"""
+        await asyncio.to_thread(self.flush)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {}
+
+
+class WriteBehindBackend(SessionBackend):
+    """
+    写缓冲后端
+
+    写操作按顺序进入缓冲区，后台任务每隔 flush_interval 秒或缓冲达到 batch_size 时
+    在线程中批量写入；读取前先刷写，保证读到自己的写入，因此读取方法应在线程中调用。
+    """
+
+    def __init__(self, flush_interval: float = 1.0, batch_size: int = 500, write_behind: bool = True):
+        """
+        Args:
+            flush_interval: 刷写间隔（秒）
+            batch_size: 缓冲达到该条数时提前刷写
+            write_behind: 为False时每次写操作立即写入
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.write_behind = write_behind
+        self._pending: List[Tuple[str, tuple]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_ops = 0
+        self.flush_count = 0
+
+    def _enqueue(self, op: str, *args):
+        with self._lock:
+            self._pending.append((op, args))
+            pending = len(self._pending)
+        if not self.write_behind:
+            self.flush()
+        elif pending >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def save_session(self, session_id: str, created_at: float, last_activity: float, metadata: Dict[str, Any]):
+        self._enqueue("save", session_id, created_at, last_activity, json.dumps(metadata, ensure_ascii=False))
+
+    def append_message(self, session_id: str, seq: int, message: Message, last_activity: float):
+        self._enqueue("append", session_id, seq, message.json(), last_activity)
+
+    def clear_messages(self, session_id: str):
+        self._enqueue("clear", session_id)
+
+    def delete_session(self, session_id: str):
+        self._enqueue("delete", session_id)
+
+    def save_summary(self, session_id: str, summary: str, archived_count: int):
+        self._enqueue("summary", session_id, summary, archived_count)
+
+    def save_evidence(self, session_id: str, key: str, entry: Dict[str, Any]):
+        if self.persist_evidence:
+            self._enqueue("evidence", session_id, key, json.dumps(entry, ensure_ascii=False, default=str))
+
+    def flush(self):
+        # 刷写互斥，保证批次按入队顺序写入
+        with self._flush_lock:
+            with self._lock:
+                ops, self._pending = self._pending, []
+            if not ops:
+                return
+            self._write_batch(ops)
+            self.flushed_ops += len(ops)
+            self.flush_count += 1
+
+    @abstractmethod
+    def _write_batch(self, ops: List[Tuple[str, tuple]]):
+        """在一个事务中写入一批操作"""
+        pass
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.warning(f"会话刷写失败: {e}")
+
+    def start(self):
+        if self.write_behind and (self._task is None or self._task.done()):
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await asyncio.to_thread(self.flush)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending_ops": len(self._pending),
+            "flushed_ops": self.flushed_ops,
+            "flush_count": self.flush_count,
+        }
+
+
+class SQLiteSessionBackend(WriteBehindBackend):
+    """SQLite后端（WAL模式）"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0, batch_size: int = 500, write_behind: bool = True):
+        """
+        Args:
+            path: 数据库文件路径
+        """
+        super().__init__(flush_interval, batch_size, write_behind)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, created_at REAL, last_activity REAL, metadata TEXT, "
+                "summary TEXT DEFAULT '', archived_count INTEGER DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+            if "summary" not in columns:
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT DEFAULT ''")
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN archived_count INTEGER DEFAULT 0")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT, seq INTEGER, data TEXT, PRIMARY KEY (session_id, seq))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_activity ON sessions (last_activity)")
+
+    def _write_batch(self, ops: List[Tuple[str, tuple]]):
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for op, args in ops:
+                    if op == "append":
+                        session_id, seq, data, last_activity = args
+                        cursor.execute(
+                            "INSERT OR REPLACE INTO messages (session_id, seq, data) VALUES (?, ?, ?)",
+                            (session_id, seq, data)
+                        )
+                        cursor.execute(
+                            "UPDATE sessions SET last_activity = ? WHERE session_id = ?",
+                            (last_activity, session_id)
+                        )
+                    elif op == "save":
+                        cursor.execute(
+                            "INSERT OR REPLACE INTO sessions (session_id, created_at, last_activity, metadata) "
+                            "VALUES (?, ?, ?, ?)",
+                            args
+                        )
+                    elif op == "summary":
+                        session_id, summary, archived_count = args
+                        cursor.execute(
+                            "UPDATE sessions SET summary = ?, archived_count = ? WHERE session_id = ?",
+                            (summary, archived_count, session_id)
+                        )
+                    elif op == "clear":
+                        cursor.execute("DELETE FROM messages WHERE session_id = ?", args)
+                        cursor.execute(
+                            "UPDATE sessions SET summary = '', archived_count = 0 WHERE session_id = ?", args
+                        )
+                    elif op == "delete":
+                        cursor.execute("DELETE FROM messages WHERE session_id = ?", args)
+                        cursor.execute("DELETE FROM sessions WHERE session_id = ?", args)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT created_at, last_activity, metadata, summary, archived_count FROM sessions "
+                "WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT data FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                (session_id, row[4] or 0)
+            ).fetchall()
+        return {
+            "session_id": session_id,
+            "created_at": row[0],
+            "last_activity": row[1],
+            "metadata": json.loads(row[2] or "{}"),
+            "summary": row[3] or "",
+            "archived_count": row[4] or 0,
+            "messages": [Message.parse_raw(data) for (data,) in rows],
+        }
+
+    def list_sessions(self) -> List[str]:
+        self.flush()
+        with self._db_lock:
+            return [row[0] for row in self._conn.execute("SELECT session_id FROM sessions ORDER BY created_at")]
+
+    def delete_expired(self, before: float) -> int:
+        self.flush()
+        with self._db_lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                cursor.execute(
+                    "DELETE FROM messages WHERE session_id IN "
+                    "(SELECT session_id FROM sessions WHERE last_activity < ?)",
+                    (before,)
+                )
+                cursor.execute("DELETE FROM sessions WHERE last_activity < ?", (before,))
+                deleted = cursor.rowcount
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return deleted
+
+    async def stop(self):
+        await super().stop()
+        with self._db_lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path, **super().get_stats()}
+
+
+class InProcessRedis:
+    """
+    进程内的Redis替身
+
+    实现 RedisSessionBackend 用到的命令子集（decode_responses=True 语义），
+    用于测试和单进程开发（SESSION_REDIS_URL=memory://），不能在副本间共享。
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _purge(self, name: str):
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+
+    def _get(self, name: str, default_factory):
+        self._purge(name)
+        if name not in self._data:
+            self._data[name] = default_factory()
+        return self._data[name]
+
+    def hset(self, name: str, key: Optional[str] = None, value: Any = None, mapping: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            fields = dict(mapping or {})
+            if key is not None:
+                fields[key] = value
+            target = self._get(name, dict)
+            added = len([field for field in fields if field not in target])
+            target.update({field: str(item) for field, item in fields.items()})
+            return added
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            self._purge(name)
+            target = self._data.get(name, {})
+            return len([key for key in keys if target.pop(key, None) is not None])
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            self._purge(name)
+            return dict(self._data.get(name, {}))
+
+    def rpush(self, name: str, *values: Any) -> int:
+        with self._lock:
+            target = self._get(name, list)
+            target.extend(str(value) for value in values)
+            return len(target)
+
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            self._purge(name)
+            items = self._data.get(name, [])
+            return items[start:] if end == -1 else items[start:end + 1]
+
+    def llen(self, name: str) -> int:
+        with self._lock:
+            self._purge(name)
+            return len(self._data.get(name, []))
+
+    def zadd(self, name: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            target = self._get(name, dict)
+            added = len([member for member in mapping if member not in target])
+            target.update({member: float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, name: str, *values: str) -> int:
+        with self._lock:
+            target = self._data.get(name, {})
+            return len([value for value in values if target.pop(value, None) is not None])
+
+    def zrange(self, name: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            members = sorted(self._data.get(name, {}).items(), key=lambda item: (item[1], item[0]))
+            members = members[start:] if end == -1 else members[start:end + 1]
+            return [member for member, _ in members]
+
+    def zrangebyscore(self, name: str, min: Any, max: Any) -> List[str]:
+        with self._lock:
+            low, high = float(min), float(max)
+            members = sorted(self._data.get(name, {}).items(), key=lambda item: (item[1], item[0]))
+            return [member for member, score in members if low <= score <= high]
+
+    def exists(self, *names: str) -> int:
+        with self._lock:
+            for name in names:
+                self._purge(name)
+            return len([name for name in names if name in self._data])
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            for name in names:
+                self._expires.pop(name, None)
+            return len([name for name in names if self._data.pop(name, None) is not None])
+
+    def expire(self, name: str, seconds: float) -> bool:
+        with self._lock:
+            if name not in self._data:
+                return False
+            self._expires[name] = time.time() + seconds
+            return True
+
+    def pipeline(self, transaction: bool = True) -> "_InProcessPipeline":
+        return _InProcessPipeline(self)
+
+
+class _InProcessPipeline:
+    """InProcessRedis 的管道，execute 时在锁内依次执行"""
+
+    def __init__(self, client: InProcessRedis):
+        self._client = client
+        self._commands: List[Tuple[str, tuple, Dict[str, Any]]] = []
+
+    def __getattr__(self, name: str):
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return command
+
+    def execute(self) -> List[Any]:
+        with self._client._lock:
+            results = [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+_in_process_redis: Optional[InProcessRedis] = None
+
+
+class RedisSessionBackend(WriteBehindBackend):
+    """
+    Redis后端
+
+    会话元数据存为哈希，消息存为列表，证据按证据键存为哈希，并用按新鲜期截止时间排序的
+    有序集合索引，写入证据后删除已过期和超出条数上限的证据；另有一个按最后活动时间排序的
+    有序集合作为会话索引；所有键随会话超时过期。
+
+    使用同步客户端，所有调用都在刷写线程或 SessionManager 的 asyncio.to_thread 中执行。
+    """
+
+    shared = True
+    persist_evidence = True
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        ttl: int = 3600,
+        prefix: str = "k8s-diagnosis-agent:",
+        client: Any = None,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        write_behind: bool = True,
+        evidence_max_entries: int = 100
+    ):
+        """
+        Args:
+            url: Redis地址，memory:// 使用进程内替身
+            ttl: 会话键的过期时间（秒），与会话超时一致
+            prefix: 键前缀
+            client: 已创建的客户端，优先于url
+            evidence_max_entries: 每个会话最多保存的证据条数，0表示不限制
+        """
+        super().__init__(flush_interval, batch_size, write_behind)
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evidence_max_entries = evidence_max_entries
+        if client is None:
+            client = self._connect(url)
+        self.client = client
+
+    @staticmethod
+    def _connect(url: str) -> Any:
+        global _in_process_redis
+        if url.startswith("memory://"):
+            if _in_process_redis is None:
+                _in_process_redis = InProcessRedis()
+            return _in_process_redis
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Redis会话后端需要安装redis: pip install redis")
+        return redis.Redis.from_url(url, decode_responses=True)
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}session:{session_id}"
+
+    def _messages_key(self, session_id: str) -> str:
+        return f"{self.prefix}messages:{session_id}"
+
+    def _evidence_key(self, session_id: str) -> str:
+        return f"{self.prefix}evidence:{session_id}"
+
+    def _evidence_index_key(self, session_id: str) -> str:
+        return f"{self.prefix}evidence-index:{session_id}"
+
+    def _session_keys(self, session_id: str) -> List[str]:
+        return [
+            self._session_key(session_id), self._messages_key(session_id),
+            self._evidence_key(session_id), self._evidence_index_key(session_id),
+        ]
+
+    @property
+    def _index_key(self) -> str:
+        return f"{self.prefix}sessions"
+
+    def _write_batch(self, ops: List[Tuple[str, tuple]]):
+        pipe = self.client.pipeline(transaction=True)
+        evidence_sessions: List[str] = []
+        for op, args in ops:
+            session_id = args[0]
+            session_key = self._session_key(session_id)
+            if op == "append":
+                _, _, data, last_activity = args
+                pipe.rpush(self._messages_key(session_id), data)
+                pipe.hset(session_key, "last_activity", last_activity)
+                pipe.zadd(self._index_key, {session_id: last_activity})
+                pipe.expire(self._messages_key(session_id), self.ttl)
+                pipe.expire(session_key, self.ttl)
+            elif op == "save":
+                _, created_at, last_activity, metadata = args
+                pipe.hset(session_key, mapping={
+                    "created_at": created_at,
+                    "last_activity": last_activity,
+                    "metadata": metadata,
+                })
+                pipe.zadd(self._index_key, {session_id: last_activity})
+                pipe.expire(session_key, self.ttl)
+            elif op == "summary":
+                _, summary, archived_count = args
+                pipe.hset(session_key, mapping={"summary": summary, "archived_count": archived_count})
+            elif op == "clear":
+                pipe.delete(self._messages_key(session_id))
+                pipe.hset(session_key, mapping={"summary": "", "archived_count": 0})
+            elif op == "delete":
+                pipe.delete(*self._session_keys(session_id))
+                pipe.zrem(self._index_key, session_id)
+            elif op == "evidence":
+                _, key, data = args
+                entry = json.loads(data)
+                pipe.hset(self._evidence_key(session_id), key, data)
+                pipe.zadd(self._evidence_index_key(session_id), {key: entry["collected_at"] + entry["ttl"]})
+                pipe.expire(self._evidence_key(session_id), self.ttl)
+                pipe.expire(self._evidence_index_key(session_id), self.ttl)
+                if session_id not in evidence_sessions:
+                    evidence_sessions.append(session_id)
+        pipe.execute()
+        if evidence_sessions:
+            self._trim_evidence(evidence_sessions)
+
+    def _trim_evidence(self, session_ids: List[str]):
+        """删除已过新鲜期的证据，以及超出条数上限时最早过期的证据"""
+        pipe = self.client.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.zrangebyscore(self._evidence_index_key(session_id), "-inf", time.time())
+            if self.evidence_max_entries > 0:
+                pipe.zrange(self._evidence_index_key(session_id), 0, -(self.evidence_max_entries + 1))
+        results = iter(pipe.execute())
+        pipe = self.client.pipeline(transaction=True)
+        trimmed = False
+        for session_id in session_ids:
+            stale = set(next(results))
+            if self.evidence_max_entries > 0:
+                stale.update(next(results))
+            if stale:
+                pipe.hdel(self._evidence_key(session_id), *stale)
+                pipe.zrem(self._evidence_index_key(session_id), *stale)
+                trimmed = True
+        if trimmed:
+            pipe.execute()
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self.flush()
+        meta = self.client.hgetall(self._session_key(session_id))
+        if not meta:
+            return None
+        # 已折叠进摘要的消息不再读取
+        archived_count = int(meta.get("archived_count") or 0)
+        messages = self.client.lrange(self._messages_key(session_id), archived_count, -1)
+        return {
+            "session_id": session_id,
+            "created_at": float(meta["created_at"]),
+            "last_activity": float(meta["last_activity"]),
+            "metadata": json.loads(meta.get("metadata") or "{}"),
+            "summary": meta.get("summary", ""),
+            "archived_count": archived_count,
+            "messages": [Message.parse_raw(data) for data in messages],
+        }
+
+    def message_count(self, session_id: str) -> Optional[int]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.exists(self._session_key(session_id))
+        pipe.llen(self._messages_key(session_id))
+        exists, count = pipe.execute()
+        return count if exists else None
+
+    def load_evidence(self, session_id: str) -> Dict[str, Dict[str, Any]]:
+        self.flush()
+        return {
+            key: json.loads(data)
+            for key, data in self.client.hgetall(self._evidence_key(session_id)).items()
+        }
+
+    def list_sessions(self) -> List[str]:
+        self.flush()
+        return list(self.client.zrange(self._index_key, 0, -1))
+
+    def delete_expired(self, before: float) -> int:
+        self.flush()
+        expired = self.client.zrangebyscore(self._index_key, "-inf", before)
+        if not expired:
+            return 0
+        pipe = self.client.pipeline(transaction=True)
+        for session_id in expired:
+            pipe.delete(*self._session_keys(session_id))
+        pipe.zrem(self._index_key, *expired)
+        pipe.execute()
+        return len(expired)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", **super().get_stats()}
+
+
+def create_session_backend(config: Config) -> Optional[SessionBackend]:
+    """
+    按配置创建会话后端
+
+    Returns:
+        SESSION_BACKEND 为 memory 时返回None，会话只保存在内存中
+    """
+    backend = config.session_backend.lower()
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        return SQLiteSessionBackend(
+            config.session_sqlite_path,
+            flush_interval=config.session_flush_interval,
+            batch_size=config.session_flush_batch_size
+        )
+    if backend == "redis":
+        return RedisSessionBackend(
+            config.session_redis_url,
+            ttl=config.session_timeout,
+            prefix=config.session_redis_prefix,
+            flush_interval=config.session_flush_interval,
+            batch_size=config.session_flush_batch_size,
+            evidence_max_entries=config.evidence_max_entries
+        )
+    raise ValueError(f"不支持的会话后端: {config.session_backend}")
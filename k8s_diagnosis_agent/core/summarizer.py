@@ -0,0 +1,129 @@
+"""
+会话滚动摘要
+
+会话消息的估算token数超过阈值后，在请求路径之外用 memory_summary 场景的
+（便宜）模型把较早的消息并入会话的滚动摘要，只保留最近几条原始消息；
+被折叠的原始消息压缩归档。长时间的排障会话中，提示词和内存占用保持平稳。
+"""
+import asyncio
+from typing import Dict, Any, List, Optional, Set
+from loguru import logger
+
+from ..config import Config
+from ..llm.base import Message
+from ..llm.router import LLMRouter
+from ..llm.tokens import estimate_tokens, estimate_messages_tokens
+from .session import Session
+
+
+SUMMARY_SYSTEM_PROMPT = """你负责维护Kubernetes故障排查会话的滚动摘要。
+请把"已有摘要"和"新增对话"合并为一份新的摘要，保留：
+- 用户关注的问题和目标资源（命名空间、Pod、节点、服务等）
+- 已确认的现象、关键证据和数值
+- 已排除的原因和已给出的结论、建议
+- 尚未解决的问题
+只输出摘要正文，使用简洁的中文条目，不要复述无关的寒暄。"""
+
+
+class SessionSummarizer:
+    """会话滚动摘要器"""
+
+    def __init__(self, config: Config, llm_router: Optional[LLMRouter] = None):
+        """
+        Args:
+            config: 配置
+            llm_router: LLM路由器，使用 memory_summary 场景
+        """
+        self.config = config
+        self.llm_router = llm_router or LLMRouter(config.llm)
+        self.token_threshold = config.summary_token_threshold
+        self.keep_messages = config.summary_keep_messages
+        self.max_summary_tokens = config.summary_max_tokens
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.folded_messages = 0
+        self.fallbacks = 0
+
+    def needs_summary(self, session: Session) -> bool:
+        """会话是否超过阈值且有可折叠的消息"""
+        if self.token_threshold <= 0 or len(session.messages) <= self.keep_messages:
+            return False
+        return estimate_messages_tokens(session.messages) > self.token_threshold
+
+    def maybe_schedule(self, session: Session) -> Optional[asyncio.Task]:
+        """需要时在后台启动摘要任务，同一会话同时只运行一个"""
+        if session.session_id in self._running or not self.needs_summary(session):
+            return None
+        self._running.add(session.session_id)
+        task = asyncio.create_task(self._run(session))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, session: Session):
+        try:
+            await self.summarize(session)
+        except Exception as e:
+            logger.warning(f"会话 {session.session_id} 摘要失败: {e}")
+        finally:
+            self._running.discard(session.session_id)
+
+    async def summarize(self, session: Session) -> bool:
+        """
+        把较早的消息并入滚动摘要
+
+        Returns:
+            是否折叠了消息；摘要期间会话被清空时放弃本次结果
+        """
+        count = len(session.messages) - self.keep_messages
+        if count <= 0:
+            return False
+        generation = session.generation
+        folded = session.messages[:count]
+
+        summary = await self._generate_summary(session.summary, folded)
+        if session.generation != generation:
+            return False
+        session.fold_messages(count, summary)
+        self.folded_messages += count
+        logger.debug(f"会话 {session.session_id} 折叠 {count} 条消息，摘要约 {estimate_tokens(summary)} tokens")
+        return True
+
+    async def _generate_summary(self, previous: str, messages: List[Message]) -> str:
+        """调用便宜模型生成新摘要，失败时退回截取每条消息开头的抽取式摘要"""
+        dialogue = "\n".join(
+            f"{msg.role}: {msg.content}" for msg in messages if msg.role in ("user", "assistant")
+        )
+        prompt = f"已有摘要：\n{previous or '（无）'}\n\n新增对话：\n{dialogue}"
+        try:
+            provider = self.llm_router.get_provider("memory_summary")
+            response = await provider.generate(
+                [Message(role="user", content=prompt)],
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                max_tokens=self.max_summary_tokens
+            )
+            if response.content.strip():
+                return response.content.strip()
+        except Exception as e:
+            logger.warning(f"摘要模型调用失败，使用抽取式摘要: {e}")
+        self.fallbacks += 1
+        return self._extractive_summary(previous, messages)
+
+    def _extractive_summary(self, previous: str, messages: List[Message]) -> str:
+        """保留已有摘要和每条消息的开头，从旧到新截断到摘要token上限"""
+        lines = [previous] if previous else []
+        lines.extend(
+            f"- {msg.role}: {msg.content[:100].replace(chr(10), ' ')}"
+            for msg in messages if msg.role in ("user", "assistant")
+        )
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.max_summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "running": len(self._running),
+            "folded_messages": self.folded_messages,
+            "fallbacks": self.fallbacks,
+        }
@@ -81,6 +81,7 @@ except ImportError:
     LANGCHAIN_AVAILABLE = False
 
 from ..config import Config
+from ..llm.router import LLMRouter
 
 
 class K8sDiagnosisMemory:
@@ -136,11 +137,25 @@ class K8sDiagnosisMemory:
         if not LANGCHAIN_AVAILABLE:
             return None
         
+        # 记忆摘要对延迟不敏感，按路由配置使用便宜的模型
+        provider_name, model = LLMRouter(self.config.llm).resolve("memory_summary")
+        provider_config = self.config.llm.get_provider_config(provider_name, model)
+        
         try:
+            if provider_name in ["claude", "anthropic"]:
+                from langchain_anthropic import ChatAnthropic
+                return ChatAnthropic(
+                    api_key=provider_config["api_key"],
+                    model=provider_config["model"],
+                    temperature=0.1
+                )
+            
+            # OpenAI 与 DeepSeek 均使用 OpenAI 兼容接口
             from langchain_openai import ChatOpenAI
             return ChatOpenAI(
-                api_key=self.config.llm.openai_api_key,
-                model="gpt-3.5-turbo",
+                api_key=provider_config["api_key"],
+                base_url=provider_config.get("base_url"),
+                model=provider_config["model"],
                 temperature=0.1
             )
         except ImportError:
@@ -3,7 +3,6 @@ LangChain 提示词管理
 实现动态提示词生成和管理
 """
 from typing import Dict, Any, List, Optional
-import json
 
 # 注意：这些导入在实际环境中需要安装相应的包
 # 这里使用 try-except 来处理可能的导入错误
@@ -54,6 +53,7 @@ except ImportError:
     LANGCHAIN_AVAILABLE = False
 
 from ..config import Config
+from ..tools.render import render_compact
 
 
 class K8sPromptManager:
@@ -195,7 +195,8 @@ class K8sPromptManager:
         """创建分析提示词"""
         return f"""请分析以下Kubernetes数据：
 
-数据: {json.dumps(data, ensure_ascii=False, indent=2)}
+数据:
+{render_compact(data)}
 上下文: {context}
 
 请从以下角度进行分析：
@@ -2,7 +2,6 @@
 LangChain 工具包装器
 将现有的 K8s 诊断工具适配到 LangChain 框架
 """
-import json
 import asyncio
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
@@ -35,6 +34,7 @@ except ImportError:
 from ..config import Config
 from ..tools.registry import ToolRegistry
 from ..tools.base import ToolResult
+from ..tools.render import render_compact
 
 
 class K8sClusterInfoInput(BaseModel):
@@ -84,7 +84,7 @@ class K8sToolWrapper:
         """执行 K8s 工具"""
         try:
             tool = self.tool_registry.get_tool(tool_name, self.config.kubernetes.__dict__)
-            result = asyncio.run(tool.execute(**params))
+            result = asyncio.run(tool.run(**params))
             return {
                 "status": result.status.value,
                 "data": result.data,
@@ -103,7 +103,7 @@ class K8sToolWrapper:
         """异步执行 K8s 工具"""
         try:
             tool = self.tool_registry.get_tool(tool_name, self.config.kubernetes.__dict__)
-            result = await tool.execute(**params)
+            result = await tool.run(**params)
             return {
                 "status": result.status.value,
                 "data": result.data,
@@ -137,7 +137,7 @@ class K8sClusterInfoTool(BaseTool, K8sToolWrapper):
     ) -> str:
         """同步执行"""
         result = self._execute_k8s_tool("k8s_cluster_info", {"namespace": namespace})
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
     
     async def _arun(
         self, 
@@ -146,7 +146,7 @@ class K8sClusterInfoTool(BaseTool, K8sToolWrapper):
     ) -> str:
         """异步执行"""
         result = await self._execute_k8s_tool_async("k8s_cluster_info", {"namespace": namespace})
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
 
 
 class K8sPodInfoTool(BaseTool, K8sToolWrapper):
@@ -175,7 +175,7 @@ class K8sPodInfoTool(BaseTool, K8sToolWrapper):
             params["label_selector"] = label_selector
         
         result = self._execute_k8s_tool("k8s_pod_info", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
     
     async def _arun(
         self, 
@@ -192,7 +192,7 @@ class K8sPodInfoTool(BaseTool, K8sToolWrapper):
             params["label_selector"] = label_selector
         
         result = await self._execute_k8s_tool_async("k8s_pod_info", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
 
 
 class K8sNodeInfoTool(BaseTool, K8sToolWrapper):
@@ -217,7 +217,7 @@ class K8sNodeInfoTool(BaseTool, K8sToolWrapper):
             params["node_name"] = node_name
         
         result = self._execute_k8s_tool("k8s_node_info", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
     
     async def _arun(
         self, 
@@ -230,7 +230,7 @@ class K8sNodeInfoTool(BaseTool, K8sToolWrapper):
             params["node_name"] = node_name
         
         result = await self._execute_k8s_tool_async("k8s_node_info", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
 
 
 class K8sEventsTool(BaseTool, K8sToolWrapper):
@@ -256,7 +256,7 @@ class K8sEventsTool(BaseTool, K8sToolWrapper):
             params["field_selector"] = field_selector
         
         result = self._execute_k8s_tool("k8s_events", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
     
     async def _arun(
         self, 
@@ -270,7 +270,7 @@ class K8sEventsTool(BaseTool, K8sToolWrapper):
             params["field_selector"] = field_selector
         
         result = await self._execute_k8s_tool_async("k8s_events", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
 
 
 class K8sLogsTool(BaseTool, K8sToolWrapper):
@@ -302,7 +302,7 @@ class K8sLogsTool(BaseTool, K8sToolWrapper):
             params["container_name"] = container_name
         
         result = self._execute_k8s_tool("k8s_logs", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
     
     async def _arun(
         self, 
@@ -322,7 +322,7 @@ class K8sLogsTool(BaseTool, K8sToolWrapper):
             params["container_name"] = container_name
         
         result = await self._execute_k8s_tool_async("k8s_logs", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
 
 
 class SystemInfoTool(BaseTool, K8sToolWrapper):
@@ -342,7 +342,7 @@ class SystemInfoTool(BaseTool, K8sToolWrapper):
     ) -> str:
         """同步执行"""
         result = self._execute_k8s_tool("system_info", {})
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
     
     async def _arun(
         self,
@@ -350,7 +350,7 @@ class SystemInfoTool(BaseTool, K8sToolWrapper):
     ) -> str:
         """异步执行"""
         result = await self._execute_k8s_tool_async("system_info", {})
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return render_compact(result)
 
 
 def create_langchain_tools(config: Config) -> List[BaseTool]:
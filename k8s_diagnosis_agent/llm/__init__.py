@@ -2,16 +2,44 @@
 LLM提供者模块
 """
 
-from .base import BaseLLMProvider
-from .openai_provider import OpenAIProvider
-from .claude_provider import ClaudeProvider
-from .deepseek_provider import DeepSeekProvider
-from .factory import LLMFactory
+import importlib
+
+# 导出名到子模块的映射，首次访问时才导入对应子模块，
+# 导入 governor、cache 等子模块时不必加载各提供者的HTTP客户端
+_EXPORTS = {
+    "BaseLLMProvider": ".base",
+    "LLMResponse": ".base",
+    "Message": ".base",
+    "ToolCall": ".base",
+    "OpenAIProvider": ".openai_provider",
+    "ClaudeProvider": ".claude_provider",
+    "DeepSeekProvider": ".deepseek_provider",
+    "LLMFactory": ".factory",
+    "LLMResponseCache": ".cache",
+    "LLMRouter": ".router",
+    "HedgedLLMProvider": ".hedged_provider",
+    "LLMGovernor": ".governor",
+    "GovernedLLMProvider": ".governor",
+}
 
 __all__ = [
     "BaseLLMProvider",
+    "LLMResponse",
+    "Message",
+    "ToolCall",
     "OpenAIProvider", 
     "ClaudeProvider",
     "DeepSeekProvider",
-    "LLMFactory"
-] 
\ No newline at end of file
+    "LLMFactory",
+    "LLMResponseCache",
+    "LLMRouter",
+    "HedgedLLMProvider",
+    "LLMGovernor",
+    "GovernedLLMProvider"
+]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
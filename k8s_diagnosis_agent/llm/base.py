@@ -1,9 +1,25 @@
 """
 LLM提供者基础抽象类
 """
+import json
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional, AsyncIterator
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 from pydantic import BaseModel
+from .cache import LLMResponseCache, get_response_cache
+from ..metrics import CACHE_LOOKUPS
+
+
+# 外层包装已查询且未命中的缓存键，内层提供者不再重复查询
+cache_miss_key_var: ContextVar[Optional[str]] = ContextVar("llm_cache_miss_key", default=None)
+
+
+class ToolCall(BaseModel):
+    """模型发起的工具调用"""
+    id: str
+    name: str
+    arguments: Dict[str, Any] = {}
 
 
 class Message(BaseModel):
@@ -11,6 +27,8 @@ class Message(BaseModel):
     role: str
     content: str
     timestamp: Optional[str] = None
+    tool_calls: Optional[List[ToolCall]] = None  # assistant消息中发起的工具调用
+    tool_call_id: Optional[str] = None  # tool消息对应的工具调用ID
 
 
 class LLMResponse(BaseModel):
@@ -19,6 +37,7 @@ class LLMResponse(BaseModel):
     model: str
     usage: Dict[str, Any] = {}
     metadata: Dict[str, Any] = {}
+    tool_calls: List[ToolCall] = []
 
 
 class BaseLLMProvider(ABC):
@@ -37,6 +56,15 @@ class BaseLLMProvider(ABC):
         self.max_tokens = config.get("max_tokens", 4096)
         self.timeout = config.get("timeout", 60)
         
+        # 可选的响应缓存（默认关闭）
+        self.response_cache: Optional[LLMResponseCache] = None
+        self.cache_max_temperature = config.get("response_cache_max_temperature", 0.3)
+        if config.get("response_cache_enabled"):
+            self.response_cache = get_response_cache(
+                config.get("response_cache_path", ".cache/llm_responses.sqlite3"),
+                config.get("response_cache_max_bytes", 64 * 1024 * 1024)
+            )
+        
     @abstractmethod
     async def generate(
         self,
@@ -120,7 +148,50 @@ class BaseLLMProvider(ABC):
         Returns:
             格式化后的消息列表
         """
-        return [{"role": msg.role, "content": msg.content} for msg in messages]
+        formatted = []
+        for msg in messages:
+            item: Dict[str, Any] = {"role": msg.role, "content": msg.content}
+            if msg.tool_calls:
+                item["tool_calls"] = [
+                    {
+                        "id": call.id,
+                        "type": "function",
+                        "function": {
+                            "name": call.name,
+                            "arguments": json.dumps(call.arguments, ensure_ascii=False)
+                        }
+                    }
+                    for call in msg.tool_calls
+                ]
+            if msg.tool_call_id:
+                item["tool_call_id"] = msg.tool_call_id
+            formatted.append(item)
+        return formatted
+    
+    @staticmethod
+    def parse_tool_calls(message: Dict[str, Any]) -> List[ToolCall]:
+        """
+        解析OpenAI兼容格式响应中的工具调用（支持并行工具调用）
+        
+        Args:
+            message: 响应中的message字段
+            
+        Returns:
+            工具调用列表，参数无法解析为JSON时置为空字典
+        """
+        tool_calls = []
+        for call in message.get("tool_calls") or []:
+            function = call.get("function", {})
+            try:
+                arguments = json.loads(function.get("arguments") or "{}")
+            except json.JSONDecodeError:
+                arguments = {}
+            tool_calls.append(ToolCall(
+                id=call.get("id", ""),
+                name=function.get("name", ""),
+                arguments=arguments if isinstance(arguments, dict) else {}
+            ))
+        return tool_calls
     
     def validate_config(self) -> bool:
         """
@@ -133,4 +204,67 @@ class BaseLLMProvider(ABC):
         for field in required_fields:
             if field not in self.config or not self.config[field]:
                 return False
-        return True 
\ No newline at end of file
+        return True 
+    
+    async def _lookup_cached_response(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str],
+        params: Dict[str, Any]
+    ) -> Tuple[Optional[LLMResponse], Optional[str]]:
+        """
+        查询响应缓存
+        
+        只有启用缓存且温度不高于阈值的调用才会参与缓存。
+        
+        Args:
+            messages: 消息列表
+            system_prompt: 系统提示
+            params: 调用参数
+            
+        Returns:
+            (命中的响应或None, 缓存键或None)
+        """
+        if self.response_cache is None:
+            return None, None
+        if params.get("temperature", self.temperature) > self.cache_max_temperature:
+            return None, None
+        
+        effective_params = {
+            "temperature": params.get("temperature", self.temperature),
+            "max_tokens": params.get("max_tokens", self.max_tokens),
+            **{k: v for k, v in params.items() if k not in ("temperature", "max_tokens")}
+        }
+        key = LLMResponseCache.make_key(
+            self.model_name,
+            self.format_messages(messages),
+            system_prompt,
+            effective_params,
+            provider=self.get_model_info().get("provider", type(self).__name__),
+            base_url=getattr(self, "base_url", None) or self.config.get("base_url")
+        )
+        if cache_miss_key_var.get() == key:
+            return None, key
+        
+        try:
+            cached = await asyncio.to_thread(self.response_cache.get, key)
+        except Exception:
+            return None, key
+        CACHE_LOOKUPS.labels("llm_response", "hit" if cached is not None else "miss").inc()
+        if cached is None:
+            return None, key
+        
+        response = LLMResponse(**cached)
+        response.metadata = {**response.metadata, "cache_hit": True, "cache_key": key}
+        return response, key
+    
+    async def _store_cached_response(self, key: Optional[str], response: LLMResponse):
+        """写入响应缓存，并在元数据中标记未命中"""
+        if self.response_cache is None or key is None:
+            return
+        response.metadata = {**response.metadata, "cache_hit": False, "cache_key": key}
+        try:
+            await asyncio.to_thread(self.response_cache.set, key, response.dict())
+        except Exception:
+            # 缓存失败不影响正常调用
+            pass
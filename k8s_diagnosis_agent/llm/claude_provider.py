@@ -5,7 +5,7 @@ import json
 import asyncio
 from typing import Dict, Any, List, Optional, AsyncIterator
 import httpx
-from .base import BaseLLMProvider, Message, LLMResponse
+from .base import BaseLLMProvider, Message, LLMResponse, ToolCall
 
 
 class ClaudeProvider(BaseLLMProvider):
@@ -35,6 +35,10 @@ class ClaudeProvider(BaseLLMProvider):
         **kwargs
     ) -> LLMResponse:
         """生成响应"""
+        cached, cache_key = await self._lookup_cached_response(messages, system_prompt, kwargs)
+        if cached is not None:
+            return cached
+        
         try:
             formatted_messages = self.format_messages(messages)
             
@@ -48,17 +52,30 @@ class ClaudeProvider(BaseLLMProvider):
             if system_prompt:
                 request_data["system"] = system_prompt
             
+            # 添加工具调用支持（将OpenAI格式的工具schema转换为Claude格式）
+            if "tools" in kwargs:
+                request_data["tools"] = self.convert_tools(kwargs["tools"])
+            
             response = await self.client.post("/v1/messages", json=request_data)
             response.raise_for_status()
             
             result = response.json()
             
-            return LLMResponse(
-                content=result["content"][0]["text"],
+            text_blocks = [block["text"] for block in result["content"] if block.get("type") == "text"]
+            tool_calls = [
+                ToolCall(id=block["id"], name=block["name"], arguments=block.get("input") or {})
+                for block in result["content"] if block.get("type") == "tool_use"
+            ]
+            
+            llm_response = LLMResponse(
+                content="".join(text_blocks),
                 model=result["model"],
+                tool_calls=tool_calls,
                 usage=result.get("usage", {}),
                 metadata={"response_id": result.get("id"), "type": result.get("type")}
             )
+            await self._store_cached_response(cache_key, llm_response)
+            return llm_response
             
         except Exception as e:
             raise Exception(f"Claude API调用失败: {str(e)}")
@@ -104,6 +121,43 @@ class ClaudeProvider(BaseLLMProvider):
         except Exception as e:
             raise Exception(f"Claude流式API调用失败: {str(e)}")
     
+    @staticmethod
+    def convert_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """将OpenAI格式的工具schema转换为Claude格式"""
+        converted = []
+        for tool in tools:
+            function = tool.get("function", tool)
+            converted.append({
+                "name": function["name"],
+                "description": function.get("description", ""),
+                "input_schema": function.get("parameters", {"type": "object", "properties": {}})
+            })
+        return converted
+    
+    def format_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
+        """格式化消息，工具调用与工具结果使用Claude的内容块格式"""
+        formatted: List[Dict[str, Any]] = []
+        for msg in messages:
+            if msg.role == "tool":
+                block = {"type": "tool_result", "tool_use_id": msg.tool_call_id, "content": msg.content}
+                # 同一轮的多个工具结果合并到一条user消息中
+                if formatted and formatted[-1]["role"] == "user" and isinstance(formatted[-1]["content"], list):
+                    formatted[-1]["content"].append(block)
+                else:
+                    formatted.append({"role": "user", "content": [block]})
+            elif msg.tool_calls:
+                blocks: List[Dict[str, Any]] = []
+                if msg.content:
+                    blocks.append({"type": "text", "text": msg.content})
+                blocks.extend(
+                    {"type": "tool_use", "id": call.id, "name": call.name, "input": call.arguments}
+                    for call in msg.tool_calls
+                )
+                formatted.append({"role": msg.role, "content": blocks})
+            else:
+                formatted.append({"role": msg.role, "content": msg.content})
+        return formatted
+    
     async def embed(self, text: str) -> List[float]:
         """文本嵌入 - Claude暂不支持，抛出异常"""
         raise NotImplementedError("Claude暂不支持文本嵌入功能")
@@ -6,6 +6,9 @@ from .base import BaseLLMProvider
 from .openai_provider import OpenAIProvider
 from .claude_provider import ClaudeProvider
 from .deepseek_provider import DeepSeekProvider
+from .hedged_provider import HedgedLLMProvider
+from .governor import GovernedLLMProvider, get_governor
+from .instrumented import InstrumentedLLMProvider
 
 
 class LLMFactory:
@@ -17,6 +20,7 @@ class LLMFactory:
         "claude": ClaudeProvider,
         "anthropic": ClaudeProvider,  # 别名
         "deepseek": DeepSeekProvider,
+        "hedged": HedgedLLMProvider,  # 对冲请求/故障转移组合提供者
     }
     
     @classmethod
@@ -28,7 +32,23 @@ class LLMFactory:
             raise ValueError(f"不支持的LLM提供者: {provider_name}")
         
         provider_class = cls._providers[provider_name]
-        return provider_class(config)
+        provider = provider_class(config)
+        
+        # 具体厂商的提供者记录请求指标，对冲提供者的下游提供者各自记录
+        if provider_class is not HedgedLLMProvider:
+            provider = InstrumentedLLMProvider(provider, provider.get_model_info().get("provider", provider_name))
+        
+        # 启用治理时，同一厂商的所有实例共享一个治理器
+        if config.get("governor_enabled"):
+            governor = get_governor(
+                provider.get_model_info().get("provider", provider_name),
+                rpm=config.get("governor_rpm", 0),
+                tpm=config.get("governor_tpm", 0),
+                max_in_flight=config.get("governor_max_in_flight", 0)
+            )
+            provider = GovernedLLMProvider(provider, governor)
+        
+        return provider
     
     @classmethod
     def get_supported_providers(cls) -> list:
@@ -0,0 +1,343 @@
+"""
+LLM并发与速率治理
+
+按提供者限制每分钟请求数（RPM）、每分钟token数（TPM）和最大并发数，
+等待中的请求按会话做加权公平排队（WFQ），避免单个重度用户饿死其他会话。
+"""
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from .base import BaseLLMProvider, Message, LLMResponse, cache_miss_key_var
+from .tokens import estimate_messages_tokens
+from ..metrics import QUEUE_DEPTH, register_collect_hook
+
+
+# 当前请求所属的会话，用于公平排队
+llm_session_var: ContextVar[str] = ContextVar("llm_session", default="anonymous")
+
+
+def set_llm_session(session_id: str):
+    """设置当前上下文中LLM请求所属的会话"""
+    llm_session_var.set(session_id)
+
+
+class _Waiter:
+    """排队中的请求"""
+
+    __slots__ = ("session_id", "tokens", "start_tag", "future", "enqueued_at")
+
+    def __init__(self, session_id: str, tokens: int, start_tag: float, future: asyncio.Future):
+        self.session_id = session_id
+        self.tokens = tokens
+        self.start_tag = start_tag
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMGovernor:
+    """单个提供者的并发与速率治理器"""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_in_flight: int = 0,
+        session_weights: Optional[Dict[str, float]] = None
+    ):
+        """
+        初始化治理器
+
+        Args:
+            name: 提供者名称
+            rpm: 每分钟请求数上限，0表示不限制
+            tpm: 每分钟token数上限，0表示不限制
+            max_in_flight: 最大并发请求数，0表示不限制
+            session_weights: 会话权重，未配置的会话权重为1
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.session_weights = session_weights or {}
+
+        self._request_budget = float(rpm)
+        self._token_budget = float(tpm)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._queue: List[Tuple[float, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.total_granted = 0
+        self.total_tokens = 0
+        self.wait_times: deque = deque(maxlen=1000)
+
+    def _refill(self):
+        """按流逝时间补充令牌桶"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rpm:
+            self._request_budget = min(float(self.rpm), self._request_budget + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._token_budget = min(float(self.tpm), self._token_budget + elapsed * self.tpm / 60)
+
+    def _admit_delay(self, tokens: int) -> float:
+        """计算放行请求还需等待的秒数，0表示可立即放行，inf表示需等待并发槽释放"""
+        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+            return math.inf
+
+        delay = 0.0
+        if self.rpm and self._request_budget < 1:
+            delay = max(delay, (1 - self._request_budget) * 60 / self.rpm)
+        if self.tpm:
+            # 单个请求超过整桶容量时按整桶计算，避免永远无法放行
+            needed = min(tokens, self.tpm)
+            if self._token_budget < needed:
+                delay = max(delay, (needed - self._token_budget) * 60 / self.tpm)
+        return delay
+
+    def _dispatch(self):
+        """按虚拟完成时间从小到大放行排队请求"""
+        self._refill()
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter.future.done():
+                # 已取消的请求
+                heapq.heappop(self._queue)
+                continue
+
+            delay = self._admit_delay(waiter.tokens)
+            if delay > 0:
+                if delay != math.inf:
+                    self._schedule(delay)
+                return
+
+            heapq.heappop(self._queue)
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            if self.rpm:
+                self._request_budget -= 1
+            if self.tpm:
+                self._token_budget -= waiter.tokens
+            self._in_flight += 1
+            self.total_granted += 1
+            self.wait_times.append(time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _schedule(self, delay: float):
+        """在令牌桶补充足够后重新调度"""
+        if self._timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _prune_finish_tags(self):
+        """清理已经落后于虚拟时间的会话标记"""
+        if len(self._finish_tags) > 1000:
+            self._finish_tags = {
+                session_id: tag for session_id, tag in self._finish_tags.items()
+                if tag > self._virtual_time
+            }
+
+    async def acquire(self, session_id: str, tokens: int):
+        """
+        申请一个请求槽位
+
+        Args:
+            session_id: 会话ID
+            tokens: 预估消耗的token数
+        """
+        loop = asyncio.get_running_loop()
+        weight = self.session_weights.get(session_id, 1.0)
+        start_tag = max(self._virtual_time, self._finish_tags.get(session_id, 0.0))
+        finish_tag = start_tag + max(tokens, 1) / weight
+        self._finish_tags[session_id] = finish_tag
+        self._prune_finish_tags()
+
+        waiter = _Waiter(session_id, tokens, start_tag, loop.create_future())
+        heapq.heappush(self._queue, (finish_tag, next(self._seq), waiter))
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已获得槽位但调用方被取消，归还槽位
+                self.release(tokens, 0)
+            else:
+                waiter.future.cancel()
+                self._dispatch()
+            raise
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None):
+        """
+        归还请求槽位
+
+        Args:
+            estimated_tokens: 申请时预估的token数
+            actual_tokens: 实际消耗的token数，用于修正TPM令牌桶
+        """
+        self._in_flight -= 1
+        used = estimated_tokens if actual_tokens is None else actual_tokens
+        self.total_tokens += used
+        if self.tpm and actual_tokens is not None:
+            self._token_budget -= actual_tokens - estimated_tokens
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, tokens: int):
+        """
+        在上下文内占用一个请求槽位
+
+        Yields:
+            用于回填实际token用量的字典
+        """
+        await self.acquire(session_id, tokens)
+        usage: Dict[str, Optional[int]] = {"tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(tokens, usage["tokens"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取排队与等待统计"""
+        waits = sorted(self.wait_times)
+        queued = [waiter for _, _, waiter in self._queue if not waiter.future.done()]
+        per_session: Dict[str, int] = {}
+        for waiter in queued:
+            per_session[waiter.session_id] = per_session.get(waiter.session_id, 0) + 1
+
+        return {
+            "provider": self.name,
+            "limits": {"rpm": self.rpm, "tpm": self.tpm, "max_in_flight": self.max_in_flight},
+            "in_flight": self._in_flight,
+            "queue_depth": len(queued),
+            "queue_depth_by_session": per_session,
+            "total_granted": self.total_granted,
+            "total_tokens": self.total_tokens,
+            "wait_seconds": {
+                "avg": sum(waits) / len(waits) if waits else 0.0,
+                "p95": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0,
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
+
+
+def usage_total_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    """从响应的usage中取总token数，Claude只返回输入和输出token数时相加"""
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    for prompt_key, completion_key in (("input_tokens", "output_tokens"), ("prompt_tokens", "completion_tokens")):
+        if usage.get(prompt_key) is not None or usage.get(completion_key) is not None:
+            return (usage.get(prompt_key) or 0) + (usage.get(completion_key) or 0)
+    return None
+
+
+class GovernedLLMProvider(BaseLLMProvider):
+    """受治理器约束的LLM提供者包装"""
+
+    def __init__(self, provider: BaseLLMProvider, governor: LLMGovernor):
+        super().__init__(provider.config)
+        self.provider = provider
+        self.governor = governor
+        self.model_name = provider.model_name
+
+    def _estimate(self, messages: List[Message], system_prompt: Optional[str], kwargs: Dict[str, Any]) -> int:
+        """预估请求消耗：提示token数加上最大生成token数"""
+        return estimate_messages_tokens(messages, system_prompt) + kwargs.get("max_tokens", self.provider.max_tokens)
+
+    async def generate(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> LLMResponse:
+        """生成响应，命中响应缓存时不排队、不占用槽位和限额"""
+        cached, cache_key = await self._lookup_cached_response(messages, system_prompt, kwargs)
+        if cached is not None:
+            return cached
+        token = cache_miss_key_var.set(cache_key)
+        try:
+            estimated = self._estimate(messages, system_prompt, kwargs)
+            async with self.governor.slot(llm_session_var.get(), estimated) as usage:
+                response = await self.provider.generate(messages, system_prompt=system_prompt, **kwargs)
+                usage["tokens"] = usage_total_tokens(response.usage)
+                return response
+        finally:
+            cache_miss_key_var.reset(token)
+
+    async def _lookup_cached_response(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str],
+        params: Dict[str, Any]
+    ) -> Tuple[Optional[LLMResponse], Optional[str]]:
+        """查询被包装提供者的响应缓存"""
+        return await self.provider._lookup_cached_response(messages, system_prompt, params)
+
+    async def stream_generate(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """流式生成响应，整个流式过程占用一个槽位"""
+        estimated = self._estimate(messages, system_prompt, kwargs)
+        async with self.governor.slot(llm_session_var.get(), estimated):
+            async for chunk in self.provider.stream_generate(messages, system_prompt=system_prompt, **kwargs):
+                yield chunk
+
+    async def embed(self, text: str) -> List[float]:
+        """文本嵌入"""
+        return await self.provider.embed(text)
+
+    def supports_function_calling(self) -> bool:
+        """是否支持函数调用"""
+        return self.provider.supports_function_calling()
+
+    def get_model_info(self) -> Dict[str, Any]:
+        """获取模型信息"""
+        return {**self.provider.get_model_info(), "governor": self.governor.get_stats()}
+
+    def validate_config(self) -> bool:
+        """验证配置"""
+        return self.provider.validate_config()
+
+
+# 每个提供者共享一个治理器，使同一厂商的所有实例共用限额
+_governors: Dict[str, LLMGovernor] = {}
+
+
+def get_governor(name: str, rpm: int = 0, tpm: int = 0, max_in_flight: int = 0) -> LLMGovernor:
+    """获取（或创建）指定提供者的治理器"""
+    governor = _governors.get(name)
+    if governor is None:
+        governor = LLMGovernor(name, rpm=rpm, tpm=tpm, max_in_flight=max_in_flight)
+        _governors[name] = governor
+    return governor
+
+
+def get_governor_stats() -> Dict[str, Any]:
+    """获取所有治理器的统计"""
+    return {name: governor.get_stats() for name, governor in _governors.items()}
+
+
+def _update_metrics():
+    for name, governor in _governors.items():
+        QUEUE_DEPTH.labels(f"llm:{name}").set(governor.get_stats()["queue_depth"])
+
+
+register_collect_hook("llm_governors", _update_metrics)
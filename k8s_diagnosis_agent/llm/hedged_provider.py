@@ -0,0 +1,286 @@
+"""
+对冲请求与自动故障转移的组合LLM提供者
+
+先把请求发给主提供者，超过基于历史延迟p95计算出的对冲延迟仍未返回时，
+再并行发给下一个提供者，取最先成功的结果并取消其余请求。
+连续失败的提供者会被熔断一段时间，期间自动跳过。
+"""
+import time
+import asyncio
+from collections import deque
+from typing import Dict, Any, List, Optional, AsyncIterator, Callable, Awaitable, Tuple
+from .base import BaseLLMProvider, Message, LLMResponse
+
+
+class ProviderHealth:
+    """提供者健康评分"""
+
+    def __init__(self, window: int = 100, failure_threshold: int = 3, cooldown: float = 30.0):
+        """
+        初始化健康评分
+
+        Args:
+            window: 保留的最近成功延迟样本数
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断持续时间（秒）
+        """
+        self.latencies: deque = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.success_rate = 1.0  # 成功率的指数滑动平均
+        self.consecutive_failures = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.open_until = 0.0
+
+    def record_success(self, latency: float):
+        """记录一次成功调用"""
+        self.latencies.append(latency)
+        self.total_requests += 1
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.success_rate = self.success_rate * 0.9 + 0.1
+
+    def record_failure(self):
+        """记录一次失败调用，连续失败达到阈值后熔断"""
+        self.total_requests += 1
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self.success_rate = self.success_rate * 0.9
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+
+    def is_available(self) -> bool:
+        """是否可用（未处于熔断状态）"""
+        return time.monotonic() >= self.open_until
+
+    def percentile(self, q: float) -> Optional[float]:
+        """获取成功延迟的分位数"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "available": self.is_available(),
+            "success_rate": round(self.success_rate, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "latency_p95": self.percentile(0.95),
+            "samples": len(self.latencies),
+        }
+
+
+class HedgedLLMProvider(BaseLLMProvider):
+    """对冲请求组合提供者"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        初始化组合提供者
+
+        Args:
+            config: 配置字典，providers 按优先级排列，每项为
+                {"provider": 名称, "config": 提供者配置} 或提供者实例
+        """
+        super().__init__(config)
+        # 避免与工厂模块循环导入
+        from .factory import LLMFactory
+
+        self.providers: List[BaseLLMProvider] = []
+        self.provider_names: List[str] = []
+        for entry in config.get("providers", []):
+            if isinstance(entry, BaseLLMProvider):
+                provider = entry
+                name = entry.get_model_info().get("provider", entry.__class__.__name__)
+            else:
+                name = entry["provider"]
+                provider = LLMFactory.create_provider(name, entry.get("config", {}))
+            self.providers.append(provider)
+            self.provider_names.append(f"{name}:{provider.model_name}")
+
+        if not self.providers:
+            raise ValueError("对冲提供者至少需要一个下游提供者")
+
+        self.model_name = self.providers[0].model_name
+        self.hedge_delay = config.get("hedge_delay", 2.0)
+        self.hedge_percentile = config.get("hedge_percentile", 0.95)
+        self.hedge_min_delay = config.get("hedge_min_delay", 0.2)
+        self.hedge_max_delay = config.get("hedge_max_delay", 10.0)
+        self.hedge_min_samples = config.get("hedge_min_samples", 5)
+        self.health = [
+            ProviderHealth(
+                failure_threshold=config.get("failure_threshold", 3),
+                cooldown=config.get("cooldown", 30.0)
+            )
+            for _ in self.providers
+        ]
+
+    def _get_candidates(self) -> List[int]:
+        """按优先级获取可用的提供者，全部熔断时仍按原顺序尝试"""
+        available = [i for i, health in enumerate(self.health) if health.is_available()]
+        return available or list(range(len(self.providers)))
+
+    def _get_hedge_delay(self, index: int) -> float:
+        """计算对冲延迟：样本充足时使用p95延迟，否则使用配置的默认值"""
+        health = self.health[index]
+        delay = self.hedge_delay
+        if len(health.latencies) >= self.hedge_min_samples:
+            delay = health.percentile(self.hedge_percentile) or delay
+        return min(max(delay, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _hedged_call(
+        self,
+        make_call: Callable[[BaseLLMProvider], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Tuple[int, Any, bool]:
+        """
+        执行对冲调用
+
+        Args:
+            make_call: 对单个提供者发起调用的函数
+            discard: 丢弃落选结果时的清理函数
+
+        Returns:
+            (胜出的提供者序号, 调用结果, 是否发生了对冲)
+        """
+        candidates = self._get_candidates()
+        tasks: Dict[asyncio.Task, Tuple[int, float]] = {}
+        errors: List[str] = []
+        next_pos = 0
+        hedged = False
+
+        def launch():
+            nonlocal next_pos
+            index = candidates[next_pos]
+            next_pos += 1
+            task = asyncio.ensure_future(make_call(self.providers[index]))
+            tasks[task] = (index, time.monotonic())
+            return index
+
+        last_index = launch()
+        try:
+            while tasks or next_pos < len(candidates):
+                if not tasks:
+                    # 已发出的请求全部失败，立即转移到下一个提供者
+                    last_index = launch()
+                    continue
+
+                timeout = self._get_hedge_delay(last_index) if next_pos < len(candidates) else None
+                done, _ = await asyncio.wait(
+                    list(tasks.keys()), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 超过对冲延迟仍未返回，向下一个提供者发出对冲请求
+                    hedged = True
+                    last_index = launch()
+                    continue
+
+                winner: Optional[Tuple[int, Any]] = None
+                for task in done:
+                    index, started = tasks.pop(task)
+                    if task.exception() is not None:
+                        self.health[index].record_failure()
+                        errors.append(f"{self.provider_names[index]}: {task.exception()}")
+                    elif winner is None:
+                        self.health[index].record_success(time.monotonic() - started)
+                        winner = (index, task.result())
+                    elif discard is not None:
+                        await discard(task.result())
+
+                if winner is not None:
+                    return winner[0], winner[1], hedged
+        finally:
+            # 取消仍在进行中的请求
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks.keys(), return_exceptions=True)
+
+        raise Exception(f"所有LLM提供者调用失败: {'; '.join(errors)}")
+
+    async def generate(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> LLMResponse:
+        """生成响应"""
+        index, response, hedged = await self._hedged_call(
+            lambda provider: provider.generate(messages, system_prompt=system_prompt, **kwargs)
+        )
+        response.metadata = {
+            **response.metadata,
+            "served_by": self.provider_names[index],
+            "hedged": hedged,
+        }
+        return response
+
+    async def _lookup_cached_response(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str],
+        params: Dict[str, Any]
+    ) -> Tuple[Optional[LLMResponse], Optional[str]]:
+        """组合提供者没有自己的缓存，由下游提供者各自查询"""
+        return None, None
+
+    async def stream_generate(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """流式生成响应，以首个片段到达的先后决定胜出的提供者"""
+
+        async def first_chunk(provider: BaseLLMProvider):
+            stream = provider.stream_generate(messages, system_prompt=system_prompt, **kwargs)
+            try:
+                return stream, await stream.__anext__()  # type: ignore
+            except StopAsyncIteration:
+                return stream, None
+
+        async def close_stream(result):
+            await result[0].aclose()
+
+        _, (stream, chunk), _ = await self._hedged_call(first_chunk, discard=close_stream)
+        if chunk is None:
+            return
+        yield chunk
+        async for chunk in stream:
+            yield chunk
+
+    async def embed(self, text: str) -> List[float]:
+        """文本嵌入，按优先级使用第一个支持嵌入的提供者"""
+        errors = []
+        for index in self._get_candidates():
+            try:
+                return await self.providers[index].embed(text)
+            except NotImplementedError as e:
+                errors.append(str(e))
+        raise NotImplementedError(f"没有可用的嵌入提供者: {'; '.join(errors)}")
+
+    def supports_function_calling(self) -> bool:
+        """是否支持函数调用（所有下游提供者都支持时才支持）"""
+        return all(provider.supports_function_calling() for provider in self.providers)
+
+    def get_model_info(self) -> Dict[str, Any]:
+        """获取模型信息"""
+        return {
+            "provider": "hedged",
+            "model": self.model_name,
+            "supports_function_calling": self.supports_function_calling(),
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "providers": [
+                {"name": name, **health.to_dict()}
+                for name, health in zip(self.provider_names, self.health)
+            ],
+        }
+
+    def validate_config(self) -> bool:
+        """验证配置"""
+        return any(provider.validate_config() for provider in self.providers)
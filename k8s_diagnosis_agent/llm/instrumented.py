@@ -0,0 +1,113 @@
+"""
+LLM请求指标
+
+包装具体的LLM提供者，按提供者记录请求耗时、成功与失败次数和token用量。
+命中响应缓存的请求单独计数，不计入耗时和token。
+"""
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from .base import BaseLLMProvider, Message, LLMResponse
+from ..metrics import LLM_SECONDS, LLM_REQUESTS, LLM_TOKENS
+from ..tracing import start_span
+
+
+# 各厂商usage字段到指标中token类型的映射
+_USAGE_KINDS = {
+    "prompt_tokens": "prompt",
+    "completion_tokens": "completion",
+    "input_tokens": "prompt",
+    "output_tokens": "completion",
+}
+
+
+class InstrumentedLLMProvider(BaseLLMProvider):
+    """记录请求指标的LLM提供者包装"""
+
+    def __init__(self, provider: BaseLLMProvider, name: str):
+        super().__init__(provider.config)
+        self.provider = provider
+        self.provider_name = name
+        self.model_name = provider.model_name
+        self.max_tokens = provider.max_tokens
+
+    def _observe(self, operation: str, started: float, status: str):
+        LLM_REQUESTS.labels(self.provider_name, operation, status).inc()
+        if status != "cache_hit":
+            LLM_SECONDS.labels(self.provider_name, operation).observe(time.perf_counter() - started)
+
+    async def generate(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> LLMResponse:
+        """生成响应"""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with start_span("llm.generate", provider=self.provider_name, model=self.model_name) as span:
+                response = await self.provider.generate(messages, system_prompt=system_prompt, **kwargs)
+                if response.metadata.get("cache_hit"):
+                    status = "cache_hit"
+                    span.set_attribute("llm.cache_hit", True)
+                else:
+                    status = "success"
+                    for key, kind in _USAGE_KINDS.items():
+                        if response.usage.get(key):
+                            LLM_TOKENS.labels(self.provider_name, kind).inc(response.usage[key])
+                            span.set_attribute(f"llm.{kind}_tokens", response.usage[key])
+                return response
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            self._observe("generate", started, status)
+
+    async def _lookup_cached_response(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str],
+        params: Dict[str, Any]
+    ) -> Tuple[Optional[LLMResponse], Optional[str]]:
+        """查询被包装提供者的响应缓存，外层在调用前查询时命中也计入请求数"""
+        cached, key = await self.provider._lookup_cached_response(messages, system_prompt, params)
+        if cached is not None:
+            self._observe("generate", time.perf_counter(), "cache_hit")
+        return cached, key
+
+    async def stream_generate(
+        self,
+        messages: List[Message],
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """流式生成响应"""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with start_span("llm.stream", provider=self.provider_name, model=self.model_name):
+                async for chunk in self.provider.stream_generate(messages, system_prompt=system_prompt, **kwargs):
+                    yield chunk
+            status = "success"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            self._observe("stream", started, status)
+
+    async def embed(self, text: str) -> List[float]:
+        """文本嵌入"""
+        return await self.provider.embed(text)
+
+    def supports_function_calling(self) -> bool:
+        """是否支持函数调用"""
+        return self.provider.supports_function_calling()
+
+    def get_model_info(self) -> Dict[str, Any]:
+        """获取模型信息"""
+        return self.provider.get_model_info()
+
+    def validate_config(self) -> bool:
+        """验证配置"""
+        return self.provider.validate_config()
@@ -29,6 +29,10 @@ class OpenAIProvider(BaseLLMProvider):
         **kwargs
     ) -> LLMResponse:
         """生成响应"""
+        cached, cache_key = await self._lookup_cached_response(messages, system_prompt, kwargs)
+        if cached is not None:
+            return cached
+        
         try:
             formatted_messages = self.format_messages(messages)
             
@@ -52,12 +56,16 @@ class OpenAIProvider(BaseLLMProvider):
             
             result = response.json()
             
-            return LLMResponse(
-                content=result["choices"][0]["message"]["content"],
+            message = result["choices"][0]["message"]
+            llm_response = LLMResponse(
+                content=message.get("content") or "",
                 model=result["model"],
+                tool_calls=self.parse_tool_calls(message),
                 usage=result.get("usage", {}),
                 metadata={"response_id": result.get("id"), "created": result.get("created")}
             )
+            await self._store_cached_response(cache_key, llm_response)
+            return llm_response
             
         except Exception as e:
             raise Exception(f"OpenAI API调用失败: {str(e)}")
@@ -0,0 +1,105 @@
+"""
+LLM分场景路由
+
+将不同的调用场景（规划、评估、总结、最终回复、记忆摘要）映射到
+各自配置的提供者和模型，使对延迟不敏感的阶段可以使用更便宜的模型。
+"""
+from typing import Dict, Any, Optional, Tuple
+from .base import BaseLLMProvider
+from .factory import LLMFactory
+
+
+class LLMRouter:
+    """LLM路由器"""
+
+    # 已知的调用场景
+    CALL_SITES = ("plan", "review", "summary", "final_answer", "memory_summary")
+
+    def __init__(self, llm_config):
+        """
+        初始化路由器
+
+        Args:
+            llm_config: LLMConfig配置对象
+        """
+        self.llm_config = llm_config
+        self.default_provider = llm_config.get_default_provider_name()
+        self.routes: Dict[str, Tuple[str, Optional[str]]] = {
+            call_site: self.parse_route(spec)
+            for call_site, spec in (llm_config.routes or {}).items()
+        }
+        self._providers: Dict[Tuple[str, Optional[str]], BaseLLMProvider] = {}
+
+    @staticmethod
+    def parse_route(spec: str) -> Tuple[str, Optional[str]]:
+        """
+        解析路由配置
+
+        Args:
+            spec: "provider" 或 "provider:model"
+
+        Returns:
+            (提供者名称, 模型名称或None)
+        """
+        provider, _, model = spec.strip().partition(":")
+        return provider.strip().lower(), (model.strip() or None)
+
+    def resolve(self, call_site: str) -> Tuple[str, Optional[str]]:
+        """获取调用场景对应的提供者和模型"""
+        return self.routes.get(call_site, (self.default_provider, None))
+
+    def get_provider(self, call_site: str) -> BaseLLMProvider:
+        """
+        获取调用场景对应的提供者实例
+
+        相同提供者和模型的场景共享同一个实例。
+        """
+        route = self.resolve(call_site)
+        provider = self._providers.get(route)
+        if provider is None:
+            provider_name, model = route
+            provider_config = self.llm_config.get_provider_config(provider_name, model)
+            if self.llm_config.hedge_providers:
+                provider = self._create_hedged_provider(provider_name, provider_config)
+            else:
+                provider = LLMFactory.create_provider(provider_name, provider_config)
+            self._providers[route] = provider
+        return provider
+
+    def _create_hedged_provider(self, provider_name: str, provider_config: Dict[str, Any]) -> BaseLLMProvider:
+        """以路由的提供者为主、配置的备用提供者为辅创建对冲提供者"""
+        providers = [{"provider": provider_name, "config": provider_config}]
+        for spec in self.llm_config.hedge_providers:
+            backup_name, backup_model = self.parse_route(spec)
+            backup_config = self.llm_config.get_provider_config(backup_name, backup_model)
+            if backup_name == provider_name and backup_config["model"] == provider_config["model"]:
+                continue
+            providers.append({"provider": backup_name, "config": backup_config})
+
+        return LLMFactory.create_provider("hedged", {
+            "providers": providers,
+            "model": provider_config["model"],
+            "temperature": self.llm_config.temperature,
+            "max_tokens": self.llm_config.max_tokens,
+            "timeout": self.llm_config.timeout,
+            "hedge_delay": self.llm_config.hedge_delay,
+            "hedge_percentile": self.llm_config.hedge_percentile,
+            "hedge_max_delay": self.llm_config.hedge_max_delay,
+            "failure_threshold": self.llm_config.hedge_failure_threshold,
+            "cooldown": self.llm_config.hedge_cooldown,
+        })
+
+    def set_default_provider(self, provider_name: str):
+        """切换默认提供者，未单独配置路由的场景随之切换"""
+        self.default_provider = provider_name.lower()
+
+    def get_routes(self) -> Dict[str, Any]:
+        """获取各调用场景的路由信息"""
+        routes = {}
+        for call_site in self.CALL_SITES:
+            provider_name, model = self.resolve(call_site)
+            routes[call_site] = {
+                "provider": provider_name,
+                "model": model or self.llm_config.get_provider_config(provider_name)["model"],
+            }
+        return routes
@@ -0,0 +1,56 @@
+"""
+本地token估算
+
+不依赖具体模型的分词器，按字符类别近似估算token数：
+中日韩字符约每字1个token，其余字符约每4个字符1个token。
+"""
+import json
+from typing import Any, List, Optional
+
+
+def _is_cjk(char: str) -> bool:
+    """是否为中日韩字符或全角符号"""
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF
+        or 0x3040 <= code <= 0x30FF
+        or 0xAC00 <= code <= 0xD7AF
+    )
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    估算文本的token数
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for char in text if _is_cjk(char))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_json_tokens(data: Any) -> int:
+    """估算数据以紧凑JSON序列化后的token数"""
+    return estimate_tokens(json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+def estimate_messages_tokens(messages: List[Any], system_prompt: Optional[str] = None) -> int:
+    """
+    估算消息列表的token数
+
+    每条消息额外计入约4个token的角色和格式开销。
+    """
+    total = estimate_tokens(system_prompt) + (4 if system_prompt else 0)
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        total += estimate_tokens(content or "") + 4
+    return total
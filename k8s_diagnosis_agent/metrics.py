@@ -0,0 +1,80 @@
+"""
+Prometheus指标
+
+指标在规划器、工具、LLM提供者和会话等核心模块中记录，Web服务通过 /metrics 暴露，
+命令行交互模式也可以用 metrics 命令输出同样的数据。队列深度、活跃会话数等状态量
+在采集时通过注册的回调读取。
+"""
+from typing import Callable, Dict
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+
+REGISTRY = CollectorRegistry(auto_describe=True)
+
+# 秒级延迟分桶，覆盖从毫秒级的API调用到分钟级的规划
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PLAN_PHASE_SECONDS = Histogram(
+    "k8s_agent_plan_phase_seconds", "规划器各阶段耗时",
+    ["phase"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+TOOL_SECONDS = Histogram(
+    "k8s_agent_tool_seconds", "工具执行耗时",
+    ["tool"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+TOOL_CALLS = Counter(
+    "k8s_agent_tool_calls_total", "工具调用次数",
+    ["tool", "status"], registry=REGISTRY
+)
+LLM_SECONDS = Histogram(
+    "k8s_agent_llm_request_seconds", "LLM请求耗时，流式请求为整个流的耗时",
+    ["provider", "operation"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+LLM_REQUESTS = Counter(
+    "k8s_agent_llm_requests_total", "LLM请求次数",
+    ["provider", "operation", "status"], registry=REGISTRY
+)
+LLM_TOKENS = Counter(
+    "k8s_agent_llm_tokens_total", "LLM消耗的token数",
+    ["provider", "kind"], registry=REGISTRY
+)
+APISERVER_SECONDS = Histogram(
+    "k8s_agent_apiserver_request_seconds", "Kubernetes API调用耗时",
+    ["method"], buckets=LATENCY_BUCKETS, registry=REGISTRY
+)
+APISERVER_REQUESTS = Counter(
+    "k8s_agent_apiserver_requests_total", "Kubernetes API调用次数",
+    ["method", "status"], registry=REGISTRY
+)
+CACHE_LOOKUPS = Counter(
+    "k8s_agent_cache_lookups_total", "缓存查询次数",
+    ["cache", "result"], registry=REGISTRY
+)
+QUEUE_DEPTH = Gauge(
+    "k8s_agent_queue_depth", "各队列中等待的数量",
+    ["queue"], registry=REGISTRY
+)
+ACTIVE_SESSIONS = Gauge(
+    "k8s_agent_active_sessions", "内存中的会话数",
+    registry=REGISTRY
+)
+
+# 采集前调用的状态回调，按名称注册，同名回调后注册的覆盖先注册的
+_collect_hooks: Dict[str, Callable[[], None]] = {}
+
+
+def register_collect_hook(name: str, hook: Callable[[], None]):
+    """注册采集前更新状态量的回调"""
+    _collect_hooks[name] = hook
+
+
+def render_metrics() -> bytes:
+    """更新状态量并以Prometheus文本格式输出所有指标"""
+    for hook in list(_collect_hooks.values()):
+        try:
+            hook()
+        except Exception:
+            # 单个回调失败不影响其他指标
+            pass
+    return generate_latest(REGISTRY)
+
@@ -21,7 +21,8 @@ from .system_tools import (
     FileSystemTool,
     ProcessTool,
 )
-from .registry import ToolRegistry
+from .registry import ToolRegistry, tool_registry
+from .retriever import ToolRetriever
 
 __all__ = [
     "BaseTool",
@@ -41,4 +42,6 @@ __all__ = [
     "FileSystemTool",
     "ProcessTool",
     "ToolRegistry",
+    "tool_registry",
+    "ToolRetriever",
 ] 
\ No newline at end of file
@@ -1,9 +1,14 @@
 """
 工具基础抽象类
 """
+import time
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
+from .delta import diff_data
+from ..metrics import TOOL_SECONDS, TOOL_CALLS
+from ..tracing import start_span
 
 
 class ToolStatus(Enum):
@@ -48,11 +53,25 @@ class ToolResult:
             "error": self.error,
             "metadata": self.metadata
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ToolResult":
+        """从 to_dict 的结果恢复"""
+        return cls(
+            status=ToolStatus(data["status"]),
+            data=data.get("data"),
+            message=data.get("message", ""),
+            error=data.get("error"),
+            metadata=data.get("metadata")
+        )
 
 
 class BaseTool(ABC):
     """工具基础抽象类"""
     
+    # 支持增量结果的列表字段及其对象标识字段，如 {"pods": ("namespace", "name")}
+    delta_keys: Dict[str, Tuple[str, ...]] = {}
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         """
         初始化工具
@@ -63,6 +82,8 @@ class BaseTool(ABC):
         self.config = config or {}
         self.name = self.__class__.__name__
         self.description = self.__doc__ or ""
+        # 在工具注册表中的名称，由注册表设置，用作指标标签
+        self.registered_name: Optional[str] = None
     
     @abstractmethod
     async def execute(self, **kwargs) -> ToolResult:
@@ -77,6 +98,28 @@ class BaseTool(ABC):
         """
         pass
     
+    async def run(self, **kwargs) -> ToolResult:
+        """
+        执行工具并记录耗时和结果状态指标
+        
+        调用方应使用本方法而不是直接调用 execute。
+        """
+        tool_name = self.registered_name or self.name
+        status = "exception"
+        started = time.perf_counter()
+        try:
+            with start_span("tool.execute", tool=tool_name) as span:
+                result = await self.execute(**kwargs)
+                status = result.status.value
+                span.set_attribute("tool.status", status)
+                return result
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            TOOL_SECONDS.labels(tool_name).observe(time.perf_counter() - started)
+            TOOL_CALLS.labels(tool_name, status).inc()
+    
     @abstractmethod
     def get_schema(self) -> Dict[str, Any]:
         """
@@ -115,6 +158,30 @@ class BaseTool(ABC):
         """更新工具配置"""
         self.config.update(config)
     
+    def diff_result(self, since_result: ToolResult, result: ToolResult, since_seconds: float = 0) -> ToolResult:
+        """
+        与上次结果对比，返回附带增量数据的结果副本
+        
+        增量放在 metadata["delta"] 中，data 仍为完整数据；不支持增量或增量不更小时返回原结果。
+        
+        Args:
+            since_result: 同参数的上次结果
+            result: 本次结果
+            since_seconds: 距上次结果的秒数
+        """
+        if not result.is_success() or not since_result.is_success():
+            return result
+        delta = diff_data(since_result.data, result.data, self.delta_keys)
+        if delta is None:
+            return result
+        return ToolResult(
+            status=result.status,
+            data=result.data,
+            message=result.message,
+            error=result.error,
+            metadata={**result.metadata, "delta": delta, "delta_since_seconds": round(since_seconds, 1)}
+        )
+    
     async def __aenter__(self):
         """异步上下文管理器入口"""
         return self
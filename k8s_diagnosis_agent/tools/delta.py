@@ -0,0 +1,100 @@
+"""
+工具结果增量对比
+
+同一会话中再次调用同一工具时，把新结果与上次结果按对象标识对比，
+只保留新增、删除和变化的对象以及未变化对象的数量，供模型直接看到变化。
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from ..llm.tokens import estimate_json_tokens
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, Any]:
+    """把嵌套字典展开为点分隔的路径，列表整体作为一个值比较"""
+    if not isinstance(value, dict):
+        return {prefix: value}
+    flat: Dict[str, Any] = {}
+    for key, child in value.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(child, dict) and child:
+            flat.update(_flatten(child, path))
+        else:
+            flat[path] = child
+    return flat
+
+
+def _object_id(obj: Dict[str, Any], key_fields: Tuple[str, ...]) -> str:
+    """根据标识字段生成对象ID"""
+    return "/".join(str(obj.get(field, "")) for field in key_fields)
+
+
+def diff_objects(
+    previous: List[Dict[str, Any]],
+    current: List[Dict[str, Any]],
+    key_fields: Tuple[str, ...]
+) -> Dict[str, Any]:
+    """
+    按标识字段对比两个对象列表
+
+    Returns:
+        {"added": 新增对象, "removed": 删除的对象ID, "changed": 变化的字段, "unchanged_count": 未变化数量}
+    """
+    previous_by_id = {_object_id(obj, key_fields): obj for obj in previous if isinstance(obj, dict)}
+    added = []
+    changed = []
+    unchanged = 0
+    seen = set()
+    for obj in current:
+        if not isinstance(obj, dict):
+            continue
+        object_id = _object_id(obj, key_fields)
+        seen.add(object_id)
+        old = previous_by_id.get(object_id)
+        if old is None:
+            added.append(obj)
+            continue
+
+        old_flat, new_flat = _flatten(old), _flatten(obj)
+        changes = {
+            path: [old_flat.get(path), new_flat.get(path)]
+            for path in list(old_flat) + [p for p in new_flat if p not in old_flat]
+            if old_flat.get(path) != new_flat.get(path)
+        }
+        if changes:
+            changed.append({"id": object_id, "changes": changes})
+        else:
+            unchanged += 1
+
+    removed = [object_id for object_id in previous_by_id if object_id not in seen]
+    return {"added": added, "removed": removed, "changed": changed, "unchanged_count": unchanged}
+
+
+def diff_data(
+    previous: Any,
+    current: Any,
+    delta_keys: Dict[str, Tuple[str, ...]]
+) -> Optional[Dict[str, Any]]:
+    """
+    对比两次工具结果数据
+
+    Args:
+        previous: 上次的 ToolResult.data
+        current: 本次的 ToolResult.data
+        delta_keys: 列表字段 -> 对象标识字段
+
+    Returns:
+        增量数据；结构不支持对比或增量不比完整数据更小时返回None
+    """
+    if not isinstance(previous, dict) or not isinstance(current, dict) or not delta_keys:
+        return None
+
+    delta: Dict[str, Any] = {}
+    for field, value in current.items():
+        key_fields = delta_keys.get(field)
+        if key_fields and isinstance(value, list) and isinstance(previous.get(field), list):
+            delta[field] = diff_objects(previous[field], value, key_fields)
+        elif previous.get(field) != value:
+            delta[field] = value
+
+    if estimate_json_tokens(delta) >= estimate_json_tokens(current):
+        return None
+    return delta
@@ -1,15 +1,18 @@
 """
 Kubernetes诊断工具集合
 """
+import time
 import asyncio
 import json
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, TYPE_CHECKING
 from datetime import datetime, timedelta
-from kubernetes import client, config
-from kubernetes.client import CoreV1Api
-from kubernetes.client.rest import ApiException
 
 from .base import BaseTool, ToolResult, ToolStatus
+from ..metrics import APISERVER_SECONDS, APISERVER_REQUESTS
+from ..tracing import start_span
+
+if TYPE_CHECKING:
+    from kubernetes.client import CoreV1Api
 
 
 class KubernetesBaseTool(BaseTool):
@@ -18,36 +21,73 @@ class KubernetesBaseTool(BaseTool):
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__(config)
         self.k8s_client = None
-        self.v1: CoreV1Api = None  # type: ignore
+        self.v1: "CoreV1Api" = None  # type: ignore
         self.apps_v1 = None
         self.networking_v1 = None
         self.metrics_v1beta1 = None
+        self.version_api = None
+        # 客户端每个实例只初始化一次，并发调用通过锁等待同一次初始化
+        self._client_ready = False
+        self._client_lock: Optional[asyncio.Lock] = None
         
     async def _init_k8s_client(self):
-        """初始化k8s客户端"""
-        try:
-            if self.config.get('use_in_cluster_config'):
-                config.load_incluster_config()
-            else:
-                kubeconfig_path = self.config.get('kubeconfig_path')
-                if kubeconfig_path:
-                    config.load_kube_config(config_file=kubeconfig_path)
-                else:
-                    config.load_kube_config()
-            
-            self.v1 = client.CoreV1Api()
-            self.apps_v1 = client.AppsV1Api()
-            self.networking_v1 = client.NetworkingV1Api()
-            
-            # 尝试初始化metrics API（可能不可用）
+        """初始化k8s客户端，已初始化时直接返回"""
+        if self._client_ready:
+            return
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        async with self._client_lock:
+            if self._client_ready:
+                return
             try:
-                from kubernetes import client as k8s_client
-                self.metrics_v1beta1 = k8s_client.CustomObjectsApi()
-            except ImportError:
-                pass
-                
+                # 读取kubeconfig是阻塞的文件操作，在线程中执行
+                clients = await asyncio.to_thread(self._create_clients)
+            except Exception as e:
+                raise Exception(f"无法初始化Kubernetes客户端: {str(e)}")
+            self.v1 = clients["v1"]
+            self.apps_v1 = clients["apps_v1"]
+            self.networking_v1 = clients["networking_v1"]
+            self.version_api = clients["version_api"]
+            self.metrics_v1beta1 = clients.get("metrics_v1beta1")
+            self._client_ready = True
+    
+    def _create_clients(self) -> Dict[str, Any]:
+        """加载集群配置并创建各API客户端"""
+        # kubernetes客户端导入较慢，推迟到首次调用工具时
+        from kubernetes import client, config
+        if self.config.get('use_in_cluster_config'):
+            config.load_incluster_config()
+        else:
+            kubeconfig_path = self.config.get('kubeconfig_path')
+            if kubeconfig_path:
+                config.load_kube_config(config_file=kubeconfig_path)
+            else:
+                config.load_kube_config()
+        
+        return {
+            "v1": client.CoreV1Api(),
+            "apps_v1": client.AppsV1Api(),
+            "networking_v1": client.NetworkingV1Api(),
+            "version_api": client.VersionApi(),
+            # metrics API通过自定义对象访问（集群中可能未安装metrics-server）
+            "metrics_v1beta1": client.CustomObjectsApi(),
+        }
+    
+    async def _call_api(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在线程中调用Kubernetes API，并记录按方法名统计的调用次数和耗时"""
+        method = getattr(func, "__name__", "unknown")
+        status = "success"
+        started = time.perf_counter()
+        try:
+            with start_span("k8s.api", method=method):
+                return await asyncio.to_thread(func, *args, **kwargs)
         except Exception as e:
-            raise Exception(f"无法初始化Kubernetes客户端: {str(e)}")
+            # ApiException带HTTP状态码，其余异常统一记为error
+            status = str(getattr(e, "status", None) or "error")
+            raise
+        finally:
+            APISERVER_SECONDS.labels(method).observe(time.perf_counter() - started)
+            APISERVER_REQUESTS.labels(method, status).inc()
 
 
 class KubernetesClusterInfoTool(KubernetesBaseTool):
@@ -63,13 +103,13 @@ class KubernetesClusterInfoTool(KubernetesBaseTool):
             await self._init_k8s_client()
             
             # 获取集群版本
-            version_info = await asyncio.to_thread(lambda: client.VersionApi().get_code())
+            version_info = await self._call_api(self.version_api.get_code)
             
             # 获取节点信息
-            nodes = await asyncio.to_thread(lambda: self.v1.list_node())
+            nodes = await self._call_api(self.v1.list_node)
             
             # 获取命名空间
-            namespaces = await asyncio.to_thread(lambda: self.v1.list_namespace())
+            namespaces = await self._call_api(self.v1.list_namespace)
             
             cluster_info = {
                 "version": {
@@ -141,6 +181,8 @@ class KubernetesClusterInfoTool(KubernetesBaseTool):
 class KubernetesNodeInfoTool(KubernetesBaseTool):
     """获取节点信息工具"""
     
+    delta_keys = {"nodes": ("name",)}
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__(config)
         self.description = "获取Kubernetes节点详细信息"
@@ -154,11 +196,11 @@ class KubernetesNodeInfoTool(KubernetesBaseTool):
             
             if node_name:
                 # 获取特定节点
-                node = await asyncio.to_thread(self.v1.read_node, node_name)
+                node = await self._call_api(self.v1.read_node, node_name)
                 nodes_data = [self._format_node_info(node)]
             else:
                 # 获取所有节点
-                nodes = await asyncio.to_thread(self.v1.list_node)
+                nodes = await self._call_api(self.v1.list_node)
                 nodes_data = [self._format_node_info(node) for node in nodes.items]
             
             return ToolResult(
@@ -229,6 +271,8 @@ class KubernetesNodeInfoTool(KubernetesBaseTool):
 class KubernetesPodInfoTool(KubernetesBaseTool):
     """获取Pod信息工具"""
     
+    delta_keys = {"pods": ("namespace", "name")}
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__(config)
         self.description = "获取Pod详细信息"
@@ -244,11 +288,11 @@ class KubernetesPodInfoTool(KubernetesBaseTool):
             
             if pod_name:
                 # 获取特定Pod
-                pod = await asyncio.to_thread(self.v1.read_namespaced_pod, pod_name, namespace)
+                pod = await self._call_api(self.v1.read_namespaced_pod, pod_name, namespace)
                 pods_data = [self._format_pod_info(pod)]
             else:
                 # 获取多个Pod
-                pods = await asyncio.to_thread(
+                pods = await self._call_api(
                     self.v1.list_namespaced_pod,
                     namespace,
                     label_selector=label_selector
@@ -339,6 +383,8 @@ class KubernetesPodInfoTool(KubernetesBaseTool):
 class KubernetesEventsTool(KubernetesBaseTool):
     """获取事件信息工具"""
     
+    delta_keys = {"events": ("namespace", "name")}
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__(config)
         self.description = "获取Kubernetes事件信息"
@@ -351,7 +397,7 @@ class KubernetesEventsTool(KubernetesBaseTool):
             namespace = kwargs.get('namespace', 'default')
             field_selector = kwargs.get('field_selector')
             
-            events = await asyncio.to_thread(
+            events = await self._call_api(
                 self.v1.list_namespaced_event,
                 namespace,
                 field_selector=field_selector
@@ -439,7 +485,7 @@ class KubernetesLogsTool(KubernetesBaseTool):
                     message="获取日志失败"
                 )
             
-            logs = await asyncio.to_thread(
+            logs = await self._call_api(
                 self.v1.read_namespaced_pod_log,
                 pod_name,
                 namespace,
@@ -509,6 +555,8 @@ class KubernetesLogsTool(KubernetesBaseTool):
 class KubernetesServiceInfoTool(KubernetesBaseTool):
     """获取服务信息工具"""
     
+    delta_keys = {"services": ("namespace", "name")}
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__(config)
         self.description = "获取Kubernetes服务信息"
@@ -522,10 +570,10 @@ class KubernetesServiceInfoTool(KubernetesBaseTool):
             service_name = kwargs.get('service_name')
             
             if service_name:
-                service = await asyncio.to_thread(self.v1.read_namespaced_service, service_name, namespace)
+                service = await self._call_api(self.v1.read_namespaced_service, service_name, namespace)
                 services_data = [self._format_service_info(service)]
             else:
-                services = await asyncio.to_thread(self.v1.list_namespaced_service, namespace)
+                services = await self._call_api(self.v1.list_namespaced_service, namespace)
                 services_data = [self._format_service_info(svc) for svc in services.items]
             
             return ToolResult(
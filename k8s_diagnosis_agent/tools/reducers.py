@@ -0,0 +1,356 @@
+"""
+工具结果归约器
+
+在工具结果进入LLM上下文之前，按工具的数据结构把大体量结果归约为
+统计信息加异常明细，并控制在配置的token预算内。完整数据通过引用保留。
+"""
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from .base import ToolResult
+from ..llm.tokens import estimate_json_tokens, estimate_tokens
+
+
+class BaseReducer:
+    """工具结果归约器基类"""
+
+    def __init__(self, token_budget: int = 2000):
+        """
+        初始化归约器
+
+        Args:
+            token_budget: 归约结果的token预算
+        """
+        self.token_budget = token_budget
+
+    def reduce(self, data: Any) -> Any:
+        """
+        归约工具结果数据
+
+        Args:
+            data: ToolResult.data
+
+        Returns:
+            归约后的数据
+        """
+        return data
+
+    def fit_budget(self, data: Any) -> Tuple[Any, bool]:
+        """
+        将数据压缩到token预算内
+
+        反复把体积最大的列表减半并记录省略数量，仍超出预算时截断为预览文本。
+
+        Returns:
+            (压缩后的数据, 是否发生了截断)
+        """
+        truncated = False
+        while estimate_json_tokens(data) > self.token_budget:
+            target = self._find_largest_list(data)
+            if target is None:
+                break
+            container, key = target
+            items = container[key]
+            keep = len(items) // 2
+            container[key] = items[:keep]
+            omitted_key = f"{key}_omitted" if isinstance(key, str) else "omitted"
+            container[omitted_key] = container.get(omitted_key, 0) + len(items) - keep
+            truncated = True
+
+        if estimate_json_tokens(data) > self.token_budget:
+            preview = json.dumps(data, ensure_ascii=False, default=str)
+            # 按估算比例截取，保留预算内的前缀
+            ratio = self.token_budget / max(estimate_tokens(preview), 1)
+            data = {"preview": preview[:int(len(preview) * ratio)], "truncated": True}
+            truncated = True
+
+        return data, truncated
+
+    def _find_largest_list(self, data: Any) -> Optional[Tuple[Dict[str, Any], str]]:
+        """查找序列化后体积最大且可继续缩减的列表"""
+        best: Optional[Tuple[Dict[str, Any], str]] = None
+        best_size = 0
+
+        def walk(node: Any):
+            nonlocal best, best_size
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if isinstance(value, list) and value:
+                        size = len(json.dumps(value, ensure_ascii=False, default=str))
+                        if size > best_size:
+                            best, best_size = (node, key), size
+                    walk(value)
+            elif isinstance(node, list):
+                for item in node:
+                    walk(item)
+
+        walk(data)
+        return best
+
+
+class PodResultReducer(BaseReducer):
+    """Pod列表归约：按阶段计数，只保留异常Pod的完整信息"""
+
+    HEALTHY_SAMPLE_SIZE = 20
+
+    @staticmethod
+    def is_unhealthy(pod: Dict[str, Any]) -> bool:
+        """判断Pod是否异常"""
+        phase = pod.get("phase")
+        if phase == "Succeeded":
+            return False
+        if phase != "Running":
+            return True
+        ready = (pod.get("conditions") or {}).get("Ready", {})
+        return ready.get("status") not in (None, "True")
+
+    def reduce(self, data: Any) -> Any:
+        if not isinstance(data, dict) or not isinstance(data.get("pods"), list):
+            return data
+
+        pods = data["pods"]
+        by_phase: Dict[str, int] = {}
+        unhealthy = []
+        healthy_names = []
+        for pod in pods:
+            phase = pod.get("phase") or "Unknown"
+            by_phase[phase] = by_phase.get(phase, 0) + 1
+            if self.is_unhealthy(pod):
+                detail = {k: v for k, v in pod.items() if k != "annotations"}
+                unhealthy.append(detail)
+            else:
+                healthy_names.append(pod.get("name"))
+
+        return {
+            "total": len(pods),
+            "by_phase": by_phase,
+            "unhealthy_count": len(unhealthy),
+            "unhealthy": unhealthy,
+            "healthy_sample": healthy_names[:self.HEALTHY_SAMPLE_SIZE],
+            "healthy_omitted": max(0, len(healthy_names) - self.HEALTHY_SAMPLE_SIZE),
+        }
+
+
+class NodeResultReducer(BaseReducer):
+    """节点列表归约：条件直方图加异常节点明细"""
+
+    PRESSURE_CONDITIONS = ("MemoryPressure", "DiskPressure", "PIDPressure", "NetworkUnavailable")
+
+    def _abnormal_conditions(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        """获取节点的异常条件"""
+        conditions = (node.get("status") or {}).get("conditions") or {}
+        abnormal = {}
+        for condition_type, condition in conditions.items():
+            status = condition.get("status")
+            if condition_type == "Ready" and status != "True":
+                abnormal[condition_type] = condition
+            elif condition_type in self.PRESSURE_CONDITIONS and status == "True":
+                abnormal[condition_type] = condition
+        return abnormal
+
+    def reduce(self, data: Any) -> Any:
+        if not isinstance(data, dict) or not isinstance(data.get("nodes"), list):
+            return data
+
+        nodes = data["nodes"]
+        histogram: Dict[str, Dict[str, int]] = {}
+        kubelet_versions: Dict[str, int] = {}
+        outliers = []
+        for node in nodes:
+            status = node.get("status") or {}
+            for condition_type, condition in (status.get("conditions") or {}).items():
+                counts = histogram.setdefault(condition_type, {})
+                value = str(condition.get("status"))
+                counts[value] = counts.get(value, 0) + 1
+
+            version = (status.get("node_info") or {}).get("kubelet_version") or "unknown"
+            kubelet_versions[version] = kubelet_versions.get(version, 0) + 1
+
+            abnormal = self._abnormal_conditions(node)
+            if abnormal:
+                outliers.append({
+                    "name": node.get("name"),
+                    "abnormal_conditions": abnormal,
+                    "node_info": status.get("node_info"),
+                    "capacity": status.get("capacity"),
+                    "allocatable": status.get("allocatable"),
+                })
+
+        return {
+            "total": len(nodes),
+            "condition_histogram": histogram,
+            "kubelet_versions": kubelet_versions,
+            "outlier_count": len(outliers),
+            "outliers": outliers,
+        }
+
+
+class EventResultReducer(BaseReducer):
+    """事件列表归约：按类型计数，Warning事件按原因和对象类型聚合"""
+
+    MAX_OBJECTS_PER_GROUP = 5
+
+    def reduce(self, data: Any) -> Any:
+        if not isinstance(data, dict) or not isinstance(data.get("events"), list):
+            return data
+
+        events = data["events"]
+        by_type: Dict[str, int] = {}
+        normal_reasons: Dict[str, int] = {}
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for event in events:
+            event_type = event.get("type") or "Unknown"
+            by_type[event_type] = by_type.get(event_type, 0) + 1
+            reason = event.get("reason") or "Unknown"
+            if event_type == "Normal":
+                normal_reasons[reason] = normal_reasons.get(reason, 0) + 1
+                continue
+
+            involved = event.get("involved_object") or {}
+            key = (reason, involved.get("kind") or "")
+            group = groups.setdefault(key, {
+                "reason": reason,
+                "kind": involved.get("kind"),
+                "count": 0,
+                "objects": [],
+                "last_timestamp": None,
+                "message": event.get("message"),
+            })
+            group["count"] += event.get("count") or 1
+            if involved.get("name") and involved["name"] not in group["objects"]:
+                if len(group["objects"]) < self.MAX_OBJECTS_PER_GROUP:
+                    group["objects"].append(involved["name"])
+            timestamp = event.get("last_timestamp")
+            if timestamp and (group["last_timestamp"] is None or timestamp > group["last_timestamp"]):
+                group["last_timestamp"] = timestamp
+                group["message"] = event.get("message")
+
+        warnings = sorted(groups.values(), key=lambda g: g["count"], reverse=True)
+        return {
+            "total": len(events),
+            "by_type": by_type,
+            "warnings": warnings,
+            "normal_reasons": normal_reasons,
+        }
+
+
+class LogResultReducer(BaseReducer):
+    """日志归约：保留错误行和预算内的末尾日志"""
+
+    ERROR_KEYWORDS = ("error", "exception", "fatal", "panic", "traceback", "failed")
+    MAX_ERROR_LINES = 20
+
+    def reduce(self, data: Any) -> Any:
+        if not isinstance(data, dict) or not isinstance(data.get("logs"), str):
+            return data
+
+        lines = data["logs"].splitlines()
+        error_lines = [
+            line for line in lines
+            if any(keyword in line.lower() for keyword in self.ERROR_KEYWORDS)
+        ][-self.MAX_ERROR_LINES:]
+
+        # 末尾日志占用剩余预算的大部分
+        remaining = max(self.token_budget - estimate_json_tokens(error_lines) - 100, 0)
+        tail: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            cost = estimate_tokens(line) + 1
+            if used + cost > remaining:
+                break
+            tail.append(line)
+            used += cost
+        tail.reverse()
+
+        return {
+            **{k: v for k, v in data.items() if k != "logs"},
+            "line_count": len(lines),
+            "error_line_count": len(error_lines),
+            "error_lines": error_lines,
+            "tail": tail,
+            "tail_omitted": len(lines) - len(tail),
+        }
+
+
+class ResultReducerRegistry:
+    """工具结果归约器注册表"""
+
+    def __init__(self, default_budget: int = 2000, budgets: Optional[Dict[str, int]] = None):
+        """
+        初始化注册表
+
+        Args:
+            default_budget: 默认token预算
+            budgets: 按工具名覆盖的token预算
+        """
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+        self._reducers: Dict[str, BaseReducer] = {}
+        self._register_default_reducers()
+
+    def _register_default_reducers(self):
+        """注册默认归约器"""
+        self.register("k8s_pod_info", PodResultReducer)
+        self.register("k8s_node_info", NodeResultReducer)
+        self.register("k8s_events", EventResultReducer)
+        self.register("k8s_logs", LogResultReducer)
+
+    def register(self, tool_name: str, reducer_class: type):
+        """为工具注册归约器"""
+        budget = self.budgets.get(tool_name, self.default_budget)
+        self._reducers[tool_name] = reducer_class(budget)
+
+    def get_reducer(self, tool_name: str) -> BaseReducer:
+        """获取工具的归约器，未注册时使用只做预算控制的默认归约器"""
+        reducer = self._reducers.get(tool_name)
+        if reducer is None:
+            reducer = BaseReducer(self.budgets.get(tool_name, self.default_budget))
+        return reducer
+
+    def reduce_data(self, tool_name: str, data: Any) -> Tuple[Any, int, bool]:
+        """
+        归约工具结果数据，未超出预算时原样返回
+
+        Returns:
+            (归约后的数据, 原始token数, 是否发生了归约)
+        """
+        reducer = self.get_reducer(tool_name)
+        original_tokens = estimate_json_tokens(data)
+        if data is None or original_tokens <= reducer.token_budget:
+            return data, original_tokens, False
+
+        # 归约器可能原地修改数据，先复制一份避免影响完整结果
+        reduced = reducer.reduce(json.loads(json.dumps(data, default=str)))
+        reduced, _ = reducer.fit_budget(reduced)
+        return reduced, original_tokens, True
+
+    def reduce(self, tool_name: str, result: ToolResult, ref: Optional[str] = None) -> Dict[str, Any]:
+        """
+        归约工具结果
+
+        Args:
+            tool_name: 工具注册名
+            result: 工具结果
+            ref: 完整结果的引用标识
+
+        Returns:
+            可直接放入提示词的归约结果
+        """
+        # 带增量的结果只向模型发送增量
+        delta = result.metadata.get("delta")
+        data, original_tokens, reduced = self.reduce_data(tool_name, result.data if delta is None else delta)
+        output = {
+            "tool": tool_name,
+            "status": result.status.value,
+            "message": result.message,
+            "data": data,
+        }
+        if delta is not None:
+            output["delta_since_seconds"] = result.metadata.get("delta_since_seconds")
+        if result.error:
+            output["error"] = result.error
+        if reduced:
+            output["reduced"] = True
+            output["original_tokens"] = original_tokens
+            if ref:
+                output["full_result_ref"] = ref
+        return output
@@ -1,6 +1,7 @@
 """
 工具注册表
 """
+import json
 from typing import Dict, List, Optional, Type, Any
 from .base import BaseTool
 from .k8s_tools import (
@@ -28,7 +29,14 @@ class ToolRegistry:
     
     def __init__(self):
         self._tools: Dict[str, Type[BaseTool]] = {}
-        self._tool_instances: Dict[str, BaseTool] = {}
+        # 工具名 -> 配置的序列化结果 -> 实例，相同配置的调用共享已初始化的客户端
+        self._tool_instances: Dict[str, Dict[str, BaseTool]] = {}
+        # 首次使用时缓存的schema及其序列化结果
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._function_schemas: Dict[str, Dict[str, Any]] = {}
+        self._function_schema_json: Dict[str, str] = {}
+        self._function_names: Dict[str, str] = {}
+        self.version = 0
         self._register_default_tools()
     
     def _register_default_tools(self):
@@ -52,29 +60,62 @@ class ToolRegistry:
         self.register("process", ProcessTool)
     
     def register(self, name: str, tool_class: Type[BaseTool]):
-        """注册工具"""
+        """注册工具，schema在首次使用时生成并缓存，注册时不创建工具实例"""
+        self.unregister(name)
         self._tools[name] = tool_class
+        self.version += 1
     
     def unregister(self, name: str):
         """取消注册工具"""
         if name in self._tools:
             del self._tools[name]
-        if name in self._tool_instances:
-            del self._tool_instances[name]
+            self.version += 1
+        self._tool_instances.pop(name, None)
+        schema = self._schemas.pop(name, None)
+        if schema is not None:
+            self._function_names.pop(schema.get("function", {}).get("name", name), None)
+        self._function_schemas.pop(name, None)
+        self._function_schema_json.pop(name, None)
+    
+    def _load_schema(self, name: str):
+        """生成并缓存工具的schema及其序列化结果，复用已有的工具实例"""
+        if name in self._schemas:
+            return
+        schema = self.get_tool(name).get_schema()
+        function = {**schema.get("function", {}), "name": name}
+        function_schema = {**schema, "function": function}
+        self._schemas[name] = schema
+        self._function_schemas[name] = function_schema
+        self._function_schema_json[name] = json.dumps(function_schema, ensure_ascii=False, separators=(",", ":"))
+        self._function_names[schema.get("function", {}).get("name", name)] = name
+    
+    def _schema_names(self, names: Optional[List[str]]) -> List[str]:
+        """确定要返回schema的工具并确保其schema已缓存"""
+        names = list(names if names is not None else self._tools.keys())
+        for name in names:
+            self._load_schema(name)
+        return names
     
     def get_tool(self, name: str, config: Optional[Dict[str, Any]] = None) -> BaseTool:
-        """获取工具实例"""
+        """获取工具实例，相同配置返回同一个实例，未指定配置时复用最近创建的实例"""
         if name not in self._tools:
             raise ValueError(f"工具 '{name}' 未注册")
         
-        # 如果已有实例且配置相同，返回现有实例
-        if name in self._tool_instances and not config:
-            return self._tool_instances[name]
+        instances = self._tool_instances.setdefault(name, {})
+        if not config:
+            if instances:
+                return next(reversed(instances.values()))
+            key = ""
+        else:
+            key = json.dumps(config, sort_keys=True, default=str)
+            if key in instances:
+                return instances[key]
         
         # 创建新实例
         tool_class = self._tools[name]
         tool_instance = tool_class(config)
-        self._tool_instances[name] = tool_instance
+        tool_instance.registered_name = name
+        instances[key] = tool_instance
         
         return tool_instance
     
@@ -90,14 +131,45 @@ class ToolRegistry:
         """获取系统相关工具"""
         return [name for name in self._tools.keys() if not name.startswith("k8s_")]
     
-    def get_tool_schemas(self) -> List[Dict[str, Any]]:
-        """获取所有工具的schema"""
-        schemas = []
-        for name in self._tools.keys():
-            tool = self.get_tool(name)
-            schema = tool.get_schema()
-            schemas.append(schema)
-        return schemas
+    def get_tool_schemas(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        获取工具的schema
+        
+        Args:
+            names: 只返回指定工具的schema，默认返回全部
+        """
+        return [self._schemas[name] for name in self._schema_names(names)]
+    
+    def get_function_schemas(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        获取用于原生函数调用的工具schema
+        
+        函数名替换为注册名，使模型返回的工具调用可以直接映射到工具。
+        
+        Args:
+            names: 只返回指定工具的schema，默认返回全部
+        """
+        return [self._function_schemas[name] for name in self._schema_names(names)]
+    
+    def get_function_schemas_json(self, names: Optional[List[str]] = None) -> str:
+        """获取注册时已序列化的函数调用schema，每行一个工具"""
+        return "\n".join(self._function_schema_json[name] for name in self._schema_names(names))
+    
+    def resolve_tool_name(self, name: str) -> str:
+        """
+        将工具注册名或schema中的函数名解析为注册名
+        
+        Raises:
+            ValueError: 找不到对应的工具
+        """
+        if name in self._tools:
+            return name
+        if name not in self._function_names:
+            # 函数名来自schema，需先生成所有工具的schema
+            self._schema_names(None)
+        if name in self._function_names:
+            return self._function_names[name]
+        raise ValueError(f"工具 '{name}' 未注册")
     
     def get_tool_info(self, name: str) -> Dict[str, Any]:
         """获取工具信息"""
@@ -105,10 +177,11 @@ class ToolRegistry:
             raise ValueError(f"工具 '{name}' 未注册")
         
         tool = self.get_tool(name)
+        self._load_schema(name)
         return {
             "name": name,
             "description": tool.get_description(),
-            "schema": tool.get_schema(),
+            "schema": self._schemas[name],
             "class": tool.__class__.__name__
         }
     
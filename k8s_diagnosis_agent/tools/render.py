@@ -0,0 +1,204 @@
+"""
+工具结果的紧凑文本渲染
+
+把工具结果渲染为适合放入提示词的紧凑文本：
+- 同构的字典列表渲染为带列头的表格（"|" 分隔），每行不再重复键名
+- 丢弃 null 和空值字段，所有行取值相同的列提取为共同值
+- 重复出现的长字符串（镜像名、节点名等）做字典编码，在开头给出对照表
+"""
+import json
+from typing import Dict, Any, List, Optional
+
+
+# 字典编码的值前缀
+CODE_PREFIX = "$"
+
+
+def _is_empty(value: Any) -> bool:
+    """是否为应丢弃的空值"""
+    return value is None or value == "" or value == [] or value == {}
+
+
+class CompactRenderer:
+    """紧凑文本渲染器"""
+
+    def __init__(self, min_repeat_length: int = 8, min_repeats: int = 2, indent: str = "  "):
+        """
+        初始化渲染器
+
+        Args:
+            min_repeat_length: 参与字典编码的字符串最小长度
+            min_repeats: 参与字典编码的字符串最少出现次数
+            indent: 嵌套缩进
+        """
+        self.min_repeat_length = min_repeat_length
+        self.min_repeats = min_repeats
+        self.indent = indent
+        self._codes: Dict[str, str] = {}
+
+    def render(self, data: Any) -> str:
+        """
+        渲染数据
+
+        Args:
+            data: 任意可JSON序列化的数据
+
+        Returns:
+            紧凑文本
+        """
+        self._codes = self._build_dictionary(data)
+        lines: List[str] = []
+        if self._codes:
+            lines.append("字典:")
+            lines.extend(f"{self.indent}{code}={value}" for value, code in self._codes.items())
+        lines.extend(self._render_value(data, 0))
+        return "\n".join(lines)
+
+    def _build_dictionary(self, data: Any) -> Dict[str, str]:
+        """统计重复出现的长字符串并分配编码，出现越多的编码越短"""
+        counts: Dict[str, int] = {}
+
+        def walk(node: Any):
+            if isinstance(node, dict):
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for item in node:
+                    walk(item)
+            elif isinstance(node, str) and len(node) >= self.min_repeat_length and "\n" not in node:
+                counts[node] = counts.get(node, 0) + 1
+
+        walk(data)
+        repeated = [value for value, count in counts.items() if count >= self.min_repeats]
+        repeated.sort(key=lambda value: counts[value], reverse=True)
+        return {value: f"{CODE_PREFIX}{index}" for index, value in enumerate(repeated, 1)}
+
+    def _scalar(self, value: Any) -> str:
+        """渲染标量值"""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, str):
+            return self._codes.get(value, value)
+        if isinstance(value, (int, float)):
+            return str(value)
+        return str(value)
+
+    def _render_value(self, value: Any, depth: int, key: Optional[str] = None) -> List[str]:
+        """渲染任意值，返回文本行"""
+        pad = self.indent * depth
+        label = f"{key}" if key is not None else ""
+
+        if isinstance(value, dict):
+            items = [(k, v) for k, v in value.items() if not _is_empty(v)]
+            lines = [f"{pad}{label}:"] if key is not None else []
+            child_depth = depth + 1 if key is not None else depth
+            for child_key, child_value in items:
+                lines.extend(self._render_value(child_value, child_depth, str(child_key)))
+            return lines
+
+        if isinstance(value, list):
+            items = [item for item in value if not _is_empty(item)]
+            if len(items) >= 2 and all(isinstance(item, dict) for item in items):
+                header = f"{pad}{label}[{len(items)}]:" if key is not None else f"{pad}[{len(items)}]:"
+                table_depth = depth + 1
+                return [header] + self._render_table(items, table_depth)
+            if all(not isinstance(item, (dict, list)) for item in items) and self._is_inline(items):
+                text = ", ".join(self._scalar(item) for item in items)
+                return [f"{pad}{label}: {text}"] if key is not None else [f"{pad}{text}"]
+
+            lines = [f"{pad}{label}:"] if key is not None else []
+            child_pad = self.indent * (depth + 1 if key is not None else depth)
+            for item in items:
+                if isinstance(item, (dict, list)):
+                    rendered = self._render_value(item, depth + 2 if key is not None else depth + 1)
+                    lines.append(f"{child_pad}-")
+                    lines.extend(rendered)
+                else:
+                    lines.extend(f"{child_pad}- {line}" for line in self._scalar(item).splitlines() or [""])
+            return lines
+
+        text = self._scalar(value)
+        if "\n" in text:
+            lines = [f"{pad}{label}: |" if key is not None else f"{pad}|"]
+            lines.extend(f"{pad}{self.indent}{line}" for line in text.splitlines())
+            return lines
+        return [f"{pad}{label}: {text}"] if key is not None else [f"{pad}{text}"]
+
+    def _is_inline(self, items: List[Any]) -> bool:
+        """标量列表能否在一行内以逗号分隔渲染"""
+        for item in items:
+            text = self._scalar(item)
+            if len(text) > 40 or "\n" in text or "," in text:
+                return False
+        return True
+
+    def _flatten(self, row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+        """把嵌套字典展开为点分隔的列"""
+        flat: Dict[str, Any] = {}
+        for key, value in row.items():
+            column = f"{prefix}{key}"
+            if isinstance(value, dict) and value:
+                flat.update(self._flatten(value, f"{column}."))
+            else:
+                flat[column] = value
+        return flat
+
+    def _cell(self, value: Any) -> str:
+        """渲染表格单元格"""
+        if _is_empty(value):
+            return ""
+        if isinstance(value, list):
+            parts = []
+            for item in value:
+                if isinstance(item, dict):
+                    flat = self._flatten(item)
+                    parts.append(",".join(f"{k}={self._cell(v)}" for k, v in flat.items() if not _is_empty(v)))
+                else:
+                    parts.append(self._cell(item))
+            return ";".join(parts)
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        text = self._scalar(value)
+        return text.replace("\\", "\\\\").replace("|", "\\|").replace("\n", "\\n")
+
+    def _render_table(self, rows: List[Dict[str, Any]], depth: int) -> List[str]:
+        """渲染表格：共同值单独列出，其余列按首次出现顺序输出"""
+        pad = self.indent * depth
+        flat_rows = [self._flatten(row) for row in rows]
+
+        columns: List[str] = []
+        seen = set()
+        for row in flat_rows:
+            for column, value in row.items():
+                if column not in seen and not _is_empty(value):
+                    seen.add(column)
+                    columns.append(column)
+
+        shared: List[str] = []
+        table_columns: List[str] = []
+        for column in columns:
+            cells = {self._cell(row.get(column)) for row in flat_rows}
+            if len(cells) == 1:
+                shared.append(f"{column}={cells.pop()}")
+            else:
+                table_columns.append(column)
+
+        lines = []
+        if shared:
+            lines.append(f"{pad}共同值: {' '.join(shared)}")
+        if table_columns:
+            lines.append(pad + "|".join(table_columns))
+            for row in flat_rows:
+                lines.append(pad + "|".join(self._cell(row.get(column)) for column in table_columns))
+        return lines
+
+
+def render_compact(data: Any, min_repeat_length: int = 8) -> str:
+    """
+    把数据渲染为紧凑文本
+
+    Args:
+        data: 任意可JSON序列化的数据
+        min_repeat_length: 参与字典编码的字符串最小长度
+    """
+    return CompactRenderer(min_repeat_length=min_repeat_length).render(data)
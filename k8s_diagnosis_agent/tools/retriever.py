@@ -0,0 +1,159 @@
+"""
+工具检索
+
+基于本地词法索引（BM25）按问题对工具排序，只把最相关的前k个工具schema
+发送给模型，避免工具越注册越多时每次调用的schema前缀无限增长。
+中文按字的二元组切分，英文按单词切分，不依赖外部分词器。
+"""
+import re
+import math
+from typing import Dict, List, Optional
+from .registry import ToolRegistry
+
+
+# 工具描述之外的检索关键词，覆盖常见的故障现象和别名
+DEFAULT_TOOL_KEYWORDS: Dict[str, str] = {
+    "k8s_cluster_info": "cluster 集群 概况 版本 version 命名空间 namespace 整体 状态",
+    "k8s_node_info": "node 节点 主机 NotReady 不可用 驱逐 evicted kubelet 压力 pressure 调度",
+    "k8s_pod_info": "pod 容器 container 重启 restart CrashLoopBackOff 崩溃 Pending 启动 OOMKilled 镜像 image ImagePullBackOff deployment 部署 副本",
+    "k8s_service_info": "service 服务 endpoint 端点 端口 port selector 负载均衡 loadbalancer 访问",
+    "k8s_events": "event 事件 warning 告警 失败 failed 调度 FailedScheduling BackOff 原因 异常",
+    "k8s_logs": "log 日志 报错 error exception 异常 panic 输出 崩溃 CrashLoopBackOff",
+    "k8s_resource_usage": "resource 资源 cpu 内存 memory 使用率 usage 配额 quota limit request OOM 限制 metrics",
+    "k8s_network": "network 网络 ingress dns 连通 连接 超时 timeout networkpolicy 网络策略 访问",
+    "k8s_storage": "storage 存储 pvc pv volume 卷 挂载 mount 磁盘 storageclass",
+    "k8s_security": "security 安全 rbac 权限 permission serviceaccount role 认证 forbidden",
+    "system_info": "system 系统 主机 os 操作系统 负载 load cpu 内存",
+    "network_diagnostic": "ping 连通 网络 dns 端口 traceroute 延迟 latency 诊断",
+    "filesystem": "file 文件 磁盘 disk 目录 空间 df 路径",
+    "process": "process 进程 pid 占用 服务进程",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """切分检索词：英文单词小写，中文连续字符切为二元组"""
+    tokens: List[str] = []
+    for word in re.findall(r"[A-Za-z0-9_]+|[\u4e00-\u9fff]+", text or ""):
+        if re.match(r"[A-Za-z0-9_]", word):
+            lowered = word.lower()
+            tokens.append(lowered)
+            # 下划线连接的工具名拆分为子词
+            if "_" in lowered:
+                tokens.extend(part for part in lowered.split("_") if part)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class ToolRetriever:
+    """按问题检索相关工具"""
+
+    def __init__(
+        self,
+        registry: ToolRegistry,
+        top_k: int = 6,
+        keywords: Optional[Dict[str, str]] = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        """
+        初始化检索器
+
+        Args:
+            registry: 工具注册表
+            top_k: 返回的工具数，0表示返回全部
+            keywords: 额外的检索关键词，按工具名合并到默认关键词
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.registry = registry
+        self.top_k = top_k
+        self.keywords = {**DEFAULT_TOOL_KEYWORDS, **(keywords or {})}
+        self.k1 = k1
+        self.b = b
+        self._index_version = -1
+        self._term_freqs: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    def _document(self, name: str) -> str:
+        """拼接工具的检索文本：注册名、schema描述、参数和关键词"""
+        schema = self.registry.get_tool_schemas([name])[0]
+        function = schema.get("function", {})
+        parts = [name, function.get("name", ""), function.get("description", ""), self.keywords.get(name, "")]
+        for param, spec in function.get("parameters", {}).get("properties", {}).items():
+            parts.append(param)
+            parts.append(spec.get("description", ""))
+        return " ".join(parts)
+
+    def _ensure_index(self):
+        """注册表变化后重建索引"""
+        if self._index_version == self.registry.version:
+            return
+
+        self._term_freqs = {}
+        self._doc_lengths = {}
+        doc_freqs: Dict[str, int] = {}
+        for name in self.registry.get_all_tools():
+            tokens = tokenize(self._document(name))
+            freqs: Dict[str, int] = {}
+            for token in tokens:
+                freqs[token] = freqs.get(token, 0) + 1
+            self._term_freqs[name] = freqs
+            self._doc_lengths[name] = len(tokens)
+            for token in freqs:
+                doc_freqs[token] = doc_freqs.get(token, 0) + 1
+
+        count = len(self._term_freqs)
+        self._idf = {
+            token: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for token, freq in doc_freqs.items()
+        }
+        self._avg_length = sum(self._doc_lengths.values()) / count if count else 0.0
+        self._index_version = self.registry.version
+
+    def score(self, query: str) -> Dict[str, float]:
+        """计算每个工具对问题的BM25得分"""
+        self._ensure_index()
+        query_tokens = set(tokenize(query))
+        scores: Dict[str, float] = {}
+        for name, freqs in self._term_freqs.items():
+            length_norm = 1 - self.b + self.b * self._doc_lengths[name] / (self._avg_length or 1)
+            total = 0.0
+            for token in query_tokens:
+                freq = freqs.get(token)
+                if freq:
+                    total += self._idf[token] * freq * (self.k1 + 1) / (freq + self.k1 * length_norm)
+            scores[name] = total
+        return scores
+
+    def retrieve(self, query: str, top_k: Optional[int] = None) -> List[str]:
+        """
+        检索与问题最相关的工具
+
+        Args:
+            query: 用户问题
+            top_k: 覆盖默认的返回数量
+
+        Returns:
+            按相关度排序的工具注册名；匹配不足k个时按注册顺序补齐（基础信息工具靠前）
+        """
+        top_k = self.top_k if top_k is None else top_k
+        names = self.registry.get_all_tools()
+        if top_k <= 0 or top_k >= len(names):
+            return names
+
+        scores = self.score(query)
+        matched = [name for name in names if scores.get(name, 0) > 0]
+        # 稳定排序，同分时保持注册顺序
+        matched.sort(key=lambda name: scores[name], reverse=True)
+        selected = matched[:top_k]
+        for name in names:
+            if len(selected) >= top_k:
+                break
+            if name not in selected:
+                selected.append(name)
+        return selected
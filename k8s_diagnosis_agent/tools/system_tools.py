@@ -4,7 +4,6 @@
 import asyncio
 import subprocess
 import platform
-import psutil
 import socket
 from typing import Dict, Any, Optional
 from .base import BaseTool, ToolResult, ToolStatus
@@ -20,6 +19,7 @@ class SystemInfoTool(BaseTool):
     async def execute(self, **kwargs) -> ToolResult:
         """获取系统信息"""
         try:
+            import psutil
             system_info = {
                 "platform": {
                     "system": platform.system(),
@@ -160,6 +160,7 @@ class FileSystemTool(BaseTool):
     async def execute(self, **kwargs) -> ToolResult:
         """文件系统诊断"""
         try:
+            import psutil
             path = kwargs.get('path', '/')
             
             # 获取磁盘使用情况
@@ -226,6 +227,7 @@ class ProcessTool(BaseTool):
     async def execute(self, **kwargs) -> ToolResult:
         """进程诊断"""
         try:
+            import psutil
             process_name = kwargs.get('process_name')
             
             processes = []
@@ -0,0 +1,180 @@
+"""
+轻量级链路追踪
+
+当前span通过contextvar在协程、任务和 asyncio.to_thread 之间传递，Agent处理消息、
+规划器各阶段、工具执行、Kubernetes API调用和LLM请求各自记录一个span，
+同一次对话轮次的span共享trace_id，trace_id随聊天响应返回以便关联日志和指标。
+
+启用后span写入JSONL文件，每行是一个OTLP JSON格式的 resourceSpans 批次，
+可以直接由OpenTelemetry Collector的 otlpjsonfile 接收器读取。
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Iterator
+
+
+class Span:
+    """一段被追踪的操作"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time or time.time()) - self.start_time
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """转换为OTLP JSON格式的span"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(self.start_time * 1e9)),
+            "endTimeUnixNano": str(int((self.end_time or time.time()) * 1e9)),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            # OTLP状态码：1=OK，2=ERROR
+            "status": {"code": 2, "message": self.error or self.status} if self.status != "ok" else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class JsonlSpanExporter:
+    """把结束的span按批写入JSONL文件"""
+
+    def __init__(self, path: str, service_name: str = "k8s-diagnosis-agent", batch_size: int = 64):
+        """
+        Args:
+            path: 输出文件路径
+            service_name: 写入资源属性的服务名
+            batch_size: 缓冲的span数达到该值或根span结束时写入一行
+        """
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span):
+        with self._lock:
+            self._buffer.append(span)
+            if span.parent_id is not None and len(self._buffer) < self.batch_size:
+                return
+            spans, self._buffer = self._buffer, []
+        self._write(spans)
+
+    def flush(self):
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if spans:
+            self._write(spans)
+
+    def _write(self, spans: List[Span]):
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "k8s_diagnosis_agent"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]}, ensure_ascii=False, default=str)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            # 追踪写入失败不影响请求
+            pass
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporter: Optional[JsonlSpanExporter] = None
+
+
+def set_exporter(exporter: Optional[JsonlSpanExporter]):
+    """设置span导出器，None表示只在内存中生成trace_id而不导出"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.flush()
+    _exporter = exporter
+
+
+def configure_tracing(enabled: bool, path: str, service_name: str = "k8s-diagnosis-agent"):
+    """按配置启用或关闭JSONL导出"""
+    set_exporter(JsonlSpanExporter(path, service_name) if enabled else None)
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def get_trace_id() -> Optional[str]:
+    """当前上下文的trace_id"""
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def start_span(name: str, **attributes) -> Iterator[Span]:
+    """
+    开始一个span，在当前span下作为子span，没有当前span时开始新的trace
+
+    可以包住跨越 yield 的异步生成器代码；异常会记录在span上并继续抛出。
+    """
+    parent = _current_span.get()
+    span = Span(
+        name,
+        parent.trace_id if parent is not None else uuid.uuid4().hex,
+        parent.span_id if parent is not None else None,
+        attributes
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except (asyncio.CancelledError, GeneratorExit):
+        span.status = "cancelled"
+        raise
+    except Exception as e:
+        span.status = "error"
+        span.error = str(e)
+        raise
+    finally:
+        span.end_time = time.time()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 异步生成器在另一个上下文中结束时无法还原，直接恢复父span
+            _current_span.set(parent)
+        if _exporter is not None:
+            _exporter.export(span)
@@ -2,9 +2,17 @@
 Web服务模块
 """
 
-from .app import create_app
-from .api import router
-from .models import ChatRequest, ChatResponse, ToolRequest, ToolResponse
+import importlib
+
+# 导出名到子模块的映射，首次访问时才导入对应子模块
+_EXPORTS = {
+    "create_app": ".app",
+    "router": ".api",
+    "ChatRequest": ".models",
+    "ChatResponse": ".models",
+    "ToolRequest": ".models",
+    "ToolResponse": ".models",
+}
 
 __all__ = [
     "create_app",
@@ -13,4 +21,10 @@ __all__ = [
     "ChatResponse", 
     "ToolRequest",
     "ToolResponse"
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
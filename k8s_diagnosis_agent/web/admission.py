@@ -0,0 +1,161 @@
+"""
+准入控制与过载保护
+
+昂贵的接口按类别（chat、tools）限制同时处理的请求数，超出的请求在有界队列中等待；
+队列已满或等待超时时立即返回 503 和 Retry-After，而不是堆积到所有请求一起超时。
+健康检查和状态接口走优先通道，不受限制，负载高时探针仍能及时响应。
+
+以ASGI中间件实现，流式响应在整个响应发送完之前一直占用名额。
+WebSocket连接不经过中间件，由多路复用器在每个流运行期间占用chat名额。
+"""
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..config import WebConfig
+from ..metrics import QUEUE_DEPTH, register_collect_hook
+
+
+class AdmissionLane:
+    """一类接口的并发名额和等待队列"""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        """
+        Args:
+            name: 类别名称
+            max_concurrency: 同时处理的请求数
+            max_queue: 等待名额的请求数上限
+            queue_timeout: 等待名额的最长时间（秒）
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # 在事件循环中首次使用时创建
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """获取名额，队列已满或等待超时时返回False"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class AdmissionController:
+    """按路径前缀把请求分到各类名额，优先通道的路径不受限制"""
+
+    def __init__(
+        self,
+        lanes: Dict[str, AdmissionLane],
+        routes: List[Tuple[str, str]],
+        priority_paths: Optional[List[str]] = None,
+        retry_after: int = 5
+    ):
+        """
+        Args:
+            lanes: 类别名称到名额的映射
+            routes: (路径前缀, 类别名称) 列表，按顺序匹配
+            priority_paths: 优先通道的路径前缀
+            retry_after: 拒绝时建议的重试间隔（秒）
+        """
+        self.lanes = lanes
+        self.routes = routes
+        self.priority_paths = priority_paths or []
+        self.retry_after = retry_after
+        register_collect_hook("admission", self._update_metrics)
+
+    def _update_metrics(self):
+        for name, lane in self.lanes.items():
+            QUEUE_DEPTH.labels(f"admission:{name}").set(lane.waiting)
+
+    @classmethod
+    def from_config(cls, web_config: WebConfig, prefix: str = "/api/v1") -> "AdmissionController":
+        """根据Web配置创建"""
+        lanes = {
+            "chat": AdmissionLane(
+                "chat", web_config.chat_max_concurrency, web_config.chat_max_queue, web_config.admission_queue_timeout
+            ),
+            "tools": AdmissionLane(
+                "tools", web_config.tool_max_concurrency, web_config.tool_max_queue, web_config.admission_queue_timeout
+            ),
+        }
+        routes = [
+            (f"{prefix}/chat", "chat"),
+            (f"{prefix}/tools/batch", "tools"),
+            (f"{prefix}/tool", "tools"),
+        ]
+        priority_paths = [f"{prefix}/health", f"{prefix}/status", "/metrics"]
+        return cls(lanes, routes, priority_paths, web_config.admission_retry_after)
+
+    def classify(self, path: str) -> Optional[AdmissionLane]:
+        """返回请求所属的名额，优先通道和未限制的路径返回None"""
+        if any(path.startswith(priority) for priority in self.priority_paths):
+            return None
+        for route_prefix, lane_name in self.routes:
+            if path == route_prefix or path.startswith(route_prefix + "/"):
+                return self.lanes[lane_name]
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: lane.get_stats() for name, lane in self.lanes.items()}
+
+
+class AdmissionMiddleware:
+    """准入控制ASGI中间件"""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        lane = self.controller.classify(scope["path"]) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await lane.acquire():
+            response = JSONResponse(
+                {"detail": f"服务繁忙（{lane.name}），请稍后重试"},
+                status_code=503,
+                headers={"Retry-After": str(self.controller.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
@@ -2,41 +2,68 @@
 Web API路由
 """
 import asyncio
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional, TYPE_CHECKING
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, WebSocket
 from datetime import datetime
 import json
 
-from ..core import Agent
+from ..core.jobs import JobManager, JobQueueFullError
 from ..config import config
-from .models import ChatRequest, ChatResponse, ToolRequest, ToolResponse, SessionInfo, SystemStatus
+from ..llm.governor import get_governor_stats
+from .models import (
+    ChatRequest, ChatResponse, JobRequest, JobResponse, ToolRequest, ToolResponse,
+    ToolBatchRequest, ToolBatchResponse, SessionInfo, SystemStatus
+)
+from .streaming import sse_response
+from .admission import AdmissionController
+from .responses import FastJSONResponse
+from .ws import StreamMultiplexer
+
+if TYPE_CHECKING:
+    from ..core.agent import Agent
 
 router = APIRouter()
 
-# 全局Agent实例
-agent = Agent(config)
+# 全局Agent实例，首次使用时创建，导入本模块不会初始化LLM和工具
+_agent: Optional["Agent"] = None
+
+
+def get_agent() -> "Agent":
+    """获取全局Agent实例"""
+    global _agent
+    if _agent is None:
+        from ..core.agent import Agent
+        _agent = Agent(config)
+    return _agent
+
+
+# 异步诊断任务，由固定数量的worker执行
+job_manager = JobManager(
+    lambda job: get_agent().process_message(job.message, job.session_id, stream=True),
+    max_workers=config.job_workers,
+    max_queue=config.job_queue_size,
+    retention=config.job_retention
+)
+
+# 昂贵接口的准入控制，由应用的中间件使用
+admission = AdmissionController.from_config(config.web)
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """聊天接口"""
     try:
         if request.stream:
-            # 流式响应
-            async def generate():
-                async for result in agent.process_message(
-                    request.message, 
-                    request.session_id, 
-                    stream=True
-                ):
-                    yield f"data: {json.dumps(result, ensure_ascii=False)}\n\n"
-            
-            return StreamingResponse(generate(), media_type="text/plain")
+            # SSE流式响应，客户端断开时取消正在执行的工具和LLM流
+            return sse_response(
+                http_request,
+                get_agent().process_message(request.message, request.session_id, stream=True),
+                heartbeat_interval=config.web.sse_heartbeat_interval
+            )
         else:
             # 非流式响应
             results = []
-            async for result in agent.process_message(
+            async for result in get_agent().process_message(
                 request.message, 
                 request.session_id, 
                 stream=False
@@ -45,18 +72,93 @@ async def chat(request: ChatRequest):
             
             # 返回最后的完整响应
             final_result = results[-1] if results else {"type": "error", "data": {"message": "没有响应"}}
+            if config.web.skip_response_validation:
+                return FastJSONResponse(final_result)
             return ChatResponse(**final_result)
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(request: JobRequest):
+    """提交异步诊断任务，立即返回任务ID"""
+    # 提前创建会话，客户端可以在任务执行期间查询会话
+    session_id = request.session_id or get_agent().session_manager.create_session()
+    try:
+        job = job_manager.submit(request.message, session_id, request.priority)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobResponse(
+        job_id=job.job_id,
+        status=job.status.value,
+        session_id=session_id,
+        position=job_manager.queue_position(job)
+    )
+
+
+@router.get("/jobs")
+async def get_jobs_stats():
+    """获取任务队列统计"""
+    return job_manager.get_stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, include_events: bool = False):
+    """查询任务状态和结果"""
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {**job.to_dict(include_events), "position": job_manager.queue_position(job)}
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, http_request: Request):
+    """以SSE订阅任务事件：先发送已有事件，任务结束时发送 job_status 事件"""
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return sse_response(http_request, job.subscribe(), heartbeat_interval=config.web.sse_heartbeat_interval)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消排队或执行中的任务"""
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    cancelled = job_manager.cancel(job_id)
+    return {"job_id": job_id, "cancelled": cancelled, "status": job.status.value}
+
+
+@router.websocket("/ws")
+async def websocket_streams(websocket: WebSocket):
+    """WebSocket接口：一个连接上多路复用多个会话的诊断流"""
+    await websocket.accept()
+    multiplexer = StreamMultiplexer(
+        websocket,
+        lambda params: get_agent().process_message(params["message"], params.get("session_id"), stream=True),
+        initial_credits=config.web.ws_initial_credits,
+        max_streams=config.web.ws_max_streams,
+        admission_lane=admission.lanes["chat"],
+        retry_after=admission.retry_after
+    )
+    await multiplexer.run()
+
+
 @router.post("/tool", response_model=ToolResponse)
 async def execute_tool(request: ToolRequest):
     """执行工具接口"""
     try:
-        result = await agent.execute_tool(request.tool_name, **request.params)
+        result = await get_agent().execute_tool(request.tool_name, **request.params)
         
+        if config.web.skip_response_validation:
+            return FastJSONResponse({
+                "tool_name": request.tool_name,
+                "success": result.is_success(),
+                "result": result.to_dict(),
+                "message": result.message or ""
+            })
         return ToolResponse(
             tool_name=request.tool_name,
             success=result.is_success(),
@@ -73,11 +175,49 @@ async def execute_tool(request: ToolRequest):
         )
 
 
+@router.post("/tools/batch", response_model=ToolBatchResponse)
+async def execute_tool_batch(request: ToolBatchRequest, http_request: Request):
+    """批量执行工具：并发执行，结果按请求顺序返回，stream为true时以SSE逐个发送"""
+    if len(request.tools) > config.tool_batch_max_size:
+        raise HTTPException(status_code=400, detail=f"单次最多 {config.tool_batch_max_size} 个工具调用")
+    max_concurrency = min(request.max_concurrency or config.tool_batch_concurrency, config.tool_batch_concurrency)
+    results = get_agent().execute_tool_batch(
+        [tool.dict() for tool in request.tools],
+        max_concurrency,
+        request.session_id
+    )
+    if request.stream:
+        async def events():
+            async for item in results:
+                yield {"type": "tool_result", "data": item}
+        return sse_response(http_request, events(), heartbeat_interval=config.web.sse_heartbeat_interval)
+    
+    if config.web.skip_response_validation:
+        return FastJSONResponse({"results": [
+            {
+                "tool_name": item["tool_name"],
+                "success": item["success"],
+                "result": item["result"],
+                "message": item["message"] or ""
+            }
+            async for item in results
+        ]})
+    return ToolBatchResponse(results=[
+        ToolResponse(
+            tool_name=item["tool_name"],
+            success=item["success"],
+            result=item["result"],
+            message=item["message"] or ""
+        )
+        async for item in results
+    ])
+
+
 @router.get("/tools")
 async def get_available_tools():
     """获取可用工具列表"""
     try:
-        tools = await agent.get_available_tools()
+        tools = await get_agent().get_available_tools()
         return tools
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -87,17 +227,26 @@ async def get_available_tools():
 async def get_session_history(session_id: str):
     """获取会话历史"""
     try:
-        history = await agent.get_session_history(session_id)
+        history = await get_agent().get_session_history(session_id)
         return {"session_id": session_id, "history": history}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/session/{session_id}/evidence/{ref}")
+async def get_session_evidence(session_id: str, ref: str):
+    """根据精简结果中的 full_result_ref 获取完整的工具结果"""
+    evidence = await get_agent().get_evidence(session_id, ref)
+    if evidence is None:
+        raise HTTPException(status_code=404, detail="证据不存在或已淘汰")
+    return evidence
+
+
 @router.delete("/session/{session_id}")
 async def clear_session(session_id: str):
     """清除会话"""
     try:
-        await agent.clear_session(session_id)
+        await get_agent().clear_session(session_id)
         return {"message": "会话已清除", "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -107,17 +256,19 @@ async def clear_session(session_id: str):
 async def get_sessions():
     """获取所有会话"""
     try:
-        sessions = agent.session_manager.get_all_sessions()
+        session_manager = get_agent().session_manager
+        sessions = await session_manager.get_all_sessions_async()
         session_info = []
         
         for session_id in sessions:
-            session = agent.session_manager.get_session(session_id)
+            session = await session_manager.get_session_async(session_id, touch=False)
             if session:
                 session_info.append(SessionInfo(
                     session_id=session_id,
                     created_at=session.created_at.isoformat(),
                     last_activity=session.last_activity.isoformat(),
-                    message_count=len(session.messages)
+                    message_count=len(session.messages),
+                    queued_turns=session_manager.get_queued_turns(session_id)
                 ))
         
         return {"sessions": session_info}
@@ -129,6 +280,7 @@ async def get_sessions():
 async def get_system_status():
     """获取系统状态"""
     try:
+        agent = get_agent()
         llm_info = agent.get_llm_info()
         tools = await agent.get_available_tools()
         
@@ -137,7 +289,11 @@ async def get_system_status():
             llm_provider=llm_info.get("provider", "unknown"),
             available_tools=list(tools.get("tools", {}).keys()),
             session_count=agent.session_manager.get_session_count(),
-            version=config.version
+            version=config.version,
+            llm_queues=get_governor_stats(),
+            sessions={**agent.session_manager.get_stats(), "summarizer": agent.summarizer.get_stats()},
+            jobs=job_manager.get_stats(),
+            admission=admission.get_stats()
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -147,7 +303,7 @@ async def get_system_status():
 async def switch_model(provider: str):
     """切换模型"""
     try:
-        success = await agent.switch_llm_provider(provider)
+        success = await get_agent().switch_llm_provider(provider)
         if success:
             return {"message": f"已切换到 {provider}", "success": True}
         else:
@@ -1,14 +1,29 @@
 """
 Web应用主程序
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 import os
 
 from ..config import config
-from .api import router
+from ..metrics import render_metrics, CONTENT_TYPE_LATEST
+from .api import router, get_agent, job_manager, admission
+from .admission import AdmissionMiddleware
+from .responses import FastJSONResponse, CompressionMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时创建Agent并启动会话清理任务和诊断任务worker，关闭时依次停止"""
+    agent = get_agent()
+    agent.session_manager.start()
+    job_manager.start()
+    yield
+    await job_manager.stop()
+    await agent.session_manager.stop()
 
 
 def create_app() -> FastAPI:
@@ -18,9 +33,18 @@ def create_app() -> FastAPI:
         description=config.description,
         version=config.version,
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        default_response_class=FastJSONResponse,
+        lifespan=lifespan
     )
     
+    # 准入控制，先添加使CORS在外层，503响应也带CORS头
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+    
+    # 大响应压缩
+    if config.web.compression_min_size > 0:
+        app.add_middleware(CompressionMiddleware, minimum_size=config.web.compression_min_size)
+    
     # 添加CORS中间件
     app.add_middleware(
         CORSMiddleware,
@@ -33,6 +57,11 @@ def create_app() -> FastAPI:
     # 添加API路由
     app.include_router(router, prefix="/api/v1")
     
+    # Prometheus指标
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+    
     # 静态文件服务
     static_dir = os.path.join(os.path.dirname(__file__), "static")
     if os.path.exists(static_dir):
@@ -161,6 +190,7 @@ def create_app() -> FastAPI:
                     <h3>🔗 API接口</h3>
                     <ul>
                         <li><strong>POST /api/v1/chat</strong> - 聊天接口</li>
+                        <li><strong>POST /api/v1/jobs</strong> - 提交异步诊断任务</li>
                         <li><strong>POST /api/v1/tool</strong> - 执行工具</li>
                         <li><strong>GET /api/v1/tools</strong> - 获取可用工具</li>
                         <li><strong>GET /api/v1/status</strong> - 系统状态</li>
@@ -19,6 +19,22 @@ class ChatResponse(BaseModel):
     data: Dict[str, Any]
     session_id: str
     timestamp: Optional[str] = None
+    trace_id: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    """异步诊断任务请求模型"""
+    message: str
+    session_id: Optional[str] = None
+    priority: int = 0
+
+
+class JobResponse(BaseModel):
+    """异步诊断任务提交响应模型"""
+    job_id: str
+    status: str
+    session_id: str
+    position: Optional[int] = None
 
 
 class ToolRequest(BaseModel):
@@ -35,12 +51,26 @@ class ToolResponse(BaseModel):
     message: str = ""
 
 
+class ToolBatchRequest(BaseModel):
+    """批量工具请求模型"""
+    tools: List[ToolRequest]
+    max_concurrency: Optional[int] = None
+    session_id: Optional[str] = None
+    stream: bool = False
+
+
+class ToolBatchResponse(BaseModel):
+    """批量工具响应模型，结果与请求顺序一致"""
+    results: List[ToolResponse]
+
+
 class SessionInfo(BaseModel):
     """会话信息模型"""
     session_id: str
     created_at: str
     last_activity: str
     message_count: int
+    queued_turns: int = 0
 
 
 class SystemStatus(BaseModel):
@@ -49,4 +79,8 @@ class SystemStatus(BaseModel):
     llm_provider: str
     available_tools: List[str]
     session_count: int
-    version: str 
\ No newline at end of file
+    version: str
+    llm_queues: Dict[str, Any] = {}
+    sessions: Dict[str, Any] = {}
+    jobs: Dict[str, Any] = {}
+    admission: Dict[str, Any] = {} 
\ No newline at end of file
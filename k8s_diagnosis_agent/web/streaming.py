@@ -0,0 +1,109 @@
+"""
+Server-Sent Events 流式响应
+
+把 Agent 产生的事件按 text/event-stream 格式逐条发送：每条事件带递增的id和事件类型，
+空闲时发送心跳注释防止代理断开或缓冲。事件由独立任务生成并放入有界队列，
+客户端读取变慢时生成方在队列满时等待；客户端断开后取消生成任务，
+正在执行的工具调用和LLM流随之取消，不再消耗token。
+"""
+import json
+import asyncio
+from typing import Dict, Any, AsyncIterator, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+# 告知代理不要缓冲、不要缓存
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+_DONE = object()
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[int] = None,
+               retry: Optional[int] = None) -> str:
+    """
+    格式化一条SSE事件
+
+    Args:
+        data: 事件数据，非字符串时序列化为JSON
+        event: 事件类型
+        event_id: 事件ID
+        retry: 建议的重连间隔（毫秒）
+    """
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False, default=str)
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    if retry is not None:
+        lines.append(f"retry: {retry}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_events(
+    request: Request,
+    source: AsyncIterator[Dict[str, Any]],
+    heartbeat_interval: float = 15.0,
+    queue_size: int = 16
+) -> AsyncIterator[str]:
+    """
+    把事件源转换为SSE文本流
+
+    Args:
+        request: 当前请求，用于检测客户端断开
+        source: Agent事件源，每个事件的 type 字段作为SSE事件类型
+        heartbeat_interval: 无事件时发送心跳的间隔（秒）
+        queue_size: 生成方与发送方之间的队列长度
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put({"type": "error", "data": {"error": str(e), "message": "处理消息时发生错误"}})
+        await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    event_id = 0
+    try:
+        yield format_sse({"status": "connected"}, event="open", retry=3000)
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=heartbeat_interval)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": heartbeat\n\n"
+                continue
+            if item is _DONE:
+                break
+            event_id += 1
+            yield format_sse(item, event=item.get("type", "message"), event_id=event_id)
+            if await request.is_disconnected():
+                break
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+def sse_response(request: Request, source: AsyncIterator[Dict[str, Any]], heartbeat_interval: float = 15.0
+                 ) -> StreamingResponse:
+    """创建SSE流式响应"""
+    return StreamingResponse(
+        sse_events(request, source, heartbeat_interval),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
@@ -0,0 +1,209 @@
+"""
+WebSocket多路复用
+
+一个WebSocket连接上同时运行多个诊断流（每个流对应一次对话轮次），
+帧为紧凑的JSON数组：
+
+客户端 -> 服务端:
+    ["open", 流ID, {"message": ..., "session_id": ..., "credits": 初始额度}]
+    ["credit", 流ID, n]     增加流的发送额度
+    ["cancel", 流ID]        取消流，正在执行的工具和LLM流随之取消
+
+服务端 -> 客户端:
+    [流ID, 序号, 类型, 数据]
+    类型: s=执行步骤 c=回复片段 d=回复完成 e=错误 x=流结束（数据为 done/cancelled/error/rejected）
+
+每个流按额度发送：额度用完后该流暂停生成，直到客户端补充额度，
+慢的流不会阻塞同一连接上的其他流。
+
+每个流和HTTP的chat接口共用准入名额，名额不足时该流收到错误帧（含retry_after）后以 rejected 结束。
+"""
+import json
+import asyncio
+from typing import Dict, Any, AsyncIterator, Callable, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .admission import AdmissionLane
+
+
+# 事件类型到帧类型的映射
+FRAME_TYPES = {
+    "execution_step": "s",
+    "response_chunk": "c",
+    "response_complete": "d",
+    "error": "e",
+}
+
+
+def encode_frame(stream_id: Any, seq: int, frame_type: str, data: Any) -> str:
+    """编码一帧"""
+    return json.dumps([stream_id, seq, frame_type, data], ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class _Stream:
+    """单个流的状态"""
+
+    def __init__(self, stream_id: Any, credits: int):
+        self.stream_id = stream_id
+        self.credits = credits
+        self.seq = 0
+        self.credit_available = asyncio.Event()
+        if credits > 0:
+            self.credit_available.set()
+        self.task: Optional[asyncio.Task] = None
+
+    def add_credits(self, count: int):
+        self.credits += count
+        if self.credits > 0:
+            self.credit_available.set()
+
+    async def acquire(self):
+        """等待并消耗一个发送额度"""
+        while self.credits <= 0:
+            self.credit_available.clear()
+            await self.credit_available.wait()
+        self.credits -= 1
+
+
+class StreamMultiplexer:
+    """WebSocket连接上的流多路复用器"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        source_factory: Callable[[Dict[str, Any]], AsyncIterator[Dict[str, Any]]],
+        initial_credits: int = 16,
+        max_streams: int = 8,
+        admission_lane: Optional[AdmissionLane] = None,
+        retry_after: int = 5
+    ):
+        """
+        Args:
+            websocket: 已接受的WebSocket连接
+            source_factory: 根据open帧参数创建事件源
+            initial_credits: open帧未指定额度时的初始额度
+            max_streams: 单个连接同时运行的最大流数
+            admission_lane: 每个流运行前需要获取的准入名额，None表示不限制
+            retry_after: 名额不足时建议的重试间隔（秒）
+        """
+        self.websocket = websocket
+        self.source_factory = source_factory
+        self.initial_credits = initial_credits
+        self.max_streams = max_streams
+        self.admission_lane = admission_lane
+        self.retry_after = retry_after
+        self.streams: Dict[Any, _Stream] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def _send(self, stream_id: Any, seq: int, frame_type: str, data: Any):
+        async with self._send_lock:
+            await self.websocket.send_text(encode_frame(stream_id, seq, frame_type, data))
+
+    async def _run_stream(self, stream: _Stream, params: Dict[str, Any]):
+        frames = [("x", "done")]
+        lane = self.admission_lane
+        admitted = False
+        try:
+            if lane is not None:
+                if not await lane.acquire():
+                    frames = [
+                        ("e", {"error": f"服务繁忙（{lane.name}），请稍后重试", "retry_after": self.retry_after}),
+                        ("x", "rejected"),
+                    ]
+                    return
+                admitted = True
+            async for event in self.source_factory(params):
+                await stream.acquire()
+                stream.seq += 1
+                frame_type = FRAME_TYPES.get(event.get("type"), event.get("type", "?"))
+                data = event.get("data")
+                if event.get("type") == "response_complete" and isinstance(data, dict):
+                    data = {**data, "session_id": event.get("session_id")}
+                    if event.get("trace_id"):
+                        data["trace_id"] = event["trace_id"]
+                await self._send(stream.stream_id, stream.seq, frame_type, data)
+        except asyncio.CancelledError:
+            # 取消帧由取消方发送
+            frames = []
+            raise
+        except Exception as e:
+            frames = [("e", {"error": str(e)}), ("x", "error")]
+        finally:
+            if admitted:
+                lane.release()
+            self.streams.pop(stream.stream_id, None)
+            try:
+                for frame_type, data in frames:
+                    stream.seq += 1
+                    await self._send(stream.stream_id, stream.seq, frame_type, data)
+            except Exception:
+                # 连接已断开
+                pass
+
+    @staticmethod
+    def _parse_credits(value: Any) -> Optional[int]:
+        """解析额度，不是正整数时返回None"""
+        if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            return None
+        return value
+
+    async def _handle_frame(self, frame: Any):
+        if not isinstance(frame, list) or len(frame) < 2:
+            await self._send(None, 0, "e", {"error": "无效的帧"})
+            return
+        op, stream_id = frame[0], frame[1]
+        if isinstance(stream_id, bool) or not isinstance(stream_id, (str, int)):
+            await self._send(None, 0, "e", {"error": "流ID必须是字符串或整数"})
+            return
+
+        if op == "open":
+            params = frame[2] if len(frame) > 2 and isinstance(frame[2], dict) else {}
+            if stream_id in self.streams:
+                await self._send(stream_id, 0, "e", {"error": "流ID已存在"})
+            elif len(self.streams) >= self.max_streams:
+                await self._send(stream_id, 0, "e", {"error": f"同时运行的流不能超过 {self.max_streams} 个"})
+            elif not params.get("message"):
+                await self._send(stream_id, 0, "e", {"error": "缺少message"})
+            else:
+                credits = self._parse_credits(params.get("credits", self.initial_credits))
+                if credits is None:
+                    await self._send(stream_id, 0, "e", {"error": "credits必须是正整数"})
+                    return
+                stream = _Stream(stream_id, credits)
+                self.streams[stream_id] = stream
+                stream.task = asyncio.create_task(self._run_stream(stream, params))
+        elif op == "credit":
+            credits = self._parse_credits(frame[2]) if len(frame) > 2 else None
+            if credits is None:
+                await self._send(stream_id, 0, "e", {"error": "credits必须是正整数"})
+                return
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream.add_credits(credits)
+        elif op == "cancel":
+            stream = self.streams.pop(stream_id, None)
+            if stream is not None and stream.task is not None:
+                stream.task.cancel()
+                stream.seq += 1
+                await self._send(stream_id, stream.seq, "x", "cancelled")
+        else:
+            await self._send(stream_id, 0, "e", {"error": f"未知操作: {op}"})
+
+    async def run(self):
+        """读取客户端帧直到连接断开，断开时取消所有流"""
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    frame = json.loads(text)
+                except ValueError:
+                    await self._send(None, 0, "e", {"error": "帧不是有效的JSON"})
+                    continue
+                await self._handle_frame(frame)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            tasks = [stream.task for stream in self.streams.values() if stream.task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,87 @@
+"""
+上下文管理测试
+"""
+import time
+from k8s_diagnosis_agent.config import Config
+from k8s_diagnosis_agent.core.context_packer import ContextPacker
+from k8s_diagnosis_agent.core.evidence import EvidenceStore
+from k8s_diagnosis_agent.llm.base import Message
+from k8s_diagnosis_agent.tools.base import ToolResult, ToolStatus
+
+
+def _result(tool_name, data, message="ok"):
+    return {"tool_name": tool_name, "result": {"status": "success", "message": message, "data": data}, "success": True}
+
+
+def test_packer_prefers_question_and_evidence_over_history():
+    config = Config()
+    config.llm.max_tokens = 1000
+    config.llm.context_windows = {"tiny-model": 1800}
+    packer = ContextPacker(config)
+
+    history = []
+    for i in range(20):
+        history.append(Message(role="user", content=f"问题{i} " + "x" * 400))
+        history.append(Message(role="assistant", content=f"回答{i} " + "y" * 400))
+    messages = history + [Message(role="user", content="为什么web服务不可用？")]
+    evidence = [_result("k8s_pod_info", {"pods": [{"name": "web-0", "phase": "Pending"}]}, "成功获取Pod信息")]
+
+    context = packer.pack("你是诊断助手", messages, evidence, "tiny-model")
+    packing = context["packing"]
+
+    assert packing["budget"] == 800
+    assert packing["total_tokens"] <= packing["budget"]
+    assert context["messages"][-2].content == "为什么web服务不可用？"
+    assert "web-0" in context["messages"][-1].content
+    assert context["messages"][0].content.startswith("更早的对话摘要")
+    actions = {(d["item"], d["action"]) for d in packing["decisions"]}
+    assert ("evidence:k8s_pod_info", "included") in actions
+    assert ("history", "summarized") in actions
+
+
+def test_packer_summarizes_evidence_that_does_not_fit():
+    config = Config()
+    config.llm.max_tokens = 1000
+    config.llm.context_windows = {"tiny-model": 1300}
+    config.llm.tool_result_token_budget = 5000
+    packer = ContextPacker(config)
+
+    evidence = [_result("filesystem", {"content": "z" * 4000}, "读取文件成功")]
+    context = packer.pack("", [Message(role="user", content="检查文件")], evidence, "tiny-model")
+
+    assert context["packing"]["decisions"][0]["action"] == "summarized"
+    assert context["messages"][-1].content == "工具执行结果：\n- filesystem: 读取文件成功"
+    assert packer.get_context_window("gpt-4-turbo-preview") == 128000
+    assert packer.get_context_window("gpt-4-0613") == 8192
+
+
+def test_packer_passes_full_result_ref_for_reduced_evidence():
+    config = Config()
+    config.llm.tool_result_token_budget = 100
+    packer = ContextPacker(config)
+
+    pods = {"pods": [{"name": f"web-{i}", "phase": "Running"} for i in range(200)]}
+    evidence = [{**_result("k8s_pod_info", pods, "成功获取Pod信息"), "full_result_ref": "0123456789abcdef"}]
+    context = packer.pack("", [Message(role="user", content="pod状态")], evidence, "gpt-4")
+    assert "full_result_ref=0123456789abcdef" in context["messages"][-1].content
+
+    small = [{**_result("k8s_pod_info", {"pods": []}), "full_result_ref": "0123456789abcdef"}]
+    context = packer.pack("", [Message(role="user", content="pod状态")], small, "gpt-4")
+    assert "full_result_ref" not in context["messages"][-1].content
+
+
+def test_evidence_store_freshness_and_normalization():
+    store = EvidenceStore(ttls={"k8s_events": 0.05})
+    ok = ToolResult(status=ToolStatus.SUCCESS, data={"events": []}, message="ok")
+    store.put("k8s_events", {}, ok)
+    store.put("k8s_logs", {"pod_name": "web-0"}, ToolResult(status=ToolStatus.ERROR, error="boom"))
+
+    # 默认命名空间与显式指定视为同一次调用
+    result, mode = store.get("k8s_events", {"namespace": "default", "field_selector": None})
+    assert mode == "reused" and result.metadata["evidence"] == "reused"
+    # 失败的结果不保存
+    assert store.get("k8s_logs", {"pod_name": "web-0"}) is None
+
+    time.sleep(0.06)
+    assert store.get("k8s_events", {}) is None
+    assert store.get_stats()["hits"] == 1
@@ -0,0 +1,152 @@
+"""
+异步诊断任务测试
+"""
+import asyncio
+import pytest
+from k8s_diagnosis_agent.core.jobs import JobManager, JobStatus, JobQueueFullError
+
+
+def make_runner(order, gate=None):
+    async def runner(job):
+        order.append(job.message)
+        yield {"type": "execution_step", "data": {"step": job.message}}
+        if gate is not None:
+            await gate.wait()
+        yield {"type": "response_complete", "data": {"content": f"done {job.message}"}}
+    return runner
+
+
+async def test_priority_order_with_single_worker():
+    order = []
+    gate = asyncio.Event()
+    manager = JobManager(make_runner(order, gate), max_workers=1)
+    first = manager.submit("first")
+    await asyncio.sleep(0)
+    low = manager.submit("low", priority=0)
+    high = manager.submit("high", priority=5)
+    assert manager.queue_position(high) == 1
+    assert manager.queue_position(low) == 2
+
+    gate.set()
+    await manager._queue.join()
+    assert order == ["first", "high", "low"]
+    assert first.status == JobStatus.COMPLETED
+    assert low.result == {"content": "done low"}
+    assert manager.get_stats()["completed"] == 3
+    await manager.stop()
+
+
+async def test_queue_full_rejected():
+    gate = asyncio.Event()
+    manager = JobManager(make_runner([], gate), max_workers=1, max_queue=1)
+    manager.submit("running")
+    await asyncio.sleep(0)
+    manager.submit("queued")
+    with pytest.raises(JobQueueFullError):
+        manager.submit("rejected")
+    assert manager.get_stats()["rejected"] == 1
+    await manager.stop()
+
+
+async def test_cancel_running_and_queued_jobs():
+    order = []
+    gate = asyncio.Event()
+    manager = JobManager(make_runner(order, gate), max_workers=1)
+    running = manager.submit("running")
+    queued = manager.submit("queued")
+    after = manager.submit("after")
+    await asyncio.sleep(0.01)
+
+    assert manager.cancel(queued.job_id)
+    assert manager.cancel(running.job_id)
+    gate.set()
+    await manager._queue.join()
+    assert running.status == JobStatus.CANCELLED
+    assert queued.status == JobStatus.CANCELLED
+    # worker在取消后继续处理后续任务
+    assert after.status == JobStatus.COMPLETED
+    assert order == ["running", "after"]
+    assert not manager.cancel(after.job_id)
+    await manager.stop()
+
+
+async def test_subscribe_replays_and_follows_events():
+    gate = asyncio.Event()
+    manager = JobManager(make_runner([], gate), max_workers=1)
+    job = manager.submit("watch")
+    await asyncio.sleep(0.01)
+
+    async def collect():
+        return [event async for event in job.subscribe()]
+
+    subscriber = asyncio.create_task(collect())
+    await asyncio.sleep(0)
+    gate.set()
+    events = await subscriber
+    assert [event["type"] for event in events] == ["execution_step", "response_complete", "job_status"]
+    assert events[-1]["data"]["status"] == "completed"
+
+    # 任务结束后订阅只回放已有事件
+    replay = [event async for event in job.subscribe()]
+    assert replay == events
+    await manager.stop()
+
+
+async def test_response_chunks_are_not_retained():
+    gate = asyncio.Event()
+
+    async def runner(job):
+        yield {"type": "execution_step", "data": {}}
+        for chunk in ("节点", "内存", "不足"):
+            yield {"type": "response_chunk", "data": chunk}
+        await gate.wait()
+        yield {"type": "response_complete", "data": {"content": "节点内存不足"}}
+
+    manager = JobManager(runner, max_workers=1)
+    job = manager.submit("stream")
+    await asyncio.sleep(0.01)
+
+    # 中途订阅时已生成的片段合并为一个事件
+    late = job.subscribe()
+    assert (await late.__anext__())["type"] == "execution_step"
+    assert (await late.__anext__()) == {"type": "response_chunk", "data": "节点内存不足", "session_id": None}
+    gate.set()
+    assert (await late.__anext__())["type"] == "response_complete"
+    await late.aclose()
+
+    await manager._queue.join()
+    assert [event["type"] for event in job.events] == ["execution_step", "response_complete"]
+    await manager.stop()
+
+
+async def test_queue_position_uses_submission_sequence(monkeypatch):
+    import time as time_module
+
+    gate = asyncio.Event()
+    manager = JobManager(make_runner([], gate), max_workers=1)
+    manager.submit("running")
+    await asyncio.sleep(0)
+    # 时钟精度不足时提交时间相同
+    monkeypatch.setattr(time_module, "time", lambda: 1000.0)
+    jobs = [manager.submit(f"job-{i}") for i in range(3)]
+    assert [manager.queue_position(job) for job in jobs] == [1, 2, 3]
+    gate.set()
+    await manager.stop()
+
+
+async def test_cancelled_queued_job_frees_queue_capacity():
+    gate = asyncio.Event()
+    manager = JobManager(make_runner([], gate), max_workers=1, max_queue=1)
+    running = manager.submit("running")
+    await asyncio.sleep(0)
+    queued = manager.submit("queued")
+    assert manager.cancel(queued.job_id)
+    # 已取消的任务不再占用排队名额
+    replacement = manager.submit("replacement")
+    assert manager.get_stats()["queued"] == 1
+    gate.set()
+    await asyncio.sleep(0.05)
+    assert running.status == JobStatus.COMPLETED
+    assert replacement.status == JobStatus.COMPLETED
+    assert queued.status == JobStatus.CANCELLED
+    await manager.stop()
@@ -0,0 +1,407 @@
+"""
+LLM提供者相关测试
+"""
+import json
+import asyncio
+import httpx
+import pytest
+from k8s_diagnosis_agent.llm.base import BaseLLMProvider, Message, LLMResponse
+from k8s_diagnosis_agent.llm.cache import LLMResponseCache
+from k8s_diagnosis_agent.llm.openai_provider import OpenAIProvider
+from k8s_diagnosis_agent.llm.router import LLMRouter
+from k8s_diagnosis_agent.llm.hedged_provider import HedgedLLMProvider
+from k8s_diagnosis_agent.llm.governor import LLMGovernor, GovernedLLMProvider, usage_total_tokens
+from k8s_diagnosis_agent.config import LLMConfig
+
+
+def _mock_openai_provider(tmp_path, handler, **extra):
+    """创建使用模拟传输层的OpenAI提供者"""
+    config = {
+        "api_key": "test",
+        "model": "gpt-test",
+        "temperature": 0.1,
+        "response_cache_enabled": True,
+        "response_cache_path": str(tmp_path / "cache.sqlite3"),
+        **extra,
+    }
+    provider = OpenAIProvider(config)
+    provider.client = httpx.AsyncClient(
+        base_url="https://mock.openai/v1",
+        transport=httpx.MockTransport(handler)
+    )
+    return provider
+
+
+class FakeProvider(BaseLLMProvider):
+    """可控延迟和失败的测试提供者"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        super().__init__({"model": name})
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate(self, messages, system_prompt=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise Exception(f"{self.name} unavailable")
+        return LLMResponse(content=self.name, model=self.name)
+
+    async def stream_generate(self, messages, system_prompt=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise Exception(f"{self.name} unavailable")
+        for chunk in (self.name, "-done"):
+            yield chunk
+
+    async def embed(self, text):
+        raise NotImplementedError()
+
+    def supports_function_calling(self):
+        return True
+
+    def get_model_info(self):
+        return {"provider": self.name, "model": self.name}
+
+
+def _completion(content):
+    return {
+        "id": "chatcmpl-1",
+        "model": "gpt-test",
+        "created": 0,
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"total_tokens": 10},
+    }
+
+
+def test_response_cache_eviction():
+    """测试缓存按字节上限淘汰最久未访问的条目"""
+    cache = LLMResponseCache(":memory:", max_bytes=300)
+    for i in range(5):
+        cache.set(f"k{i}", {"content": "x" * 80, "index": i})
+
+    stats = cache.get_stats()
+    assert stats["size_bytes"] <= 300
+    assert cache.get("k0") is None
+    assert cache.get("k4")["index"] == 4
+
+
+def test_response_cache_key_sensitivity():
+    """测试缓存键随模型、消息和参数变化"""
+    messages = [{"role": "user", "content": "hi"}]
+    key = LLMResponseCache.make_key("m", messages, "sys", {"temperature": 0.1})
+    assert key == LLMResponseCache.make_key("m", messages, "sys", {"temperature": 0.1})
+    assert key != LLMResponseCache.make_key("m2", messages, "sys", {"temperature": 0.1})
+    assert key != LLMResponseCache.make_key("m", messages, None, {"temperature": 0.1})
+    assert key != LLMResponseCache.make_key("m", messages, "sys", {"temperature": 0.2})
+    assert key != LLMResponseCache.make_key("m", messages, "sys", {"temperature": 0.1}, provider="deepseek")
+    assert (
+        LLMResponseCache.make_key("m", messages, "sys", {"temperature": 0.1}, base_url="https://a.example/v1")
+        != LLMResponseCache.make_key("m", messages, "sys", {"temperature": 0.1}, base_url="https://b.example/v1")
+    )
+
+
+@pytest.mark.asyncio
+async def test_provider_cache_hit(tmp_path):
+    """测试相同的确定性调用命中缓存"""
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, json=_completion("集群正常"))
+
+    provider = _mock_openai_provider(tmp_path, handler)
+    messages = [Message(role="user", content="检查集群")]
+
+    first = await provider.generate(messages, system_prompt="sys", temperature=0.1)
+    second = await provider.generate(messages, system_prompt="sys", temperature=0.1)
+
+    assert len(calls) == 1
+    assert first.metadata["cache_hit"] is False
+    assert second.metadata["cache_hit"] is True
+    assert second.content == "集群正常"
+
+
+@pytest.mark.asyncio
+async def test_provider_cache_skips_high_temperature(tmp_path):
+    """测试高温度调用不参与缓存"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json=_completion("ok"))
+
+    provider = _mock_openai_provider(tmp_path, handler)
+    messages = [Message(role="user", content="hello")]
+
+    await provider.generate(messages, temperature=0.9)
+    response = await provider.generate(messages, temperature=0.9)
+
+    assert len(calls) == 2
+    assert "cache_hit" not in response.metadata
+
+
+def test_router_resolves_call_sites():
+    """测试按调用场景路由提供者和模型"""
+    llm_config = LLMConfig(
+        default_model="gpt-4",
+        openai_api_key="test",
+        deepseek_api_key="test",
+        routes={"review": "openai:gpt-4o-mini", "summary": "deepseek"}
+    )
+    router = LLMRouter(llm_config)
+
+    assert router.resolve("plan") == ("openai", None)
+    assert router.resolve("review") == ("openai", "gpt-4o-mini")
+    assert router.resolve("summary") == ("deepseek", None)
+
+    assert router.get_provider("plan").model_name == llm_config.openai_model
+    assert router.get_provider("review").model_name == "gpt-4o-mini"
+    assert router.get_provider("plan") is router.get_provider("final_answer")
+    assert router.get_routes()["summary"]["model"] == llm_config.deepseek_model
+
+
+def test_router_switch_default_provider():
+    """测试切换默认提供者只影响未单独配置的场景"""
+    llm_config = LLMConfig(default_model="gpt-4", routes={"review": "openai:gpt-4o-mini"})
+    router = LLMRouter(llm_config)
+    router.set_default_provider("claude")
+
+    assert router.resolve("plan") == ("claude", None)
+    assert router.resolve("review") == ("openai", "gpt-4o-mini")
+
+
+def test_router_defaults_unrouted_call_sites_to_default_provider():
+    """测试默认不路由任何场景，会话记忆摘要也使用默认提供者"""
+    router = LLMRouter(LLMConfig(default_model="claude"))
+
+    assert router.resolve("memory_summary") == ("claude", None)
+
+
+@pytest.mark.asyncio
+async def test_hedged_provider_hedges_slow_primary():
+    """测试主提供者过慢时对冲到备用提供者并取消主请求"""
+    primary = FakeProvider("primary", delay=1.0)
+    secondary = FakeProvider("secondary", delay=0.01)
+    provider = HedgedLLMProvider({"providers": [primary, secondary], "hedge_delay": 0.05, "hedge_min_delay": 0.01})
+
+    response = await provider.generate([Message(role="user", content="hi")])
+
+    assert response.content == "secondary"
+    assert response.metadata["hedged"] is True
+    assert primary.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_provider_failover_and_circuit_breaker():
+    """测试失败自动转移，连续失败后跳过该提供者"""
+    primary = FakeProvider("primary", fail=True)
+    secondary = FakeProvider("secondary")
+    provider = HedgedLLMProvider({"providers": [primary, secondary], "failure_threshold": 2, "cooldown": 60})
+
+    for _ in range(2):
+        response = await provider.generate([Message(role="user", content="hi")])
+        assert response.content == "secondary"
+
+    await provider.generate([Message(role="user", content="hi")])
+    assert primary.calls == 2
+    assert provider.get_model_info()["providers"][0]["available"] is False
+
+
+@pytest.mark.asyncio
+async def test_hedged_provider_stream():
+    """测试流式调用以首个片段决定胜出者"""
+    provider = HedgedLLMProvider({
+        "providers": [FakeProvider("slow", delay=1.0), FakeProvider("fast")],
+        "hedge_delay": 0.05,
+        "hedge_min_delay": 0.01,
+    })
+
+    chunks = [chunk async for chunk in provider.stream_generate([Message(role="user", content="hi")])]
+    assert "".join(chunks) == "fast-done"
+
+
+def test_router_wraps_hedged_provider():
+    """测试配置备用提供者后路由返回对冲提供者"""
+    llm_config = LLMConfig(default_model="gpt-4", hedge_providers=["deepseek"], routes={})
+    provider = LLMRouter(llm_config).get_provider("plan")
+
+    assert isinstance(provider, HedgedLLMProvider)
+    assert [name.split(":")[0] for name in provider.provider_names] == ["openai", "deepseek"]
+
+
+@pytest.mark.asyncio
+async def test_governor_limits_in_flight():
+    """测试治理器限制最大并发"""
+    governor = LLMGovernor("fake", max_in_flight=2)
+    provider = GovernedLLMProvider(FakeProvider("fake", delay=0.05), governor)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        task = asyncio.ensure_future(provider.generate([Message(role="user", content="hi")]))
+        await asyncio.sleep(0.01)
+        peak = max(peak, governor.get_stats()["in_flight"])
+        await task
+
+    await asyncio.gather(*(call() for _ in range(5)))
+
+    stats = governor.get_stats()
+    assert peak == 2
+    assert stats["total_granted"] == 5
+    assert stats["in_flight"] == 0
+    assert stats["wait_seconds"]["max"] > 0
+
+
+@pytest.mark.asyncio
+async def test_governor_fair_queueing_across_sessions():
+    """测试排队请求在会话间公平放行"""
+    governor = LLMGovernor("fake", max_in_flight=1)
+    order = []
+
+    async def request(session_id):
+        async with governor.slot(session_id, 100):
+            order.append(session_id)
+            await asyncio.sleep(0.001)
+
+    # 重度会话先排入大量请求，轻度会话随后到达
+    tasks = [asyncio.ensure_future(request("heavy")) for _ in range(5)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(request("light")))
+    await asyncio.gather(*tasks)
+
+    assert order.index("light") <= 2
+
+
+@pytest.mark.asyncio
+async def test_governor_corrects_tpm_from_claude_usage():
+    """测试Claude的输入、输出token数用于修正TPM令牌桶"""
+    class ClaudeLikeProvider(FakeProvider):
+        async def generate(self, messages, system_prompt=None, **kwargs):
+            return LLMResponse(content="ok", model=self.name, usage={"input_tokens": 30, "output_tokens": 20})
+
+    governor = LLMGovernor("claude", tpm=100000)
+    provider = GovernedLLMProvider(ClaudeLikeProvider("claude"), governor)
+    await provider.generate([Message(role="user", content="hi")], max_tokens=1000)
+
+    assert governor.get_stats()["total_tokens"] == 50
+    assert usage_total_tokens({"total_tokens": 7, "input_tokens": 1}) == 7
+    assert usage_total_tokens({}) is None
+
+
+@pytest.mark.asyncio
+async def test_governor_cache_hit_skips_slot(tmp_path):
+    """测试命中响应缓存的调用不经过治理器，未命中时只查询一次缓存"""
+    from k8s_diagnosis_agent.metrics import CACHE_LOOKUPS
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json=_completion("集群正常"))
+
+    governor = LLMGovernor("openai", max_in_flight=1)
+    provider = GovernedLLMProvider(_mock_openai_provider(tmp_path, handler), governor)
+    messages = [Message(role="user", content="检查集群")]
+    misses = CACHE_LOOKUPS.labels("llm_response", "miss")._value.get()
+
+    await provider.generate(messages, temperature=0.1)
+    assert CACHE_LOOKUPS.labels("llm_response", "miss")._value.get() == misses + 1
+    assert governor.get_stats()["total_granted"] == 1
+
+    # 槽位被占满时，命中缓存的调用仍立即返回
+    async with governor.slot("other", 1):
+        cached = await asyncio.wait_for(provider.generate(messages, temperature=0.1), timeout=0.5)
+    assert cached.metadata["cache_hit"] is True
+    assert len(calls) == 1
+    assert governor.get_stats()["total_granted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_governor_rpm_rate_limit():
+    """测试RPM令牌桶耗尽后需等待补充"""
+    governor = LLMGovernor("fake", rpm=600)  # 每0.1秒补充1个请求
+    governor._request_budget = 1
+
+    async with governor.slot("s", 1):
+        pass
+    started = asyncio.get_running_loop().time()
+    async with governor.slot("s", 1):
+        pass
+
+    assert asyncio.get_running_loop().time() - started >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_openai_parses_parallel_tool_calls(tmp_path):
+    """测试解析响应中的并行工具调用"""
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "id": "chatcmpl-2",
+            "model": "gpt-test",
+            "choices": [{"message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": "call_1", "type": "function",
+                     "function": {"name": "k8s_pod_info", "arguments": "{\"namespace\": \"prod\"}"}},
+                    {"id": "call_2", "type": "function",
+                     "function": {"name": "k8s_events", "arguments": "not json"}},
+                ],
+            }}],
+        })
+
+    provider = _mock_openai_provider(tmp_path, handler, response_cache_enabled=False)
+    tools = [{"type": "function", "function": {"name": "k8s_pod_info", "parameters": {}}}]
+    response = await provider.generate([Message(role="user", content="prod有什么问题")], tools=tools)
+
+    assert response.content == ""
+    assert [call.name for call in response.tool_calls] == ["k8s_pod_info", "k8s_events"]
+    assert response.tool_calls[0].arguments == {"namespace": "prod"}
+    assert response.tool_calls[1].arguments == {}
+    assert requests[0]["tools"] == tools
+
+    # 工具调用与工具结果可以回填到下一轮请求
+    follow_up = provider.format_messages([
+        Message(role="assistant", content="", tool_calls=response.tool_calls),
+        Message(role="tool", content="{}", tool_call_id="call_1"),
+    ])
+    assert follow_up[0]["tool_calls"][0]["function"]["arguments"] == "{\"namespace\": \"prod\"}"
+    assert follow_up[1]["tool_call_id"] == "call_1"
+
+
+@pytest.mark.asyncio
+async def test_instrumented_provider_records_latency_and_tokens():
+    """测试指标包装记录请求次数、耗时、token和失败"""
+    from k8s_diagnosis_agent.llm.instrumented import InstrumentedLLMProvider
+    from k8s_diagnosis_agent.metrics import REGISTRY, render_metrics
+
+    class UsageProvider(FakeProvider):
+        async def generate(self, messages, system_prompt=None, **kwargs):
+            response = await super().generate(messages, system_prompt, **kwargs)
+            response.usage = {"prompt_tokens": 12, "completion_tokens": 3}
+            return response
+
+    provider = InstrumentedLLMProvider(UsageProvider("metered"), "metered")
+    await provider.generate([Message(role="user", content="hi")])
+    failing = InstrumentedLLMProvider(FakeProvider("metered-down", fail=True), "metered-down")
+    with pytest.raises(Exception):
+        await failing.generate([Message(role="user", content="hi")])
+
+    sample = REGISTRY.get_sample_value
+    assert sample("k8s_agent_llm_requests_total", {"provider": "metered", "operation": "generate", "status": "success"}) == 1
+    assert sample("k8s_agent_llm_tokens_total", {"provider": "metered", "kind": "prompt"}) == 12
+    assert sample("k8s_agent_llm_request_seconds_count", {"provider": "metered", "operation": "generate"}) == 1
+    assert sample("k8s_agent_llm_requests_total",
+                  {"provider": "metered-down", "operation": "generate", "status": "error"}) == 1
+    assert b"k8s_agent_llm_tokens_total" in render_metrics()
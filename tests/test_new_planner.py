@@ -0,0 +1,186 @@
+"""
+AI计划器测试
+"""
+import pytest
+from k8s_diagnosis_agent.config import Config
+from k8s_diagnosis_agent.core.evidence import EvidenceStore
+from k8s_diagnosis_agent.core.planner import AIPlanner
+from k8s_diagnosis_agent.llm.base import BaseLLMProvider, LLMResponse, ToolCall
+from k8s_diagnosis_agent.tools.base import BaseTool, ToolResult, ToolStatus
+
+
+class ScriptedProvider(BaseLLMProvider):
+    """按预设脚本返回响应的测试提供者"""
+
+    def __init__(self, responses):
+        super().__init__({"model": "scripted"})
+        self.responses = list(responses)
+        self.requests = []
+
+    async def generate(self, messages, system_prompt=None, **kwargs):
+        self.requests.append({"messages": list(messages), "system_prompt": system_prompt, "kwargs": kwargs})
+        return self.responses.pop(0)
+
+    async def stream_generate(self, messages, system_prompt=None, **kwargs):
+        yield (await self.generate(messages, system_prompt, **kwargs)).content
+
+    async def embed(self, text):
+        raise NotImplementedError()
+
+    def supports_function_calling(self):
+        return True
+
+    def get_model_info(self):
+        return {"provider": "scripted", "model": "scripted"}
+
+
+class StaticRouter:
+    """所有场景都返回同一个提供者的路由器"""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def get_provider(self, call_site):
+        return self.provider
+
+
+@pytest.mark.asyncio
+async def test_function_calling_loop_runs_parallel_tool_calls():
+    """测试函数调用循环并行执行同一轮的工具调用并回填结果"""
+    provider = ScriptedProvider([
+        LLMResponse(content="", model="scripted", tool_calls=[
+            ToolCall(id="call_1", name="k8s_resource_usage", arguments={}),
+            ToolCall(id="call_2", name="diagnose_storage", arguments={}),
+        ]),
+        LLMResponse(content="存储和资源均无异常", model="scripted"),
+        LLMResponse(content="诊断总结", model="scripted"),
+    ])
+    planner = AIPlanner(Config(), StaticRouter(provider))
+
+    result = await planner.create_diagnosis_plan("检查存储", [])
+
+    assert result["plan"]["method"] == "function_calling"
+    assert result["plan"]["tasks_created"] == 2
+    assert result["plan"]["reasoning"] == "存储和资源均无异常"
+    tool_names = [planner.todo_manager.get_task(task_id).tool_name for task_id in result["plan"]["task_ids"]]
+    assert tool_names == ["k8s_resource_usage", "k8s_storage"]
+
+    # 第二轮请求包含助手的工具调用和两条工具结果
+    second_round = provider.requests[1]["messages"]
+    assert [msg.role for msg in second_round[-3:]] == ["assistant", "tool", "tool"]
+    assert "tools" in provider.requests[0]["kwargs"]
+
+
+@pytest.mark.asyncio
+async def test_function_calling_falls_back_to_text_planning():
+    """测试关闭原生函数调用时使用文本JSON规划"""
+    config = Config()
+    config.llm.native_tool_calling = False
+    provider = ScriptedProvider([
+        LLMResponse(content='```json\n{"tasks": [{"title": "t", "description": "d", '
+                            '"tool_name": "get_resource_usage", "tool_params": {}}]}\n```', model="scripted"),
+        LLMResponse(content="评估", model="scripted"),
+        LLMResponse(content="总结", model="scripted"),
+    ])
+    planner = AIPlanner(config, StaticRouter(provider))
+
+    result = await planner.create_diagnosis_plan("资源使用情况", [])
+
+    assert result["plan"]["method"] == "llm_planning"
+    task = planner.todo_manager.get_task(result["plan"]["task_ids"][0])
+    # schema中的函数名被解析为注册的工具
+    assert "metrics-server" in task.result.message
+
+
+class CountingPodTool(BaseTool):
+    """记录调用次数的Pod工具"""
+
+    calls = 0
+
+    async def execute(self, **kwargs):
+        CountingPodTool.calls += 1
+        return ToolResult(status=ToolStatus.SUCCESS, message="成功获取Pod信息",
+                          data={"pods": [{"name": "web-0", "phase": "Running"}, {"name": "web-1", "phase": "Pending"}]})
+
+    def get_schema(self):
+        return {"type": "function", "function": {"name": "get_pod_info", "description": "获取Pod详细信息",
+                                                 "parameters": {"type": "object", "properties": {}}}}
+
+
+@pytest.mark.asyncio
+async def test_follow_up_reuses_and_narrows_session_evidence():
+    """测试后续轮次复用会话证据，并从列表结果中收窄单个Pod"""
+    CountingPodTool.calls = 0
+    provider = ScriptedProvider([
+        LLMResponse(content="", model="scripted", tool_calls=[
+            ToolCall(id="call_1", name="k8s_pod_info", arguments={"namespace": "default"})]),
+        LLMResponse(content="web-1 处于Pending", model="scripted"),
+        LLMResponse(content="总结", model="scripted"),
+        LLMResponse(content="", model="scripted", tool_calls=[
+            ToolCall(id="call_2", name="k8s_pod_info", arguments={}),
+            ToolCall(id="call_3", name="k8s_pod_info", arguments={"pod_name": "web-1"})]),
+        LLMResponse(content="web-1 仍处于Pending", model="scripted"),
+        LLMResponse(content="总结", model="scripted"),
+    ])
+    planner = AIPlanner(Config(), StaticRouter(provider))
+    planner.tool_registry.register("k8s_pod_info", CountingPodTool)
+    evidence = EvidenceStore()
+
+    await planner.create_diagnosis_plan("pod状态如何", [], evidence)
+    result = await planner.create_diagnosis_plan("web-1呢？", [], evidence)
+
+    assert CountingPodTool.calls == 1
+    log = result["execution"]["execution_log"]
+    assert [entry["evidence"] for entry in log] == ["reused", "narrowed"]
+    narrowed = planner.todo_manager.get_task(log[1]["task_id"]).result
+    assert narrowed.data == {"pods": [{"name": "web-1", "phase": "Pending"}]}
+    assert "本会话已采集且仍新鲜的证据" in provider.requests[3]["system_prompt"]
+    assert "本会话已采集且仍新鲜的证据" not in provider.requests[0]["system_prompt"]
+
+
+def test_fork_isolates_turn_state():
+    """测试每轮规划器副本的任务和证据相互独立，共享工具注册表"""
+    planner = AIPlanner(Config(), StaticRouter(ScriptedProvider([])))
+    first, second = planner.fork(), planner.fork()
+    first.evidence_store = EvidenceStore()
+    first.conversation_history.append(object())
+
+    assert first.todo_manager is not second.todo_manager
+    assert second.evidence_store is None and second.conversation_history == []
+    assert planner.conversation_history == []
+    assert first.tool_registry is planner.tool_registry
+
+
+class ManyPodsTool(CountingPodTool):
+    """返回大量Pod的工具，结果会被归约"""
+
+    async def execute(self, **kwargs):
+        return ToolResult(status=ToolStatus.SUCCESS, message="成功获取Pod信息",
+                          data={"pods": [{"name": f"web-{i}", "phase": "Running"} for i in range(200)]})
+
+
+@pytest.mark.asyncio
+async def test_full_result_ref_resolves_after_turn_ends():
+    """测试归约结果的引用指向会话证据，单轮规划器副本丢弃后仍可取回完整结果"""
+    import re
+
+    config = Config()
+    config.llm.tool_result_token_budget = 100
+    provider = ScriptedProvider([
+        LLMResponse(content="", model="scripted", tool_calls=[
+            ToolCall(id="call_1", name="k8s_pod_info", arguments={})]),
+        LLMResponse(content="均在运行", model="scripted"),
+        LLMResponse(content="总结", model="scripted"),
+    ])
+    planner = AIPlanner(config, StaticRouter(provider))
+    planner.tool_registry.register("k8s_pod_info", ManyPodsTool)
+    evidence = EvidenceStore()
+
+    await planner.fork().create_diagnosis_plan("pod状态如何", [], evidence)
+
+    tool_message = provider.requests[1]["messages"][-1].content
+    ref = re.search(r"full_result_ref\W+([0-9a-f]{16})", tool_message).group(1)
+    assert ref == evidence.ref_for("k8s_pod_info", {})
+    assert len(evidence.resolve_ref(ref).result.data["pods"]) == 200
+    planner.evidence_store = evidence
+    assert planner.get_task_result(ref) is evidence.resolve_ref(ref).result
@@ -0,0 +1,319 @@
+"""
+会话管理测试
+"""
+import asyncio
+from datetime import datetime, timedelta
+from k8s_diagnosis_agent.config import Config
+from k8s_diagnosis_agent.core.session import SessionManager
+from k8s_diagnosis_agent.llm.base import Message
+from k8s_diagnosis_agent.tools.base import ToolResult, ToolStatus
+
+
+def test_expiry_heap_skips_active_sessions():
+    config = Config()
+    config.session_timeout = 60
+    manager = SessionManager(config)
+    idle = manager.create_session()
+    active = manager.create_session()
+
+    past = datetime.now() - timedelta(seconds=120)
+    manager.sessions[idle].last_activity = past
+    manager.sessions[active].last_activity = past
+    manager.sessions[active].add_message(Message(role="user", content="还在"))
+    # 让两个堆条目都到期，活跃会话应按实际活动时间重新入堆
+    manager._expiry_heap = [(0, session_id) for _, session_id in manager._expiry_heap]
+
+    assert manager.cleanup_expired_sessions() == 1
+    assert manager.get_all_sessions() == [active]
+    assert len(manager._expiry_heap) == 1
+
+
+def test_lru_eviction_by_count_and_bytes():
+    config = Config()
+    config.session_max_count = 3
+    config.session_max_bytes = 0
+    manager = SessionManager(config)
+    ids = [manager.create_session() for _ in range(3)]
+    manager.get_session(ids[0])
+    manager.create_session()
+    assert ids[1] not in manager.get_all_sessions()
+    assert ids[0] in manager.get_all_sessions()
+
+    config.session_max_bytes = 5000
+    session = manager.get_session(ids[0])
+    session.add_message(Message(role="user", content="x" * 1000))
+    session.evidence.put("k8s_pod_info", {}, ToolResult(status=ToolStatus.SUCCESS, data={"pods": ["y" * 3000]}))
+    assert session.size_bytes > 4000
+    newest = manager.create_session()
+    manager.get_session(ids[0])
+    manager.get_session(newest).add_message(Message(role="user", content="z" * 2000))
+    manager.enforce_limits()
+
+    stats = manager.get_stats()
+    assert stats["total_bytes"] <= 5000
+    assert manager.get_all_sessions() == [newest]
+    assert stats["evicted"] == 4
+
+
+async def test_background_cleanup_task():
+    config = Config()
+    config.session_timeout = 0
+    config.session_cleanup_interval = 0.01
+    manager = SessionManager(config)
+    manager.create_session()
+    manager.start()
+    await asyncio.sleep(0.05)
+    assert manager.get_stats()["cleanup_running"]
+    await manager.stop()
+    assert manager.get_session_count() == 0
+    assert manager.get_stats()["expired"] == 1
+
+
+async def test_sqlite_backend_survives_restart(tmp_path):
+    from k8s_diagnosis_agent.core.session_store import SQLiteSessionBackend
+
+    config = Config()
+    path = str(tmp_path / "sessions.db")
+    backend = SQLiteSessionBackend(path, flush_interval=0.01)
+    manager = SessionManager(config, backend)
+    manager.start()
+    session_id = manager.create_session()
+    session = manager.get_session(session_id)
+    session.add_message(Message(role="user", content="节点NotReady"))
+    session.add_message(Message(role="assistant", content="检查kubelet"))
+    # 写操作先进入缓冲区，由后台任务刷写
+    assert backend.get_stats()["pending_ops"] == 3
+    await asyncio.sleep(0.05)
+    assert backend.get_stats()["pending_ops"] == 0
+    session.fold_messages(1, "用户询问节点NotReady")
+    await manager.stop()
+
+    restarted = SessionManager(config, SQLiteSessionBackend(path))
+    assert restarted.get_session_count() == 0
+    assert restarted.get_all_sessions() == [session_id]
+    loaded = restarted.get_session(session_id)
+    # 已折叠的消息不再加载
+    assert [message.content for message in loaded.messages] == ["检查kubelet"]
+    assert loaded.summary == "用户询问节点NotReady" and loaded.archived_count == 1
+    assert restarted.get_stats()["loaded"] == 1
+    loaded.add_message(Message(role="user", content="继续"))
+    assert [m.content for m in restarted.backend.load_session(session_id)["messages"]] == ["检查kubelet", "继续"]
+    restarted.remove_session(session_id)
+    assert restarted.get_all_sessions() == []
+    await restarted.stop()
+
+
+async def test_sqlite_reads_and_cleanup_run_off_the_event_loop(tmp_path):
+    import threading
+    from k8s_diagnosis_agent.core.session_store import SQLiteSessionBackend
+
+    config = Config()
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+    manager = SessionManager(config, backend)
+    session_id = manager.create_session()
+    manager.get_session(session_id).add_message(Message(role="user", content="节点NotReady"))
+    manager.sessions.clear()
+
+    flush_threads = []
+    original_flush = backend.flush
+
+    def recording_flush():
+        flush_threads.append(threading.current_thread())
+        original_flush()
+
+    backend.flush = recording_flush
+    loaded = await manager.get_session_async(session_id)
+    assert [message.content for message in loaded.messages] == ["节点NotReady"]
+    assert await manager.get_all_sessions_async() == [session_id]
+    assert await manager.cleanup_expired_sessions_async() == 0
+    assert len(flush_threads) == 3
+    assert threading.main_thread() not in flush_threads
+    await manager.stop()
+
+
+def test_sqlite_delete_expired_rolls_back_on_failure(tmp_path):
+    import sqlite3
+    import pytest
+    from k8s_diagnosis_agent.core.session_store import SQLiteSessionBackend
+
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), write_behind=False)
+    backend.save_session("s1", 0.0, 0.0, {})
+    backend._conn.execute(
+        "CREATE TRIGGER busy BEFORE DELETE ON sessions BEGIN SELECT RAISE(ABORT, 'busy'); END"
+    )
+    with pytest.raises(sqlite3.DatabaseError):
+        backend.delete_expired(1.0)
+    # 失败的事务已回滚，后续写入不受影响
+    assert not backend._conn.in_transaction
+    backend._conn.execute("DROP TRIGGER busy")
+    backend.append_message("s1", 0, Message(role="user", content="继续"), 1.0)
+    assert [m.content for m in backend.load_session("s1")["messages"]] == ["继续"]
+
+
+async def test_redis_backend_shares_sessions_between_replicas():
+    from k8s_diagnosis_agent.core.session_store import InProcessRedis, RedisSessionBackend
+
+    config = Config()
+    config.session_revalidate_interval = 0
+    redis = InProcessRedis()
+    replica_a = SessionManager(config, RedisSessionBackend(client=redis))
+    replica_b = SessionManager(config, RedisSessionBackend(client=redis))
+
+    session_id = replica_a.create_session()
+    session = replica_a.get_session(session_id)
+    session.add_message(Message(role="user", content="pod状态如何"))
+    session.evidence.put("k8s_pod_info", {}, ToolResult(status=ToolStatus.SUCCESS, data={"pods": [{"name": "web-0"}]}))
+    await replica_a.flush()
+
+    # 下一轮落到另一个副本：消息和仍新鲜的证据都可见
+    other = replica_b.get_session(session_id)
+    assert [message.content for message in other.messages] == ["pod状态如何"]
+    reused, mode = other.evidence.get("k8s_pod_info", {"namespace": "default"})
+    assert mode == "reused" and reused.data == {"pods": [{"name": "web-0"}]}
+    other.add_message(Message(role="user", content="web-0呢"))
+    await replica_b.flush()
+
+    # 回到原副本时发现缓存落后并重新加载
+    assert len(replica_a.get_session(session_id).messages) == 2
+    replica_b.remove_session(session_id)
+    await replica_b.flush()
+    assert replica_a.get_session(session_id) is None
+    assert redis.zrange("k8s-diagnosis-agent:sessions", 0, -1) == []
+
+
+def test_redis_load_skips_archived_messages():
+    from k8s_diagnosis_agent.core.session_store import InProcessRedis, RedisSessionBackend
+
+    redis = InProcessRedis()
+    backend = RedisSessionBackend(client=redis, write_behind=False)
+    backend.save_session("s1", 0.0, 0.0, {})
+    for seq, content in enumerate(["a", "b", "c"]):
+        backend.append_message("s1", seq, Message(role="user", content=content), 0.0)
+    backend.save_summary("s1", "a、b", 2)
+
+    ranges = []
+    original_lrange = redis.lrange
+    redis.lrange = lambda name, start, end: ranges.append(start) or original_lrange(name, start, end)
+    loaded = backend.load_session("s1")
+    # 只读取未折叠的消息
+    assert ranges == [2]
+    assert [message.content for message in loaded["messages"]] == ["c"]
+    assert loaded["summary"] == "a、b"
+
+
+async def test_redis_revalidation_is_periodic_and_evidence_is_trimmed():
+    from k8s_diagnosis_agent.core.session_store import InProcessRedis, RedisSessionBackend
+
+    config = Config()
+    config.session_revalidate_interval = 60
+    redis = InProcessRedis()
+    backend = RedisSessionBackend(client=redis, evidence_max_entries=2)
+    manager = SessionManager(config, backend)
+    session_id = manager.create_session()
+    session = await manager.get_session_async(session_id)
+
+    counts = []
+    original_count = backend.message_count
+    backend.message_count = lambda sid: counts.append(sid) or original_count(sid)
+    for _ in range(3):
+        assert await manager.get_session_async(session_id) is session
+    # 间隔内不再逐轮核对
+    assert counts == []
+
+    for name in ("web-0", "web-1", "web-2"):
+        session.evidence.put("k8s_pod_info", {"pod_name": name}, ToolResult(status=ToolStatus.SUCCESS, data={}))
+    session.evidence.put("k8s_logs", {"pod_name": "web-0"}, ToolResult(status=ToolStatus.SUCCESS, data="log"))
+    await manager.flush()
+
+    stored = backend.load_evidence(session_id)
+    # 超出上限时保留最晚过期的证据
+    assert len(stored) == 2
+    assert all(key.startswith("k8s_pod_info") for key in stored)
+    await manager.stop()
+
+
+async def test_turns_serialize_per_session_and_run_in_parallel_across_sessions():
+    manager = SessionManager(Config())
+    first, second = manager.create_session(), manager.create_session()
+    order = []
+
+    async def turn(session_id, name, delay):
+        async with manager.turn(session_id):
+            order.append(f"{name}-start")
+            await asyncio.sleep(delay)
+            order.append(f"{name}-end")
+
+    tasks = [
+        asyncio.create_task(turn(first, "a1", 0.05)),
+        asyncio.create_task(turn(first, "a2", 0)),
+        asyncio.create_task(turn(second, "b1", 0)),
+    ]
+    await asyncio.sleep(0.01)
+    assert manager.get_queued_turns(first) == 1
+    assert manager.get_queued_turns(second) == 0
+    await asyncio.gather(*tasks)
+
+    # a2 等待 a1 结束；b1 不受 first 会话影响
+    assert order.index("a2-start") > order.index("a1-end")
+    assert order.index("b1-end") < order.index("a1-end")
+    assert manager.get_stats()["active_turns"] == 0
+
+
+class SummaryRouter:
+    """memory_summary 场景返回固定摘要的路由器"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.prompts = []
+
+    def get_provider(self, call_site):
+        router = self
+
+        class Provider:
+            async def generate(self, messages, system_prompt=None, **kwargs):
+                from k8s_diagnosis_agent.llm.base import LLMResponse
+                router.prompts.append(messages[0].content)
+                if router.fail:
+                    raise RuntimeError("unavailable")
+                return LLMResponse(content=f"摘要{len(router.prompts)}", model="cheap")
+
+        return Provider()
+
+
+async def test_rolling_summary_keeps_session_flat():
+    from k8s_diagnosis_agent.core.summarizer import SessionSummarizer
+
+    config = Config()
+    config.summary_token_threshold = 400
+    config.summary_keep_messages = 4
+    router = SummaryRouter()
+    summarizer = SessionSummarizer(config, router)
+    manager = SessionManager(config)
+    session = manager.get_session(manager.create_session())
+
+    sizes = []
+    for turn in range(30):
+        session.add_message(Message(role="user", content=f"第{turn}轮: 节点 node-{turn} 状态如何？" * 5))
+        session.add_message(Message(role="assistant", content=f"node-{turn} 出现 MemoryPressure" * 5))
+        task = summarizer.maybe_schedule(session)
+        if task is not None:
+            await task
+        sizes.append(session.message_bytes)
+
+    assert len(session.messages) <= 6
+    assert max(sizes[10:]) <= max(sizes[:10]) * 1.1
+    assert session.summary == f"摘要{len(router.prompts)}"
+    # 上一份摘要作为下一次摘要的输入
+    assert "摘要1" in router.prompts[1]
+    context = session.get_context_messages()
+    assert context[0].role == "system" and session.summary in context[0].content
+    archived = session.get_archived_messages()
+    assert len(archived) + len(session.messages) == 60
+    assert archived[0].content.startswith("第0轮")
+    assert session.archive_bytes < sum(len(m.json()) for m in archived) / 3
+
+    # 模型不可用时退回抽取式摘要
+    router.fail = True
+    session.add_message(Message(role="user", content="x" * 2000))
+    assert await summarizer.summarize(session)
+    assert summarizer.get_stats()["fallbacks"] == 1
@@ -0,0 +1,40 @@
+"""
+启动与导入开销测试
+"""
+import sys
+import json
+import subprocess
+
+# 导入CLI和Web应用的耗时上限（秒），本地约0.3秒，留足CI余量
+IMPORT_BUDGET = 3.0
+
+
+def test_import_does_not_load_heavy_modules_or_create_agent():
+    code = (
+        "import sys, json, time\n"
+        "started = time.perf_counter()\n"
+        "import k8s_diagnosis_agent.cli, k8s_diagnosis_agent.web.app\n"
+        "elapsed = time.perf_counter() - started\n"
+        "from k8s_diagnosis_agent.web import api\n"
+        "heavy = ['kubernetes', 'psutil', 'langchain', 'httpx', 'k8s_diagnosis_agent.core.agent']\n"
+        "print(json.dumps({'loaded': [m for m in heavy if m in sys.modules], 'agent': api._agent is not None,"
+        " 'elapsed': elapsed}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, timeout=60
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["loaded"] == []
+    assert result["agent"] is False
+    assert result["elapsed"] < IMPORT_BUDGET
+
+
+def test_lazy_exports_resolve():
+    import k8s_diagnosis_agent
+    from k8s_diagnosis_agent.core.agent import Agent
+    from k8s_diagnosis_agent.llm import LLMFactory
+    from k8s_diagnosis_agent.llm.factory import LLMFactory as factory_cls
+
+    assert k8s_diagnosis_agent.Agent is Agent
+    assert LLMFactory is factory_cls
@@ -0,0 +1,340 @@
+"""
+工具结果处理测试
+"""
+import time
+import asyncio
+from k8s_diagnosis_agent.llm.tokens import estimate_json_tokens
+from k8s_diagnosis_agent.tools.base import BaseTool, ToolResult, ToolStatus
+from k8s_diagnosis_agent.tools.reducers import ResultReducerRegistry
+from k8s_diagnosis_agent.tools.registry import ToolRegistry
+from k8s_diagnosis_agent.tools.render import render_compact
+from k8s_diagnosis_agent.tools.retriever import ToolRetriever
+
+
+def _pod(name, phase="Running", ready="True"):
+    return {
+        "name": name,
+        "namespace": "default",
+        "labels": {"app": "web"},
+        "annotations": {"note": "x" * 200},
+        "node_name": "node-1",
+        "phase": phase,
+        "conditions": {"Ready": {"status": ready, "reason": None, "message": None}},
+        "containers": [{"name": "app", "image": "nginx:1.25"}],
+    }
+
+
+def _node(name, ready="True", memory_pressure="False"):
+    return {
+        "name": name,
+        "labels": {},
+        "annotations": {},
+        "status": {
+            "conditions": {
+                "Ready": {"status": ready, "reason": None, "message": None},
+                "MemoryPressure": {"status": memory_pressure, "reason": None, "message": None},
+            },
+            "node_info": {"kubelet_version": "v1.28.2"},
+            "capacity": {"cpu": "4"},
+            "allocatable": {"cpu": "4"},
+        },
+    }
+
+
+def test_pod_reducer_keeps_unhealthy_detail():
+    pods = [_pod(f"web-{i}") for i in range(300)]
+    pods.append(_pod("web-crash", phase="Running", ready="False"))
+    pods.append(_pod("web-pending", phase="Pending", ready="False"))
+    result = ToolResult(status=ToolStatus.SUCCESS, data={"pods": pods}, message="ok")
+
+    reduced = ResultReducerRegistry(default_budget=1500).reduce("k8s_pod_info", result, ref="task-1")
+
+    assert reduced["reduced"] is True
+    assert reduced["full_result_ref"] == "task-1"
+    assert reduced["data"]["total"] == 302
+    assert reduced["data"]["by_phase"] == {"Running": 301, "Pending": 1}
+    assert [pod["name"] for pod in reduced["data"]["unhealthy"]] == ["web-crash", "web-pending"]
+    assert estimate_json_tokens(reduced["data"]) <= 1500
+    # 原始结果不被修改
+    assert len(result.data["pods"]) == 302
+
+
+def test_node_reducer_histogram_and_outliers():
+    nodes = [_node(f"node-{i}") for i in range(50)]
+    nodes.append(_node("node-bad", ready="False"))
+    nodes.append(_node("node-mem", memory_pressure="True"))
+    result = ToolResult(status=ToolStatus.SUCCESS, data={"nodes": nodes}, message="ok")
+
+    data = ResultReducerRegistry(default_budget=500).reduce("k8s_node_info", result)["data"]
+
+    assert data["condition_histogram"]["Ready"] == {"True": 51, "False": 1}
+    assert data["condition_histogram"]["MemoryPressure"] == {"False": 51, "True": 1}
+    assert [node["name"] for node in data["outliers"]] == ["node-bad", "node-mem"]
+
+
+def test_small_results_pass_through_and_budget_overrides():
+    small = ToolResult(status=ToolStatus.SUCCESS, data={"pods": [_pod("web-0")]}, message="ok")
+    reduced = ResultReducerRegistry().reduce("k8s_pod_info", small, ref="task-1")
+    assert reduced["data"] == small.data
+    assert "full_result_ref" not in reduced
+
+    logs = "\n".join(f"line {i}" for i in range(5000)) + "\nERROR boom"
+    result = ToolResult(status=ToolStatus.SUCCESS, data={"pod_name": "web-0", "logs": logs}, message="ok")
+    registry = ResultReducerRegistry(default_budget=2000, budgets={"k8s_logs": 300})
+    data = registry.reduce("k8s_logs", result)["data"]
+    assert data["error_lines"] == ["ERROR boom"]
+    assert data["tail"][-1] == "ERROR boom"
+    assert estimate_json_tokens(data) <= 300
+
+    generic = ToolResult(status=ToolStatus.SUCCESS, data={"items": list(range(5000))}, message="ok")
+    data = registry.reduce("filesystem", generic)["data"]
+    assert data["items_omitted"] > 0
+    assert estimate_json_tokens(data) <= 2000
+
+
+def test_render_compact_tables_and_dictionary():
+    pods = [
+        {"name": f"web-{i}", "namespace": "default", "node_name": f"worker-node-{i % 2}",
+         "phase": "Running", "annotations": {}, "reason": None,
+         "containers": [{"name": "app", "image": "registry.local/web:1.2.3"}]}
+        for i in range(4)
+    ]
+    text = render_compact({"pods": pods, "message": "a|b"})
+
+    assert "$1=registry.local/web:1.2.3" in text
+    assert "共同值: namespace=default phase=Running containers=name=app,image=$1" in text
+    assert "name|node_name" in text
+    assert "web-0|$2" in text
+    assert "annotations" not in text and "reason" not in text
+    assert "message: a|b" in text
+
+
+def test_tool_retriever_ranks_and_tracks_registry():
+    registry = ToolRegistry()
+    retriever = ToolRetriever(registry, top_k=4)
+
+    selected = retriever.retrieve("为什么pod一直CrashLoopBackOff")
+    assert len(selected) == 4
+    assert selected[:2] == ["k8s_pod_info", "k8s_logs"]
+    assert retriever.retrieve("pvc挂载失败")[0] == "k8s_storage"
+
+    class HelmReleaseTool(BaseTool):
+        async def execute(self, **kwargs):
+            return ToolResult(status=ToolStatus.SUCCESS)
+
+        def get_schema(self):
+            return {"type": "function", "function": {
+                "name": "get_helm_release", "description": "查询Helm release状态",
+                "parameters": {"type": "object", "properties": {}}}}
+
+    registry.register("helm_release", HelmReleaseTool)
+    assert retriever.retrieve("helm release 升级失败")[0] == "helm_release"
+    assert registry.resolve_tool_name("get_helm_release") == "helm_release"
+    assert registry.get_function_schemas(["helm_release"])[0]["function"]["name"] == "helm_release"
+    assert len(retriever.retrieve("你好", top_k=0)) == len(registry.get_all_tools())
+
+
+class ChangingPodTool(BaseTool):
+    """每次返回不同Pod列表的工具"""
+
+    delta_keys = {"pods": ("namespace", "name")}
+    snapshots = []
+
+    async def execute(self, **kwargs):
+        return ToolResult(status=ToolStatus.SUCCESS, message="成功获取Pod信息",
+                          data={"pods": ChangingPodTool.snapshots.pop(0)})
+
+    def get_schema(self):
+        return {}
+
+
+async def test_repeated_call_forwards_only_delta():
+    from k8s_diagnosis_agent.core.evidence import EvidenceStore, execute_with_evidence
+    from k8s_diagnosis_agent.tools.delta import diff_objects
+
+    before = [_pod(f"web-{i}") for i in range(50)]
+    after = [_pod(f"web-{i}") for i in range(1, 50)] + [_pod("web-new", phase="Pending", ready="False")]
+    after[0] = _pod("web-1", ready="False")
+    delta = diff_objects(before, after, ("namespace", "name"))
+    assert [pod["name"] for pod in delta["added"]] == ["web-new"]
+    assert delta["removed"] == ["default/web-0"]
+    assert delta["changed"] == [{"id": "default/web-1", "changes": {"conditions.Ready.status": ["True", "False"]}}]
+    assert delta["unchanged_count"] == 48
+
+    # 新鲜期为0，第二次调用重新执行并附带增量
+    ChangingPodTool.snapshots = [before, after]
+    store = EvidenceStore(ttls={"k8s_pod_info": 0})
+    first = await execute_with_evidence("k8s_pod_info", {}, ChangingPodTool, store)
+    assert "delta" not in first.metadata
+    second = await execute_with_evidence("k8s_pod_info", {}, ChangingPodTool, store)
+    assert second.data == {"pods": after}
+    assert second.metadata["delta"]["pods"]["unchanged_count"] == 48
+
+    reduced = ResultReducerRegistry().reduce("k8s_pod_info", second)
+    assert reduced["data"]["pods"]["removed"] == ["default/web-0"]
+    assert "delta_since_seconds" in reduced
+    assert estimate_json_tokens(reduced["data"]) < estimate_json_tokens({"pods": after}) / 5
+
+
+async def test_same_turn_reuse_keeps_delta_in_final_context():
+    from k8s_diagnosis_agent.config import Config
+    from k8s_diagnosis_agent.core.agent import Agent
+    from k8s_diagnosis_agent.core.evidence import EvidenceStore, execute_with_evidence
+    from k8s_diagnosis_agent.core.planner import DiagnosisPlan
+    from k8s_diagnosis_agent.llm.base import Message
+
+    before = [_pod(f"web-{i}") for i in range(50)]
+    after = [_pod(f"web-{i}") for i in range(1, 50)] + [_pod("web-new", phase="Pending", ready="False")]
+    ChangingPodTool.snapshots = [before, after]
+    store = EvidenceStore(ttls={"k8s_pod_info": 0.3})
+    agent = Agent(Config())
+
+    store.begin_turn()
+    await execute_with_evidence("k8s_pod_info", {}, ChangingPodTool, store)
+    await asyncio.sleep(0.35)
+
+    # 下一轮：规划器重新执行得到增量，执行器在同一轮内复用该结果
+    store.begin_turn()
+    planned = await execute_with_evidence("k8s_pod_info", {}, ChangingPodTool, store)
+    assert "delta" in planned.metadata
+    results = [item async for item in agent.executor.execute_plan(DiagnosisPlan([{"tool": "k8s_pod_info"}]), store)]
+    assert results[0]["result"]["metadata"]["evidence"] == "reused"
+    assert results[0]["result"]["metadata"]["delta"]["pods"]["unchanged_count"] == 49
+
+    context = agent._build_context([Message(role="user", content="pod有什么变化")], results)
+    packed = "\n".join(message.content for message in context["messages"])
+    assert "秒前结果的增量" in packed
+    assert "web-new" in packed and "web-30" not in packed
+
+    # 之后的轮次复用时不再附带增量
+    store.begin_turn()
+    reused, _ = store.get("k8s_pod_info", {})
+    assert "delta" not in reused.metadata
+
+
+class SlowEchoTool(BaseTool):
+    """按参数延迟返回的工具，记录实例数和调用"""
+    instances = 0
+    calls = []
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        SlowEchoTool.instances += 1
+
+    async def execute(self, **kwargs):
+        SlowEchoTool.calls.append(kwargs)
+        await asyncio.sleep(kwargs.get("delay", 0))
+        return ToolResult(status=ToolStatus.SUCCESS, message="ok", data=kwargs)
+
+    def get_schema(self):
+        return {}
+
+
+async def test_batch_runs_concurrently_in_request_order():
+    from k8s_diagnosis_agent.config import Config
+    from k8s_diagnosis_agent.core.executor import Executor
+    from k8s_diagnosis_agent.tools.registry import tool_registry
+
+    tool_registry.register("slow_echo", SlowEchoTool)
+    # schema在首次使用时生成，生成时创建的实例不计入批次
+    tool_registry.get_tool_schemas(["slow_echo"])
+    registered_instances = SlowEchoTool.instances
+    try:
+        invocations = [
+            {"tool_name": "slow_echo", "params": {"delay": 0.05, "n": 1}},
+            {"tool_name": "slow_echo", "params": {"delay": 0.01, "n": 2}},
+            {"tool_name": "missing_tool", "params": {}},
+            {"tool_name": "slow_echo", "params": {"n": 2, "delay": 0.01}},
+        ]
+        started = time.perf_counter()
+        results = [item async for item in Executor(Config()).execute_batch(invocations, max_concurrency=4)]
+        elapsed = time.perf_counter() - started
+    finally:
+        tool_registry.unregister("slow_echo")
+
+    assert [item["index"] for item in results] == [0, 1, 2, 3]
+    assert [item["success"] for item in results] == [True, True, False, True]
+    assert results[0]["result"]["data"]["n"] == 1
+    # 相同调用只执行一次，同一工具共用一个实例
+    assert len(SlowEchoTool.calls) == 2
+    assert SlowEchoTool.instances == registered_instances + 1
+    assert results[3]["result"]["data"] == results[1]["result"]["data"]
+    assert elapsed < 0.06
+
+
+async def test_configured_tool_instances_are_shared_across_calls():
+    from k8s_diagnosis_agent.config import Config
+    from k8s_diagnosis_agent.core.executor import Executor
+    from k8s_diagnosis_agent.tools.registry import tool_registry
+
+    tool_registry.register("slow_echo_shared", SlowEchoTool)
+    created = SlowEchoTool.instances
+    try:
+        executor = Executor(Config())
+        invocations = [{"tool_name": "slow_echo_shared", "params": {"n": 1}}]
+        for _ in range(2):
+            assert [item["success"] async for item in executor.execute_batch(invocations)] == [True]
+        assert (await executor.execute_single_tool("slow_echo_shared", n=2))["success"]
+        # 批次之间和单个调用共用同一个已配置的实例
+        assert SlowEchoTool.instances == created + 1
+        config = Config().kubernetes.__dict__
+        assert tool_registry.get_tool("slow_echo_shared", config) is tool_registry.get_tool("slow_echo_shared")
+        assert tool_registry.get_tool("slow_echo_shared", {**config, "namespace": "other"}) is not \
+            tool_registry.get_tool("slow_echo_shared", config)
+    finally:
+        tool_registry.unregister("slow_echo_shared")
+
+
+def test_register_does_not_construct_tools():
+    class ConfiguredOnlyTool(SlowEchoTool):
+        def __init__(self, config=None):
+            if config is None:
+                raise RuntimeError("需要配置")
+            super().__init__(config)
+
+        def get_schema(self):
+            return {"type": "function", "function": {"name": "configured_only", "parameters": {}}}
+
+    registry = ToolRegistry()
+    registry.register("configured_only", ConfiguredOnlyTool)
+    assert "configured_only" in registry.get_all_tools()
+    # 已有配置好的实例时，schema由该实例生成
+    registry.get_tool("configured_only", {"namespace": "default"})
+    assert registry.resolve_tool_name("configured_only") == "configured_only"
+    assert registry.get_function_schemas(["configured_only"])[0]["function"]["name"] == "configured_only"
+
+
+async def test_tool_run_records_metrics_by_registered_name():
+    from k8s_diagnosis_agent.metrics import REGISTRY
+    from k8s_diagnosis_agent.tools.registry import ToolRegistry
+
+    registry = ToolRegistry()
+    registry.register("slow_echo_metrics", SlowEchoTool)
+    tool = registry.get_tool("slow_echo_metrics")
+    await tool.run(n=1)
+    await tool.run(n=2)
+
+    labels = {"tool": "slow_echo_metrics"}
+    assert REGISTRY.get_sample_value("k8s_agent_tool_seconds_count", labels) == 2
+    assert REGISTRY.get_sample_value("k8s_agent_tool_calls_total", {**labels, "status": "success"}) == 2
+
+
+async def test_k8s_client_is_initialized_once_off_the_event_loop():
+    import threading
+    from k8s_diagnosis_agent.tools.k8s_tools import KubernetesPodInfoTool
+
+    calls = []
+
+    class CountingPodTool(KubernetesPodInfoTool):
+        def _create_clients(self):
+            calls.append(threading.current_thread())
+            time.sleep(0.02)
+            return {"v1": object(), "apps_v1": object(), "networking_v1": object(), "version_api": object()}
+
+    tool = CountingPodTool()
+    await asyncio.gather(*(tool._init_k8s_client() for _ in range(5)))
+    v1 = tool.v1
+    await tool._init_k8s_client()
+
+    assert len(calls) == 1 and calls[0] is not threading.main_thread()
+    assert tool.v1 is v1
@@ -0,0 +1,40 @@
+"""
+链路追踪测试
+"""
+import json
+import asyncio
+from k8s_diagnosis_agent import tracing
+from k8s_diagnosis_agent.tracing import JsonlSpanExporter, start_span, get_trace_id
+
+
+async def test_spans_propagate_across_tasks_and_threads(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.set_exporter(JsonlSpanExporter(str(path), service_name="test"))
+    try:
+        async def child(name):
+            with start_span(name):
+                await asyncio.sleep(0)
+                return await asyncio.to_thread(get_trace_id)
+
+        with start_span("root", session_id="s1") as root:
+            thread_trace_ids = await asyncio.gather(child("a"), child("b"))
+        try:
+            with start_span("failing"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    finally:
+        tracing.set_exporter(None)
+
+    assert thread_trace_ids == [root.trace_id, root.trace_id]
+    assert get_trace_id() is None
+
+    batches = [json.loads(line) for line in path.read_text().splitlines()]
+    spans = [span for batch in batches for span in batch["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+    by_name = {span["name"]: span for span in spans}
+    assert by_name["a"]["parentSpanId"] == by_name["root"]["spanId"]
+    assert by_name["b"]["traceId"] == by_name["root"]["traceId"]
+    assert "parentSpanId" not in by_name["root"]
+    assert {"key": "session_id", "value": {"stringValue": "s1"}} in by_name["root"]["attributes"]
+    assert by_name["failing"]["status"] == {"code": 2, "message": "boom"}
+    assert by_name["failing"]["traceId"] != by_name["root"]["traceId"]
@@ -0,0 +1,296 @@
+"""
+Web层测试
+"""
+import asyncio
+from k8s_diagnosis_agent.web.streaming import format_sse, sse_events
+
+
+class FakeRequest:
+    """在读取指定条数事件后断开的请求"""
+
+    def __init__(self, disconnect_after=None):
+        self.disconnect_after = disconnect_after
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.disconnect_after is not None and self.checks > self.disconnect_after
+
+
+def test_format_sse_multiline_and_ids():
+    text = format_sse("第一行\n第二行", event="response_chunk", event_id=3)
+    assert text == "id: 3\nevent: response_chunk\ndata: 第一行\ndata: 第二行\n\n"
+    assert format_sse({"a": 1}) == 'data: {"a": 1}\n\n'
+
+
+async def test_sse_heartbeats_and_ids():
+    async def source():
+        yield {"type": "execution_step", "data": 1}
+        await asyncio.sleep(0.05)
+        yield {"type": "response_complete", "data": 2}
+
+    chunks = [chunk async for chunk in sse_events(FakeRequest(), source(), heartbeat_interval=0.01)]
+    assert chunks[0].startswith("event: open\nretry: 3000")
+    assert chunks[1].startswith("id: 1\nevent: execution_step")
+    assert ": heartbeat\n\n" in chunks
+    assert chunks[-1].startswith("id: 2\nevent: response_complete")
+
+
+async def test_sse_disconnect_cancels_source():
+    state = {"cancelled": False}
+
+    async def source():
+        yield {"type": "execution_step", "data": 1}
+        try:
+            # 模拟正在执行的工具或LLM流
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        yield {"type": "response_complete", "data": 2}
+
+    request = FakeRequest(disconnect_after=1)
+    chunks = [chunk async for chunk in sse_events(request, source(), heartbeat_interval=0.01)]
+    assert state["cancelled"]
+    assert not any("response_complete" in chunk for chunk in chunks)
+
+
+class FakeWebSocket:
+    """按队列收发文本帧的WebSocket"""
+
+    def __init__(self):
+        self.inbound = asyncio.Queue()
+        self.sent = []
+
+    async def receive_text(self):
+        from fastapi import WebSocketDisconnect
+        text = await self.inbound.get()
+        if text is None:
+            raise WebSocketDisconnect()
+        return text
+
+    async def send_text(self, text):
+        import json
+        self.sent.append(json.loads(text))
+
+    def frames(self, stream_id):
+        return [frame for frame in self.sent if frame[0] == stream_id]
+
+
+async def test_websocket_multiplexes_streams_with_credits_and_cancel():
+    import json
+    from k8s_diagnosis_agent.web.ws import StreamMultiplexer
+
+    cancelled = []
+
+    async def source(params):
+        try:
+            for i in range(3):
+                yield {"type": "response_chunk", "data": f"{params['message']}-{i}"}
+                await asyncio.sleep(0 if params["message"] != "slow" else 10)
+            yield {"type": "response_complete", "data": {"content": "ok"}, "session_id": "s1"}
+        except asyncio.CancelledError:
+            cancelled.append(params["message"])
+            raise
+
+    ws = FakeWebSocket()
+    multiplexer = StreamMultiplexer(ws, source)
+    runner = asyncio.create_task(multiplexer.run())
+    await ws.inbound.put(json.dumps(["open", "a", {"message": "pods", "credits": 1}]))
+    await ws.inbound.put(json.dumps(["open", "b", {"message": "nodes"}]))
+    await ws.inbound.put(json.dumps(["open", "c", {"message": "slow"}]))
+    await asyncio.sleep(0.05)
+
+    # a 只有一个额度，只发送了第一帧；b 不受影响已完成
+    assert ws.frames("a") == [["a", 1, "c", "pods-0"]]
+    assert ws.frames("b")[-2:] == [["b", 4, "d", {"content": "ok", "session_id": "s1"}], ["b", 5, "x", "done"]]
+
+    await ws.inbound.put(json.dumps(["credit", "a", 10]))
+    await ws.inbound.put(json.dumps(["cancel", "c"]))
+    await asyncio.sleep(0.05)
+    assert [frame[2] for frame in ws.frames("a")] == ["c", "c", "c", "d", "x"]
+    assert ws.frames("c")[-1] == ["c", 2, "x", "cancelled"]
+    assert cancelled == ["slow"]
+
+    await ws.inbound.put(json.dumps(["open", "a"]))
+    await ws.inbound.put(None)
+    await runner
+    assert ws.frames("a")[-1][2] == "e"
+
+
+async def test_websocket_malformed_frames_do_not_drop_the_connection():
+    import json
+    from k8s_diagnosis_agent.web.ws import StreamMultiplexer
+
+    release = asyncio.Event()
+
+    async def source(params):
+        await release.wait()
+        yield {"type": "response_complete", "data": {"content": "ok"}, "session_id": "s1"}
+
+    ws = FakeWebSocket()
+    multiplexer = StreamMultiplexer(ws, source)
+    runner = asyncio.create_task(multiplexer.run())
+    await ws.inbound.put(json.dumps(["open", "ok", {"message": "pods"}]))
+    await ws.inbound.put(json.dumps(["credit", "ok", "lots"]))
+    await ws.inbound.put(json.dumps(["credit", "ok", -1]))
+    await ws.inbound.put(json.dumps(["open", ["x"], {"message": "pods"}]))
+    await ws.inbound.put(json.dumps(["open", "bad", {"message": "pods", "credits": "many"}]))
+    await asyncio.sleep(0.05)
+
+    assert not runner.done()
+    assert [frame[2] for frame in ws.frames("ok")] == ["e", "e"]
+    assert ws.frames(None)[0][3] == {"error": "流ID必须是字符串或整数"}
+    assert ws.frames("bad") == [["bad", 0, "e", {"error": "credits必须是正整数"}]]
+
+    release.set()
+    await asyncio.sleep(0.05)
+    assert ws.frames("ok")[-1] == ["ok", 2, "x", "done"]
+    await ws.inbound.put(None)
+    await runner
+
+
+async def test_websocket_streams_share_the_chat_admission_lane():
+    import json
+    from k8s_diagnosis_agent.web.admission import AdmissionLane
+    from k8s_diagnosis_agent.web.ws import StreamMultiplexer
+
+    release = asyncio.Event()
+
+    async def source(params):
+        await release.wait()
+        yield {"type": "response_complete", "data": {"content": "ok"}, "session_id": "s1"}
+
+    lane = AdmissionLane("chat", max_concurrency=1, max_queue=0, queue_timeout=1)
+    ws = FakeWebSocket()
+    multiplexer = StreamMultiplexer(ws, source, admission_lane=lane, retry_after=7)
+    runner = asyncio.create_task(multiplexer.run())
+    await ws.inbound.put(json.dumps(["open", "a", {"message": "pods"}]))
+    await asyncio.sleep(0.05)
+    await ws.inbound.put(json.dumps(["open", "b", {"message": "nodes"}]))
+    await asyncio.sleep(0.05)
+
+    # a 占用唯一的名额，b 被拒绝并收到错误帧
+    assert lane.active == 1
+    assert ws.frames("b") == [
+        ["b", 1, "e", {"error": "服务繁忙（chat），请稍后重试", "retry_after": 7}],
+        ["b", 2, "x", "rejected"],
+    ]
+
+    release.set()
+    await asyncio.sleep(0.05)
+    assert ws.frames("a")[-1] == ["a", 2, "x", "done"]
+    assert lane.active == 0
+
+    await ws.inbound.put(None)
+    await runner
+
+
+async def test_admission_sheds_excess_and_keeps_priority_lane():
+    import httpx
+    from fastapi import FastAPI
+    from k8s_diagnosis_agent.web.admission import AdmissionController, AdmissionLane, AdmissionMiddleware
+
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.post("/api/v1/chat")
+    async def chat():
+        await release.wait()
+        return {"ok": True}
+
+    @app.get("/api/v1/health")
+    async def health():
+        return {"status": "healthy"}
+
+    controller = AdmissionController(
+        {"chat": AdmissionLane("chat", max_concurrency=1, max_queue=1, queue_timeout=5)},
+        [("/api/v1/chat", "chat")],
+        ["/api/v1/health"],
+        retry_after=7
+    )
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        running = asyncio.create_task(client.post("/api/v1/chat"))
+        queued = asyncio.create_task(client.post("/api/v1/chat"))
+        await asyncio.sleep(0.05)
+        rejected = await client.post("/api/v1/chat")
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "7"
+        # 优先通道不受chat名额影响
+        assert (await client.get("/api/v1/health")).status_code == 200
+
+        release.set()
+        assert (await running).status_code == 200
+        assert (await queued).status_code == 200
+
+    stats = controller.get_stats()["chat"]
+    assert stats["admitted"] == 2 and stats["rejected"] == 1 and stats["active"] == 0
+
+
+async def test_compression_negotiates_and_skips_streams():
+    import json
+    import httpx
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from k8s_diagnosis_agent.web.responses import CompressionMiddleware, FastJSONResponse
+
+    pods = [{"name": f"web-{i}", "phase": "Running", "node": "node-1"} for i in range(200)]
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/pods")
+    async def list_pods():
+        return {"pods": pods}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            yield "data: 1\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/pods", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert int(response.headers["content-length"]) < len(json.dumps({"pods": pods})) / 5
+        assert response.json() == {"pods": pods}
+
+        raw = await client.get("/pods", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in raw.headers
+
+        assert "content-encoding" not in (await client.get("/small", headers={"Accept-Encoding": "gzip"})).headers
+        streamed = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in streamed.headers
+        assert streamed.text == "data: 1\n\n"
+
+
+async def test_session_evidence_endpoint_resolves_full_result_ref():
+    import httpx
+    from fastapi import FastAPI
+    from k8s_diagnosis_agent.tools.base import ToolResult, ToolStatus
+    from k8s_diagnosis_agent.web.api import router, get_agent
+
+    session_manager = get_agent().session_manager
+    session_id = session_manager.create_session()
+    evidence = session_manager.get_session(session_id).evidence
+    pods = {"pods": [{"name": f"web-{i}"} for i in range(200)]}
+    evidence.put("k8s_pod_info", {}, ToolResult(status=ToolStatus.SUCCESS, data=pods, message="成功获取Pod信息"))
+    ref = evidence.ref_for("k8s_pod_info", {"namespace": "default"})
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        found = await client.get(f"/api/v1/session/{session_id}/evidence/{ref}")
+        missing = await client.get(f"/api/v1/session/{session_id}/evidence/unknown")
+
+    assert found.status_code == 200
+    assert found.json()["tool_name"] == "k8s_pod_info"
+    assert found.json()["result"]["data"] == pods
+    assert missing.status_code == 404
+    session_manager.remove_session(session_id)